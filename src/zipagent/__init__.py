@@ -3,8 +3,16 @@
 __version__ = "0.1.8"
 
 from .agent import Agent
+from .cache import CachedModel, LRUCache, SingleFlightModel
 from .context import Context
+from .context_window import (
+    ContextWindow,
+    DropOldestTurns,
+    TrimStrategy,
+    TruncateToolOutputs,
+)
 from .exceptions import (
+    CircuitOpenError,
     ConfigurationError,
     ContextError,
     MaxTurnsError,
@@ -15,37 +23,76 @@ from .exceptions import (
     ToolError,
     ToolExecutionError,
     ToolNotFoundError,
+    ToolTimeoutError,
     ZipAgentError,
 )
-from .model import LiteLLMModel, Model, ModelResponse, OpenAIModel, StreamDelta
-from .runner import Runner, RunResult
+from .model import (
+    AsyncModel,
+    AsyncOpenAIModel,
+    LiteLLMModel,
+    Model,
+    ModelResponse,
+    OpenAIModel,
+    StreamDelta,
+)
+from .resilience import CircuitBreaker, ResilientModel
+from .router import RouterModel
+from .runner import BatchStats, Runner, RunResult
+from .storage import (
+    ContextManager,
+    ContextStore,
+    JSONLContextStore,
+    SQLiteContextStore,
+)
 from .stream import StreamEvent, StreamEventType
 from .tool import Tool, function_tool
 
 # MCP 工具相关导入（可选）
 try:
-    from .mcp_tool import MCPTool, MCPToolGroup
+    from .mcp_tool import MCPTool, MCPToolGroup, MCPToolResult
 
     _MCP_AVAILABLE = True
 except ImportError:
     _MCP_AVAILABLE = False
     MCPTool = None
     MCPToolGroup = None
+    MCPToolResult = None
 
 
 __all__ = [
     # 核心类
     "Agent",
+    "AsyncModel",
     "Context",
     "Model",
     "Runner",
     "Tool",
     # 模型相关
+    "AsyncOpenAIModel",
     "LiteLLMModel",
     "ModelResponse",
     "OpenAIModel",
     "StreamDelta",
+    # 模型容错
+    "CircuitBreaker",
+    "ResilientModel",
+    "RouterModel",
+    # 缓存
+    "CachedModel",
+    "LRUCache",
+    "SingleFlightModel",
+    # 上下文窗口
+    "ContextWindow",
+    "DropOldestTurns",
+    "TrimStrategy",
+    "TruncateToolOutputs",
+    # 上下文持久化
+    "ContextManager",
+    "ContextStore",
+    "JSONLContextStore",
+    "SQLiteContextStore",
     # 运行结果
+    "BatchStats",
     "RunResult",
     # 流式处理
     "StreamEvent",
@@ -53,13 +100,15 @@ __all__ = [
     # 工具装饰器
     "function_tool",
     # MCP 工具（可选）
-    *(["MCPTool", "MCPToolGroup"] if _MCP_AVAILABLE else []),
+    *(["MCPTool", "MCPToolGroup", "MCPToolResult"] if _MCP_AVAILABLE else []),
     # 异常类
     "ZipAgentError",
     "ModelError",
+    "CircuitOpenError",
     "ToolError",
     "ToolNotFoundError",
     "ToolExecutionError",
+    "ToolTimeoutError",
     "ContextError",
     "TokenLimitError",
     "MaxTurnsError",
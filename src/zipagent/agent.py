@@ -1,11 +1,83 @@
 """Agent - 代理核心模块"""
 
 import os
+from collections.abc import Iterable
 from dataclasses import dataclass, field
-from typing import Any, Union
+from typing import TYPE_CHECKING, Any, SupportsIndex, Union
 
-from .model import Model, OpenAIModel
-from .tool import Tool
+from .context_window import ContextWindow
+from .model import AsyncModel, Model, OpenAIModel
+from .tool import Tool, _tool_groups_generation
+
+if TYPE_CHECKING:
+    from .mcp_tool import MCPToolGroup
+
+
+class _ToolList(list):
+    """记录修改次数的工具列表，用于判断 Agent 的工具索引是否过期"""
+
+    def __init__(self, iterable: Iterable[Any] = ()) -> None:
+        super().__init__(iterable)
+        self.version = 0
+
+    def _touch(self) -> None:
+        self.version += 1
+
+    def append(self, item: Any) -> None:
+        super().append(item)
+        self._touch()
+
+    def extend(self, items: Iterable[Any]) -> None:
+        super().extend(items)
+        self._touch()
+
+    def insert(self, index: SupportsIndex, item: Any) -> None:
+        super().insert(index, item)
+        self._touch()
+
+    def remove(self, item: Any) -> None:
+        super().remove(item)
+        self._touch()
+
+    def pop(self, index: SupportsIndex = -1) -> Any:
+        item = super().pop(index)
+        self._touch()
+        return item
+
+    def clear(self) -> None:
+        super().clear()
+        self._touch()
+
+    def sort(self, *args: Any, **kwargs: Any) -> None:
+        super().sort(*args, **kwargs)
+        self._touch()
+
+    def reverse(self) -> None:
+        super().reverse()
+        self._touch()
+
+    def __setitem__(self, index: Any, value: Any) -> None:
+        super().__setitem__(index, value)
+        self._touch()
+
+    def __delitem__(self, index: Any) -> None:
+        super().__delitem__(index)
+        self._touch()
+
+    def __iadd__(self, items: Iterable[Any]) -> "_ToolList":  # type: ignore[override, misc]
+        super().__iadd__(items)
+        self._touch()
+        return self
+
+    def __imul__(self, count: SupportsIndex) -> "_ToolList":  # type: ignore[override]
+        super().__imul__(count)
+        self._touch()
+        return self
+
+
+def _is_tool_group(item: Any) -> bool:
+    """判断是否为工具组（MCPToolGroup）"""
+    return hasattr(item, "__iter__") and not isinstance(item, (str, bytes))
 
 
 @dataclass
@@ -18,11 +90,16 @@ class Agent:
     instructions: str
     """系统指令"""
 
-    model: Model | None = None
-    """使用的LLM模型"""
+    model: Model | AsyncModel | None = None
+    """使用的LLM模型（AsyncModel 需要通过 Runner.run_async 运行）"""
 
     tools: list[Union[Tool, "MCPToolGroup"]] = field(default_factory=list)
-    """可用工具列表，支持 Tool 和 MCPToolGroup"""
+    """
+    可用工具列表，支持 Tool 和 MCPToolGroup
+
+    传入的列表会被复制为可追踪修改的列表，之后请通过 agent.tools 或
+    add_tool / remove_tool 修改工具，对原列表的修改不会生效。
+    """
 
     use_system_prompt: bool = True
     """是否启用默认系统提示"""
@@ -30,17 +107,54 @@ class Agent:
     system_prompt_file: str | None = "system.md"
     """系统提示文件名，默认为 system.md（在 liteagent 包目录下）"""
 
+    context_window: ContextWindow | None = None
+    """上下文窗口管理器，设置后每次调用模型前会把历史裁剪到 token 预算内"""
+
     def __post_init__(self) -> None:
         """初始化后处理"""
         # 如果没有指定模型，使用默认的OpenAI模型
         if self.model is None:
             self.model = OpenAIModel()
 
+        # 使用可追踪修改的列表，直接修改 agent.tools 也能使索引失效
+        self.tools = _ToolList(self.tools)
+
+        # 工具索引：名称 -> 工具、扁平化工具列表和预先计算的 schema
+        self._all_tools: list[Tool] = []
+        self._tool_index: dict[str, Tool] = {}
+        self._tools_schema: list[dict[str, Any]] = []
+        # 建立索引时的工具列表及其修改次数、各工具组的版本号
+        self._indexed_list: _ToolList | None = None
+        self._indexed_list_version = 0
+        self._indexed_groups: list[tuple[Any, int]] = []
+        self._groups_generation = -1
+        self._tools_version = 0
+        self._system_message_cache: tuple[Any, dict[str, str]] | None = None
+
         # 展开 MCPToolGroup 为实际的工具列表
         self._expand_tool_groups()
 
+    @property
+    def tools_version(self) -> int:
+        """工具集合的版本号，工具增删后递增，可用于复用序列化后的 schema"""
+        self._ensure_tool_index()
+        return self._tools_version
+
     def get_system_message(self) -> dict[str, str]:
         """获取系统消息"""
+        self._ensure_tool_index()
+        cache_key = (
+            self.instructions,
+            self.use_system_prompt,
+            self.system_prompt_file,
+            self._tools_version,
+        )
+        if (
+            self._system_message_cache is not None
+            and self._system_message_cache[0] == cache_key
+        ):
+            return dict(self._system_message_cache[1])
+
         system_content = self.instructions
 
         # 如果启用默认系统提示，尝试读取系统提示文件
@@ -51,13 +165,15 @@ class Agent:
 
         # 如果有工具，添加工具使用说明
         if self.tools:
-            tool_names = [tool.name for tool in self._get_all_tools()]
+            tool_names = [tool.name for tool in self._all_tools]
             system_content += (
                 f"\n\n你可以使用以下工具: {', '.join(tool_names)}"
             )
             system_content += "\n当需要使用工具时，请调用相应的函数。"
 
-        return {"role": "system", "content": system_content}
+        message = {"role": "system", "content": system_content}
+        self._system_message_cache = (cache_key, message)
+        return dict(message)
 
     def _load_system_prompt(self) -> str | None:
         """加载系统提示文件"""
@@ -98,29 +214,55 @@ class Agent:
             return None
 
     def get_tools_schema(self) -> list[dict[str, Any]]:
-        """获取工具的schema定义"""
-        return [tool.to_dict() for tool in self._get_all_tools()]
+        """
+        获取工具的schema定义
+
+        返回的列表在工具集合未变化时会被复用，调用方不应修改它。
+        """
+        self._ensure_tool_index()
+        return self._tools_schema
 
     def find_tool(self, name: str) -> Tool | None:
         """根据名称查找工具"""
-        for tool in self._get_all_tools():
-            if tool.name == name:
-                return tool
-        return None
+        self._ensure_tool_index()
+        return self._tool_index.get(name)
 
     def add_tool(self, tool: Union[Tool, "MCPToolGroup"]) -> None:
         """添加工具或工具组"""
+        self._ensure_tool_index()
         self.tools.append(tool)
+        # 增量更新索引，无需重建
+        if _is_tool_group(tool):
+            self._indexed_groups.append((tool, getattr(tool, "version", 0)))
+        self._index_item(tool)
+        self._indexed_list_version = self._tracked_tools().version
+        self._tools_version += 1
 
     def remove_tool(self, name: str) -> bool:
         """移除工具"""
-        all_tools = self._get_all_tools()
-        for i, tool in enumerate(all_tools):
-            if tool.name == name:
-                # 找到在原始列表中的位置并移除
-                self._remove_tool_from_original_list(tool)
-                return True
-        return False
+        tool = self.find_tool(name)
+        if tool is None:
+            return False
+
+        # 找到在原始列表中的位置并移除
+        self._remove_tool_from_original_list(tool)
+
+        # 增量更新索引
+        position = next(
+            i for i, item in enumerate(self._all_tools) if item is tool
+        )
+        del self._all_tools[position]
+        del self._tools_schema[position]
+        del self._tool_index[name]
+        for other in self._all_tools:
+            # 存在同名工具时，由下一个同名工具接替
+            if other.name == name:
+                self._tool_index[name] = other
+                break
+        # 从工具组中移除时工具组的版本号已变化，下次访问时重建索引
+        self._indexed_list_version = self._tracked_tools().version
+        self._tools_version += 1
+        return True
 
     def _expand_tool_groups(self) -> None:
         """展开工具组（内部方法，已废弃，保持向后兼容）"""
@@ -128,27 +270,75 @@ class Agent:
 
     def _get_all_tools(self) -> list[Tool]:
         """获取所有工具的扁平化列表"""
-        all_tools = []
-        for item in self.tools:
-            if hasattr(item, "__iter__") and not isinstance(
-                item, (str, bytes)
-            ):
-                # 这是一个工具组（MCPToolGroup）
-                all_tools.extend(item)
-            else:
-                # 这是一个普通工具
-                all_tools.append(item)
-        return all_tools
+        self._ensure_tool_index()
+        return list(self._all_tools)
+
+    def _tracked_tools(self) -> _ToolList:
+        """可追踪修改的工具列表"""
+        tools = self.tools
+        if not isinstance(tools, _ToolList):
+            # tools 被整体替换为普通列表
+            tools = self.tools = _ToolList(tools)
+        return tools
+
+    def _index_is_current(self, tools: _ToolList) -> bool:
+        """工具列表未被修改、替换，且工具组没有变化"""
+        if (
+            tools is not self._indexed_list
+            or tools.version != self._indexed_list_version
+        ):
+            return False
+        generation = _tool_groups_generation()
+        if generation == self._groups_generation:
+            return True
+        # 有工具组发生了变化，只需检查本 Agent 的工具组
+        if any(
+            getattr(group, "version", 0) != version
+            for group, version in self._indexed_groups
+        ):
+            return False
+        self._groups_generation = generation
+        return True
+
+    def _ensure_tool_index(self) -> None:
+        """确保工具索引与工具列表一致，必要时重建"""
+        tools = self._tracked_tools()
+        if self._index_is_current(tools):
+            return
+
+        # 先记录变化计数和版本号，建立索引期间的变化会在下次检查时被发现
+        self._groups_generation = _tool_groups_generation()
+        self._indexed_groups = [
+            (item, getattr(item, "version", 0))
+            for item in tools
+            if _is_tool_group(item)
+        ]
+        self._indexed_list = tools
+        self._indexed_list_version = tools.version
+
+        self._all_tools = []
+        self._tool_index = {}
+        self._tools_schema = []
+        for item in tools:
+            self._index_item(item)
+        self._tools_version += 1
+
+    def _index_item(self, item: Union[Tool, "MCPToolGroup"]) -> None:
+        """把工具或工具组加入索引"""
+        tools = list(item) if _is_tool_group(item) else [item]
+        for tool in tools:
+            self._all_tools.append(tool)
+            self._tools_schema.append(tool.to_dict())
+            # 同名工具以先出现的为准，与线性查找的行为一致
+            self._tool_index.setdefault(tool.name, tool)
 
     def _remove_tool_from_original_list(self, target_tool: Tool) -> None:
         """从原始工具列表中移除指定工具"""
         for i, item in enumerate(self.tools):
-            if hasattr(item, "__iter__") and not isinstance(
-                item, (str, bytes)
-            ):
+            if _is_tool_group(item):
                 # 这是一个工具组
                 if target_tool in item.tools:
-                    item.tools.remove(target_tool)
+                    item.remove_tool(target_tool.name)
                     # 如果工具组为空，移除整个工具组
                     if not item.tools:
                         self.tools.pop(i)
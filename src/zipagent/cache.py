@@ -0,0 +1,557 @@
+"""Cache - 缓存模块
+
+提供线程安全的 LRU + TTL 缓存，以及基于请求指纹缓存模型响应的 CachedModel。
+CachedModel 会记录流式调用产生的 StreamDelta 序列，命中缓存时按原样重放，
+事件形态与真实调用一致；可选的磁盘层可以在进程之间共享缓存，条目数有上限。
+SingleFlightModel 则把并发的相同请求合并为一个上游请求。
+LRUCache 也可以通过 function_tool(cache=...) 缓存工具结果。
+
+使用示例:
+    from zipagent import Agent, CachedModel, OpenAIModel
+
+    model = CachedModel(
+        OpenAIModel(temperature=0), ttl=3600, disk_path=".zipagent_cache"
+    )
+    agent = Agent(name="FAQ", instructions="你是客服助手", model=model)
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Generator
+from contextlib import suppress
+from dataclasses import replace
+from typing import Any
+
+from .context import RequestMessages, Usage
+from .model import Model, ModelResponse, StreamDelta, _stream_error_response
+
+_MISSING = object()
+
+
+class LRUCache:
+    """线程安全的 LRU 缓存，支持可选的过期时间"""
+
+    def __init__(
+        self,
+        maxsize: int = 128,
+        ttl: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            maxsize: 最多保存的条目数
+            ttl: 条目的存活时间（秒），None 表示不过期
+            clock: 时间函数，便于测试
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._data: OrderedDict[Any, tuple[float | None, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        """获取缓存值，不存在或已过期时返回 default"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at is None or expires_at > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Any, value: Any) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        expires_at = None if self.ttl is None else self._clock() + self.ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Any) -> bool:
+        """删除指定条目，返回是否存在"""
+        with self._lock:
+            return self._data.pop(key, _MISSING) is not _MISSING
+
+    def invalidate_where(self, predicate: Callable[[Any], bool]) -> int:
+        """删除所有 key 满足 predicate 的条目，返回删除数量"""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self) -> None:
+        """清空缓存（命中统计保留）"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict[str, int]:
+        """命中、未命中次数和当前条目数"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Any) -> bool:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            return entry is not _MISSING and (
+                entry[0] is None or entry[0] > self._clock()
+            )
+
+
+def _encode_entry(
+    response: ModelResponse, deltas: list[StreamDelta] | None
+) -> dict[str, Any]:
+    """把缓存条目转换为可 JSON 序列化的字典（deltas 为 None 表示非流式调用）"""
+    return {
+        "response": {
+            "content": response.content,
+            "tool_calls": response.tool_calls,
+            "finish_reason": response.finish_reason,
+        },
+        "deltas": None
+        if deltas is None
+        else [[d.content, d.tool_calls, d.finish_reason] for d in deltas],
+    }
+
+
+def _decode_entry(
+    data: dict[str, Any],
+) -> tuple[ModelResponse, list[StreamDelta] | None]:
+    response = data["response"]
+    deltas = data["deltas"]
+    return (
+        ModelResponse(
+            content=response["content"],
+            tool_calls=response["tool_calls"],
+            usage=Usage(),
+            finish_reason=response["finish_reason"],
+        ),
+        None if deltas is None else [StreamDelta(*delta) for delta in deltas],
+    )
+
+
+def request_fingerprint(
+    model: Any,
+    messages: list[dict[str, Any]],
+    tools: list[dict[str, Any]] | None = None,
+) -> str:
+    """
+    计算模型请求的指纹
+
+    由模型名、temperature、max_tokens、工具 schema 和消息共同决定。
+    """
+    if isinstance(messages, RequestMessages):
+        # 复用上下文已缓存的消息编码
+        messages_json = messages.to_json()
+    else:
+        # 与 MessageEncoder 的输出格式一致，两种输入得到相同的指纹
+        messages_json = json.dumps(list(messages), ensure_ascii=False)
+    params = json.dumps(
+        [
+            getattr(model, "model_name", None),
+            getattr(model, "temperature", None),
+            getattr(model, "max_tokens", None),
+            tools,
+        ],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    digest = hashlib.sha256(params.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(messages_json.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class CachedModel(Model):
+    """
+    缓存模型响应的包装器
+
+    以 (模型名, 消息, 工具 schema, temperature, max_tokens) 的哈希作为指纹，
+    相同请求直接返回缓存的响应。失败的响应不会被缓存。命中缓存时没有消耗
+    token，因此返回的响应 usage 为 0。
+
+    流式调用命中缓存时重放原始的增量序列；由 generate() 写入的条目没有
+    增量序列，流式调用遇到时按未命中处理，记录真实的增量后再缓存。
+
+    注意：temperature 大于 0 时模型输出本身是随机的，缓存会固定第一次的结果。
+    """
+
+    def __init__(
+        self,
+        model: Model,
+        maxsize: int = 1024,
+        ttl: float | None = None,
+        disk_path: str | None = None,
+        disk_maxsize: int = 10000,
+    ):
+        """
+        Args:
+            model: 被包装的模型
+            maxsize: 内存缓存的最大条目数
+            ttl: 缓存条目的存活时间（秒），同时作用于内存层和磁盘层
+            disk_path: 磁盘缓存目录（可选），内存未命中时读取，写入时同步保存
+            disk_maxsize: 磁盘缓存的最大条目数，超出时删除最久未使用的文件
+        """
+        self.model = model
+        self.model_name = getattr(model, "model_name", None)
+        self.base_url = getattr(model, "base_url", None)
+        self.cache = LRUCache(maxsize, ttl)
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.disk_maxsize = disk_maxsize
+        self.disk_hits = 0
+        self._disk_entries: int | None = None
+        self._disk_lock = threading.Lock()
+        if disk_path:
+            os.makedirs(disk_path, exist_ok=True)
+
+    def fingerprint(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+    ) -> str:
+        """计算请求指纹"""
+        return request_fingerprint(self.model, messages, tools)
+
+    def _disk_file(self, key: str) -> str:
+        assert self.disk_path is not None
+        return os.path.join(self.disk_path, f"{key}.json")
+
+    def _lookup(
+        self, key: str, stream: bool = False
+    ) -> tuple[ModelResponse, list[StreamDelta] | None] | None:
+        entry = self.cache.get(key)
+        if entry is None and self.disk_path:
+            entry = self._load(key)
+        if entry is not None and stream and entry[1] is None:
+            # 非流式调用写入的条目没有增量序列，无法按原样重放
+            return None
+        return entry
+
+    def _load(
+        self, key: str
+    ) -> tuple[ModelResponse, list[StreamDelta] | None] | None:
+        """从磁盘层读取条目，命中时写回内存层"""
+        path = self._disk_file(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (
+            self.ttl is not None
+            and data["created_at"] + self.ttl < time.time()
+        ):
+            self._remove_disk_file(path)
+            return None
+
+        # 更新修改时间，淘汰时按最近使用顺序保留
+        with suppress(OSError):
+            os.utime(path)
+        entry = _decode_entry(data)
+        self.disk_hits += 1
+        self.cache.set(key, entry)
+        return entry
+
+    def _remove_disk_file(self, path: str) -> None:
+        with suppress(OSError):
+            os.remove(path)
+            with self._disk_lock:
+                if self._disk_entries is not None:
+                    self._disk_entries -= 1
+
+    def _evict_disk(self) -> None:
+        """磁盘条目超出上限时删除最久未使用的文件（调用方需持有锁）"""
+        assert self.disk_path is not None
+        files = []
+        for entry in os.scandir(self.disk_path):
+            if entry.name.endswith(".json"):
+                with suppress(OSError):
+                    files.append((entry.stat().st_mtime_ns, entry.path))
+        files.sort()
+        excess = len(files) - self.disk_maxsize
+        for _, path in files[: max(excess, 0)]:
+            with suppress(OSError):
+                os.remove(path)
+        # 其他进程可能同时写入同一目录，计数以扫描结果为准
+        self._disk_entries = min(len(files), self.disk_maxsize)
+
+    def _store(
+        self,
+        key: str,
+        response: ModelResponse,
+        deltas: list[StreamDelta] | None,
+    ) -> None:
+        if response.finish_reason == "error":
+            return
+        data = _encode_entry(response, deltas)
+        # 经过一次序列化，保证缓存内容与调用方持有的对象互不影响
+        entry = _decode_entry(json.loads(json.dumps(data)))
+        self.cache.set(key, entry)
+        if not self.disk_path:
+            return
+
+        data["created_at"] = time.time()
+        path = self._disk_file(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        existed = os.path.exists(path)
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError:
+            # 磁盘缓存只是优化，写入失败不影响调用
+            return
+
+        with self._disk_lock:
+            if self._disk_entries is None:
+                self._evict_disk()
+            elif not existed:
+                self._disk_entries += 1
+                if self._disk_entries > self.disk_maxsize:
+                    self._evict_disk()
+
+    @staticmethod
+    def _copy(response: ModelResponse) -> ModelResponse:
+        return ModelResponse(
+            content=response.content,
+            tool_calls=json.loads(json.dumps(response.tool_calls)),
+            usage=Usage(),
+            finish_reason=response.finish_reason,
+        )
+
+    def generate(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+    ) -> ModelResponse:
+        """生成响应，相同请求直接返回缓存"""
+        key = self.fingerprint(messages, tools)
+        entry = self._lookup(key)
+        if entry is not None:
+            return self._copy(entry[0])
+
+        response = self.model.generate(messages, tools)
+        self._store(key, response, None)
+        return response
+
+    def generate_stream(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+    ) -> Generator[StreamDelta | ModelResponse, None, None]:
+        """流式生成响应，命中缓存时重放记录的增量序列"""
+        key = self.fingerprint(messages, tools)
+        entry = self._lookup(key, stream=True)
+        if entry is not None:
+            response, cached_deltas = entry
+            assert cached_deltas is not None
+            for delta in cached_deltas:
+                yield StreamDelta(
+                    content=delta.content,
+                    tool_calls=delta.tool_calls,
+                    finish_reason=delta.finish_reason,
+                )
+            yield self._copy(response)
+            return
+
+        deltas: list[StreamDelta] = []
+        for item in self.model.generate_stream(messages, tools):
+            if isinstance(item, ModelResponse):
+                self._store(key, item, deltas)
+                yield item
+                return
+            deltas.append(item)
+            yield item
+
+
+class _Flight:
+    """一次正在进行的上游请求及其已产生的输出"""
+
+    def __init__(self) -> None:
+        self.items: list[StreamDelta | ModelResponse] = []
+        self.response: ModelResponse | None = None
+        self.error: BaseException | None = None
+        self.done = False
+        self.subscribers = 0
+        self.condition = threading.Condition()
+
+
+class SingleFlightModel(Model):
+    """
+    合并并发相同请求的包装器
+
+    并发的相同请求（指纹相同）共享同一个上游请求：流式调用的所有订阅者
+    收到相同的增量序列，中途加入的订阅者会先收到已产生的增量。上游请求
+    完成后不再保留结果，需要跨时间复用时可以与 CachedModel 组合使用。
+    """
+
+    def __init__(self, model: Model):
+        """
+        Args:
+            model: 被包装的模型
+        """
+        self.model = model
+        self.model_name = getattr(model, "model_name", None)
+        self.base_url = getattr(model, "base_url", None)
+        self.upstream_requests = 0
+        self.coalesced_requests = 0
+        self._flights: dict[tuple[str, str], _Flight] = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key: tuple[str, str]) -> tuple[_Flight, bool]:
+        """加入已有的请求，没有时创建新的请求，返回 (请求, 是否新建)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced_requests += 1
+                with flight.condition:
+                    flight.subscribers += 1
+                return flight, False
+            flight = _Flight()
+            flight.subscribers = 1
+            self._flights[key] = flight
+            self.upstream_requests += 1
+            return flight, True
+
+    def _abandon(self, key: tuple[str, str], flight: _Flight) -> bool:
+        """
+        没有订阅者时放弃请求，返回是否已放弃
+
+        与 _join 持有同一把锁：确认没有订阅者和移出请求之间不会有新的
+        调用方加入，之后的调用方会发起新的请求。
+        """
+        with self._lock:
+            with flight.condition:
+                if flight.subscribers > 0:
+                    return False
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            return True
+
+    def _land(self, key: tuple[str, str], flight: _Flight) -> None:
+        """上游请求结束，通知所有订阅者"""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        with flight.condition:
+            flight.done = True
+            flight.condition.notify_all()
+
+    @staticmethod
+    def _copy(response: ModelResponse) -> ModelResponse:
+        # 每个订阅者拿到独立的响应对象，usage 各自计入自己的上下文
+        usage = response.usage
+        return replace(
+            response,
+            usage=Usage(
+                usage.input_tokens, usage.output_tokens, usage.total_tokens
+            ),
+        )
+
+    def generate(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+    ) -> ModelResponse:
+        """生成响应，并发的相同请求只调用一次上游"""
+        key = ("generate", request_fingerprint(self.model, messages, tools))
+        flight, leader = self._join(key)
+        if leader:
+            try:
+                flight.response = self.model.generate(messages, tools)
+            except BaseException as e:
+                flight.error = e
+                raise
+            finally:
+                self._land(key, flight)
+            return flight.response
+
+        with flight.condition:
+            flight.condition.wait_for(lambda: flight.done)
+        if flight.error is not None:
+            raise flight.error
+        assert flight.response is not None
+        return self._copy(flight.response)
+
+    def _pump(
+        self,
+        key: tuple[str, str],
+        flight: _Flight,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None,
+    ) -> None:
+        """在后台线程中读取上游流，写入共享的输出列表"""
+        stream = self.model.generate_stream(messages, tools)
+        try:
+            for item in stream:
+                with flight.condition:
+                    flight.items.append(item)
+                    flight.condition.notify_all()
+                    idle = flight.subscribers == 0
+                if isinstance(item, ModelResponse):
+                    break
+                # 所有订阅者都已离开，不再读取上游
+                if idle and self._abandon(key, flight):
+                    break
+        except Exception as e:
+            with flight.condition:
+                flight.items.extend(_stream_error_response(e, self.model_name))
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+            self._land(key, flight)
+
+    def generate_stream(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+    ) -> Generator[StreamDelta | ModelResponse, None, None]:
+        """流式生成响应，并发的相同请求共享同一个上游流"""
+        key = ("stream", request_fingerprint(self.model, messages, tools))
+        flight, leader = self._join(key)
+        if leader:
+            threading.Thread(
+                target=self._pump,
+                args=(key, flight, messages, tools),
+                daemon=True,
+            ).start()
+
+        position = 0
+        try:
+            while True:
+                with flight.condition:
+                    while len(flight.items) <= position and not flight.done:
+                        flight.condition.wait()
+                    items = flight.items[position:]
+                    done = flight.done
+                position += len(items)
+                for item in items:
+                    if isinstance(item, ModelResponse):
+                        yield self._copy(item)
+                        return
+                    yield item
+                if done and position == len(flight.items):
+                    return
+        finally:
+            with flight.condition:
+                flight.subscribers -= 1
@@ -1,10 +1,16 @@
 """Context - 上下文管理模块"""
 
+import bisect
+import copy
 import json
 import uuid
+from collections.abc import Iterable, Iterator, MutableMapping, MutableSequence
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .storage import ContextStore
 
 
 @dataclass
@@ -22,18 +28,357 @@ class Usage:
         self.total_tokens += other.total_tokens
 
 
+class MessageLog(MutableSequence[dict[str, Any]]):
+    """
+    支持结构共享的消息列表
+
+    用法与 list 相同。fork() 会把当前内容冻结为只读分块并与新列表共享，
+    因此克隆的时间和内存开销与消息数量无关。之后的追加只写入各自的尾部，
+    修改共享部分时只复制被修改位置之后的消息（写时复制）。
+
+    消息字典本身在克隆之间共享，应当通过替换元素而不是原地修改来更新消息。
+
+    持久化的上下文会让 MessageLog 记录变更（追加、替换、删除），
+    Context.persist 据此只写入变化的消息，而不必比较整段历史。
+    """
+
+    def __init__(self, messages: Iterable[dict[str, Any]] = ()) -> None:
+        # 只读分块及其起始偏移，可能被多个 MessageLog 共享
+        self._chunks: tuple[tuple[dict[str, Any], ...], ...] = ()
+        self._offsets: tuple[int, ...] = ()
+        # 可见的共享前缀长度（可能小于分块总长度）
+        self._base_len = 0
+        # 私有的可变尾部
+        self._tail: list[dict[str, Any]] = list(messages)
+        # 上次取出后的变更记录，None 表示不记录
+        self._changes: list[tuple[Any, ...]] | None = None
+
+    def fork(self) -> "MessageLog":
+        """创建共享当前内容的副本，开销为 O(分块数)"""
+        self._freeze()
+        other = MessageLog()
+        other._chunks = self._chunks
+        other._offsets = self._offsets
+        other._base_len = self._base_len
+        return other
+
+    def _freeze(self) -> None:
+        """把尾部冻结为新的只读分块"""
+        if not self._tail and self._chunk_total() == self._base_len:
+            return
+
+        chunks = list(self._chunks)
+        offsets = list(self._offsets)
+        # 丢弃共享前缀之外不可见的部分
+        while offsets and offsets[-1] >= self._base_len:
+            chunks.pop()
+            offsets.pop()
+        if chunks:
+            visible = self._base_len - offsets[-1]
+            if visible < len(chunks[-1]):
+                chunks[-1] = chunks[-1][:visible]
+        if self._tail:
+            offsets.append(self._base_len)
+            chunks.append(tuple(self._tail))
+
+        self._chunks = tuple(chunks)
+        self._offsets = tuple(offsets)
+        self._base_len += len(self._tail)
+        self._tail = []
+
+    def _track_changes(self) -> None:
+        """开始记录变更"""
+        self._changes = []
+
+    def _take_changes(self) -> list[tuple[Any, ...]]:
+        """取出并清空变更记录"""
+        changes = self._changes or []
+        self._changes = []
+        return changes
+
+    def _record(self, *change: Any) -> None:
+        changes = self._changes
+        if changes is None or (changes and changes[0][0] == "resync"):
+            # 已经需要整体重新同步，之后的变更无需再记录
+            return
+        if change[0] == "resync":
+            changes.clear()
+        changes.append(change)
+
+    def _chunk_total(self) -> int:
+        if not self._chunks:
+            return 0
+        return self._offsets[-1] + len(self._chunks[-1])
+
+    def _base_item(self, index: int) -> dict[str, Any]:
+        chunk_index = bisect.bisect_right(self._offsets, index) - 1
+        return self._chunks[chunk_index][index - self._offsets[chunk_index]]
+
+    def _iter_base(self, start: int = 0) -> Iterator[dict[str, Any]]:
+        if start >= self._base_len:
+            return
+        chunk_index = bisect.bisect_right(self._offsets, start) - 1
+        position = start
+        for chunk, offset in zip(
+            self._chunks[chunk_index:],
+            self._offsets[chunk_index:],
+            strict=True,
+        ):
+            end = min(len(chunk), self._base_len - offset)
+            for i in range(position - offset, end):
+                yield chunk[i]
+            position = offset + end
+            if position >= self._base_len:
+                return
+
+    def _detach_from(self, index: int) -> None:
+        """写时复制：把共享前缀中 index 之后的消息移到私有尾部"""
+        if index >= self._base_len:
+            return
+        self._tail[:0] = list(self._iter_base(index))
+        self._base_len = index
+
+    def _normalize(self, index: int) -> int:
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("message index out of range")
+        return index
+
+    def __len__(self) -> int:
+        return self._base_len + len(self._tail)
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        yield from self._iter_base()
+        yield from self._tail
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        index = self._normalize(index)
+        if index < self._base_len:
+            return self._base_item(index)
+        return self._tail[index - self._base_len]
+
+    def __setitem__(self, index: Any, value: Any) -> None:
+        if isinstance(index, slice):
+            self._record("resync")
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                self._detach_from(0)
+                self._tail[index] = value
+                return
+            self._detach_from(start)
+            offset = self._base_len
+            self._tail[start - offset : max(stop, start) - offset] = value
+            return
+        index = self._normalize(index)
+        self._record("set", index, value)
+        self._detach_from(index)
+        self._tail[index - self._base_len] = value
+
+    def __delitem__(self, index: Any) -> None:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                self._record("resync")
+                self._detach_from(0)
+                del self._tail[index]
+                return
+            if stop > start:
+                self._record("delete", start, stop)
+            self._detach_from(start)
+            offset = self._base_len
+            del self._tail[start - offset : max(stop, start) - offset]
+            return
+        index = self._normalize(index)
+        self._record("delete", index, index + 1)
+        if index == len(self) - 1 and not self._tail:
+            # 删除共享前缀的最后一条，只需缩短可见长度
+            self._base_len -= 1
+            return
+        self._detach_from(index)
+        del self._tail[index - self._base_len]
+
+    def insert(self, index: int, value: dict[str, Any]) -> None:
+        length = len(self)
+        if index < 0:
+            index = max(index + length, 0)
+        index = min(index, length)
+        if index == length:
+            self._record("append", value)
+        else:
+            self._record("resync")
+        self._detach_from(index)
+        self._tail.insert(index - self._base_len, value)
+
+    def append(self, value: dict[str, Any]) -> None:
+        self._record("append", value)
+        self._tail.append(value)
+
+    def extend(self, values: Iterable[dict[str, Any]]) -> None:
+        values = list(values)
+        for value in values:
+            self._record("append", value)
+        self._tail.extend(values)
+
+    def clear(self) -> None:
+        if len(self):
+            self._record("delete", 0, len(self))
+        self._chunks = ()
+        self._offsets = ()
+        self._base_len = 0
+        self._tail = []
+
+    def copy(self) -> list[dict[str, Any]]:
+        """返回普通 list 形式的浅拷贝"""
+        return list(self)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, (list, tuple, MessageLog)):
+            return NotImplemented
+        return len(self) == len(other) and all(
+            a == b for a, b in zip(self, other, strict=True)
+        )
+
+    def __repr__(self) -> str:
+        return f"MessageLog({list(self)!r})"
+
+
+class MessageEncoder:
+    """
+    消息 JSON 编码器
+
+    按位置缓存每条消息编码后的 JSON 片段，只编码新增或被替换的消息，
+    再把片段拼接成完整的 JSON 数组。
+    """
+
+    def __init__(self) -> None:
+        # (消息对象, JSON 片段)，按位置对齐
+        self._cache: list[tuple[dict[str, Any], str]] = []
+
+    def encode(self, messages: Iterable[dict[str, Any]]) -> str:
+        """把消息列表编码为 JSON 数组文本"""
+        cache = self._cache
+        fragments = []
+        for i, message in enumerate(messages):
+            if i < len(cache) and cache[i][0] is message:
+                fragments.append(cache[i][1])
+                continue
+            fragment = json.dumps(message, ensure_ascii=False)
+            if i < len(cache):
+                cache[i] = (message, fragment)
+            else:
+                cache.append((message, fragment))
+            fragments.append(fragment)
+        del cache[len(fragments) :]
+        return "[" + ", ".join(fragments) + "]"
+
+
+class RequestMessages(list):
+    """
+    发送给模型的消息列表快照
+
+    行为与普通 list 相同，额外提供 to_json()，使用所属上下文的编码缓存，
+    模型实现可以直接拼接出请求体而无需重新序列化整段历史。
+    """
+
+    def __init__(
+        self, messages: Iterable[dict[str, Any]], encoder: MessageEncoder
+    ) -> None:
+        super().__init__(messages)
+        self._encoder = encoder
+
+    def to_json(self) -> str:
+        """返回消息列表的 JSON 数组文本"""
+        return self._encoder.encode(self)
+
+
+# 取出后无法被原地修改的值，读取共享快照中的这些值时不需要复制
+_IMMUTABLE_TYPES = (str, bytes, int, float, bool, type(None))
+
+
+class SharedData(MutableMapping[str, Any]):
+    """
+    写时复制的 data 字典（Context.clone 时在上下文之间共享）
+
+    共享的内容只读：第一次写入时浅拷贝字典本身；取出的可变值可能被原地修改，
+    因此只深拷贝被取出的那个值。读取不可变值、遍历和序列化都不复制。
+    """
+
+    def __init__(self, data: dict[str, Any] | None = None):
+        self._data = data if data is not None else {}
+        self._owns_dict = False
+        # 已经属于自己（写入过或已深拷贝）的 key，取出时不再复制
+        self._owned_keys: set[str] = set()
+
+    def _writable(self) -> dict[str, Any]:
+        if not self._owns_dict:
+            self._data = dict(self._data)
+            self._owns_dict = True
+        return self._data
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._data[key]
+        if key not in self._owned_keys and not isinstance(
+            value, _IMMUTABLE_TYPES
+        ):
+            value = copy.deepcopy(value)
+            self._writable()[key] = value
+            self._owned_keys.add(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._writable()[key] = value
+        self._owned_keys.add(key)
+
+    def __delitem__(self, key: str) -> None:
+        del self._writable()[key]
+        self._owned_keys.discard(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, SharedData):
+            other = other._data
+        return self._data == other
+
+    def __repr__(self) -> str:
+        return repr(self._data)
+
+    def fork(self) -> "SharedData":
+        """与新的 SharedData 共享当前内容，之后双方的修改互不影响"""
+        self._owns_dict = False
+        self._owned_keys = set()
+        return SharedData(self._data)
+
+    def peek(self) -> dict[str, Any]:
+        """当前内容（不复制，只能用于读取，例如序列化）"""
+        return self._data
+
+
 @dataclass
 class Context:
     """Agent运行上下文，管理对话历史、状态和统计信息"""
 
-    messages: list[dict[str, Any]] = field(default_factory=list)
-    """对话消息历史"""
+    messages: MutableSequence[dict[str, Any]] = field(
+        default_factory=MessageLog
+    )
+    """对话消息历史（MessageLog，克隆时与原上下文共享未修改的部分）"""
 
     usage: Usage = field(default_factory=Usage)
     """Token使用统计"""
 
-    data: dict[str, Any] = field(default_factory=dict)
-    """自定义数据存储"""
+    data: MutableMapping[str, Any] = field(default_factory=dict)
+    """自定义数据存储（克隆时转换为 SharedData，写时复制）"""
 
     # === 新增元数据字段 ===
     context_id: str = field(default_factory=lambda: str(uuid.uuid4()))
@@ -48,77 +393,127 @@ class Context:
     turn_count: int = 0
     """对话轮次计数"""
 
+    store: "ContextStore | None" = field(
+        default=None, repr=False, compare=False
+    )
+    """持久化存储后端（可选），设置后消息写入时会增量持久化"""
+
+    _persisted_log: MessageLog | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    # 当前每条消息在存储中的序号，以及下一条新消息的序号
+    _seqs: list[int] = field(
+        default_factory=list, init=False, repr=False, compare=False
+    )
+    _next_seq: int = field(default=0, init=False, repr=False, compare=False)
+    _persisted_meta: str | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _encoder: MessageEncoder = field(
+        default_factory=MessageEncoder, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.messages, MessageLog):
+            self.messages = MessageLog(self.messages)
+
     def add_message(self, role: str, content: str, **kwargs: Any) -> None:
         """添加消息到对话历史"""
         message = {"role": role, "content": content}
         if kwargs:
             message.update(kwargs)
         self.messages.append(message)
+        self.persist()
 
     def add_tool_call(
         self, tool_name: str, arguments: dict[str, Any], result: Any
     ) -> None:
         """添加工具调用记录"""
         arguments_json = json.dumps(arguments, ensure_ascii=False)
+        # str 子类（如 MCPToolResult）只保留字符串值，不把附带的数据放进上下文
         result_content = (
-            result
+            str(result)
             if isinstance(result, str)
             else json.dumps(result, ensure_ascii=False)
         )
         # 检查最后一条消息是否已经是包含工具调用的assistant消息
-        if (self.messages and
-            self.messages[-1]["role"] == "assistant" and
-            self.messages[-1].get("tool_calls") is not None):
+        if (
+            self.messages
+            and self.messages[-1]["role"] == "assistant"
+            and self.messages[-1].get("tool_calls") is not None
+        ):
             # 追加到现有的tool_calls列表
+            # 替换而不是原地修改消息，保证按消息缓存的数据（如 token 估算）有效
             tool_call_id = f"call_{len(self.messages)}"
-            self.messages[-1]["tool_calls"].append({
-                "id": tool_call_id,
-                "type": "function",
-                "function": {
-                    "name": tool_name,
-                    "arguments": arguments_json,
-                },
-            })
+            last_message = self.messages[-1]
+            self.messages[-1] = {
+                **last_message,
+                "tool_calls": [
+                    *last_message["tool_calls"],
+                    {
+                        "id": tool_call_id,
+                        "type": "function",
+                        "function": {
+                            "name": tool_name,
+                            "arguments": arguments_json,
+                        },
+                    },
+                ],
+            }
         else:
             # 创建新的assistant消息（第一个工具调用）
             # 检查是否有之前的思考内容需要合并
             thinking_content = ""
-            if (self.messages and
-                self.messages[-1]["role"] == "assistant" and
-                self.messages[-1].get("tool_calls") is None):
+            if (
+                self.messages
+                and self.messages[-1]["role"] == "assistant"
+                and self.messages[-1].get("tool_calls") is None
+            ):
                 # 移除并获取思考内容
                 last_message = self.messages.pop()
                 thinking_content = last_message.get("content", "")
 
             tool_call_id = f"call_{len(self.messages)}"
-            self.messages.append({
-                "role": "assistant",
-                "content": thinking_content if thinking_content else None,
-                "tool_calls": [{
-                    "id": tool_call_id,
-                    "type": "function",
-                    "function": {
-                        "name": tool_name,
-                        "arguments": arguments_json,
-                    },
-                }],
-            })
+            self.messages.append(
+                {
+                    "role": "assistant",
+                    "content": thinking_content if thinking_content else None,
+                    "tool_calls": [
+                        {
+                            "id": tool_call_id,
+                            "type": "function",
+                            "function": {
+                                "name": tool_name,
+                                "arguments": arguments_json,
+                            },
+                        }
+                    ],
+                }
+            )
 
         # 添加工具执行结果
-        self.messages.append({
-            "role": "tool",
-            "name": tool_name,
-            "content": result_content,
-            "tool_call_id": tool_call_id,
-        })
+        self.messages.append(
+            {
+                "role": "tool",
+                "name": tool_name,
+                "content": result_content,
+                "tool_call_id": tool_call_id,
+            }
+        )
+        self.persist()
+
+    def get_messages_for_api(self) -> RequestMessages:
+        """
+        获取适合API调用的消息格式
 
-    def get_messages_for_api(self) -> list[dict[str, Any]]:
-        """获取适合API调用的消息格式"""
-        return self.messages.copy()
+        返回当前消息的快照，其 to_json() 只会编码上次调用后新增或被替换的消息。
+        """
+        return RequestMessages(self.messages, self._encoder)
 
     def set_data(self, key: str, value: Any) -> None:
         """设置上下文数据"""
         self.data[key] = value
+        self.persist()
 
     def get_data(self, key: str, default: Any = None) -> Any:
         """获取上下文数据"""
@@ -128,6 +523,7 @@ class Context:
         """清空对话历史"""
         self.messages.clear()
         self.turn_count = 0
+        self.persist()
 
     def get_summary(self) -> dict[str, Any]:
         """获取上下文摘要信息"""
@@ -140,24 +536,131 @@ class Context:
             "total_tokens": self.usage.total_tokens,
         }
 
+    def persist(self) -> None:
+        """
+        把尚未持久化的变更写入存储后端
+
+        每条消息在存储中有一个只增不减的序号。根据 MessageLog 记录的变更，
+        只写入新增和被替换的消息，开销与变更数量成正比。被裁剪或清空的消息
+        只会被移出上下文，历史记录仍保留在存储中。未设置 store 时不做任何事。
+        """
+        if self.store is None:
+            return
+
+        persisted_log = self._persisted_log
+        if persisted_log is not None and self.messages is persisted_log:
+            changes = persisted_log._take_changes()
+        else:
+            # 首次持久化，或 messages 被整体替换：重新同步全部消息
+            if not isinstance(self.messages, MessageLog):
+                self.messages = MessageLog(self.messages)
+            self.messages._track_changes()
+            self._persisted_log = self.messages
+            changes = [("resync",)]
+
+        seqs = self._seqs
+        rows: dict[int, dict[str, Any]] = {}
+        dropped: list[int] = []
+        for change in changes:
+            if change[0] == "append":
+                rows[self._next_seq] = change[1]
+                seqs.append(self._next_seq)
+                self._next_seq += 1
+            elif change[0] == "set":
+                rows[seqs[change[1]]] = change[2]
+            elif change[0] == "delete":
+                dropped.extend(seqs[change[1] : change[2]])
+                del seqs[change[1] : change[2]]
+            else:
+                dropped.extend(seqs)
+                seqs.clear()
+                for message in self.messages:
+                    rows[self._next_seq] = message
+                    seqs.append(self._next_seq)
+                    self._next_seq += 1
+
+        for seq in dropped:
+            rows.pop(seq, None)
+        if rows:
+            self.store.write_messages(self.context_id, list(rows.items()))
+        if dropped:
+            self.store.drop_messages(self.context_id, dropped)
+
+        meta = self._meta_json()
+        if meta != self._persisted_meta:
+            self.store.save_meta(self.context_id, meta)
+            self._persisted_meta = meta
+
+    def _meta_json(self) -> str:
+        """序列化消息以外的上下文状态"""
+        return json.dumps(
+            {
+                "created_at": self.created_at.isoformat(),
+                "last_agent": self.last_agent,
+                "turn_count": self.turn_count,
+                "usage": [
+                    self.usage.input_tokens,
+                    self.usage.output_tokens,
+                    self.usage.total_tokens,
+                ],
+                "data": self.data.peek()
+                if isinstance(self.data, SharedData)
+                else self.data,
+            },
+            ensure_ascii=False,
+        )
+
+    def _mark_persisted(self, seqs: list[int], next_seq: int) -> None:
+        """
+        标记当前状态已与存储后端一致（从存储加载后调用）
+
+        Args:
+            seqs: 每条消息在存储中的序号
+            next_seq: 下一条新消息使用的序号
+        """
+        if not isinstance(self.messages, MessageLog):
+            self.messages = MessageLog(self.messages)
+        self.messages._track_changes()
+        self._persisted_log = self.messages
+        self._seqs = list(seqs)
+        self._next_seq = next_seq
+        self._persisted_meta = self._meta_json()
+
     def clone(self) -> "Context":
-        """克隆上下文（用于传递给其他 Agent）"""
-        import copy
+        """
+        克隆上下文（用于传递给其他 Agent）
+
+        消息历史通过 MessageLog.fork 与原上下文共享，克隆本身不复制消息；
+        data 转换为 SharedData 由双方共享，写入或取出可变值时才复制。
+        因此克隆的开销与消息数和 data 大小无关，任何一方之后的修改都不会
+        影响另一方。
+        """
+        if not isinstance(self.messages, MessageLog):
+            # messages 被整体替换为普通列表，先转换一次
+            self.messages = MessageLog(self.messages)
 
         new_context = Context()
-        new_context.messages = copy.deepcopy(self.messages)
+        new_context.messages = self.messages.fork()
         new_context.usage = Usage(
             self.usage.input_tokens,
             self.usage.output_tokens,
             self.usage.total_tokens,
         )
-        new_context.data = copy.deepcopy(self.data)
+        if not isinstance(self.data, SharedData) and self.data:
+            self.data = SharedData(dict(self.data))
+        if isinstance(self.data, SharedData):
+            new_context.data = self.data.fork()
         # 保持相同的 context_id 表示是同一个对话
         new_context.context_id = self.context_id
         new_context.created_at = self.created_at
         new_context.last_agent = self.last_agent
         new_context.turn_count = self.turn_count
+        # 克隆体不继承存储后端，避免两个对象写入同一个 context_id
         return new_context
 
     def __str__(self) -> str:
-        return f"Context(id={self.context_id[:8]}..., messages={len(self.messages)}, turns={self.turn_count}, usage={self.usage})"
+        return (
+            f"Context(id={self.context_id[:8]}..., "
+            f"messages={len(self.messages)}, "
+            f"turns={self.turn_count}, usage={self.usage})"
+        )
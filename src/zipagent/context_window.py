@@ -0,0 +1,282 @@
+"""ContextWindow - 上下文窗口管理模块
+
+在每次调用模型前估算对话历史的 token 数，超出预算时按顺序应用裁剪策略。
+每条消息的 token 估算值会被缓存，之后的轮次只需要计算新增或被替换的消息。
+
+使用示例:
+    from zipagent import Agent, ContextWindow, TruncateToolOutputs
+
+    agent = Agent(
+        name="Assistant",
+        instructions="你是一个助手",
+        context_window=ContextWindow(
+            max_tokens=8000,
+            reserve_tokens=1000,
+            strategies=[TruncateToolOutputs(500)],
+        ),
+    )
+"""
+
+import json
+import weakref
+from abc import ABC, abstractmethod
+from collections.abc import Callable
+from typing import Any
+
+from .context import Context
+from .exceptions import TokenLimitError
+
+MESSAGE_OVERHEAD_TOKENS = 4
+"""每条消息的固定开销（角色、分隔符等）"""
+
+
+def estimate_tokens(text: str | None) -> int:
+    """
+    粗略估算文本的 token 数
+
+    ASCII 字符约 4 个对应 1 个 token，中文等非 ASCII 字符约 1 个字对应 1 个
+    token。利用 UTF-8 编码长度计算，避免逐字符遍历。
+    """
+    if not text:
+        return 0
+    char_count = len(text)
+    byte_count = len(text.encode("utf-8"))
+    # 非 ASCII 字符在 UTF-8 中大多占 3 个字节
+    wide_count = min(char_count, (byte_count - char_count) // 2)
+    ascii_count = char_count - wide_count
+    return wide_count + (ascii_count + 3) // 4
+
+
+def estimate_message_tokens(message: dict[str, Any]) -> int:
+    """估算单条消息的 token 数"""
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    content = message.get("content")
+    if isinstance(content, str):
+        tokens += estimate_tokens(content)
+    elif content is not None:
+        tokens += estimate_tokens(json.dumps(content, ensure_ascii=False))
+
+    if message.get("name"):
+        tokens += estimate_tokens(message["name"])
+
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function", {})
+        tokens += MESSAGE_OVERHEAD_TOKENS
+        tokens += estimate_tokens(function.get("name"))
+        tokens += estimate_tokens(function.get("arguments"))
+
+    return tokens
+
+
+def _is_system(message: dict[str, Any]) -> bool:
+    return message.get("role") == "system"
+
+
+class TrimStrategy(ABC):
+    """上下文裁剪策略基类"""
+
+    @abstractmethod
+    def trim(
+        self, context: Context, window: "ContextWindow", budget: int
+    ) -> None:
+        """
+        裁剪上下文中的消息，使其尽量不超过 budget
+
+        策略应通过替换或删除 context.messages 中的元素来减少 token 数，
+        而不是原地修改消息字典，这样窗口的缓存才能识别出变化。
+        可以调用 window.message_tokens(context) 获取每条消息的估算值。
+        """
+
+
+class TruncateToolOutputs(TrimStrategy):
+    """截断过长的工具输出"""
+
+    def __init__(
+        self,
+        max_tokens_per_output: int = 1000,
+        marker: str = "\n...[内容已截断]",
+    ):
+        """
+        Args:
+            max_tokens_per_output: 单条工具输出允许的最大 token 数
+            marker: 截断后追加的提示文本
+        """
+        self.max_tokens_per_output = max_tokens_per_output
+        self.marker = marker
+
+    def trim(
+        self, context: Context, window: "ContextWindow", budget: int
+    ) -> None:
+        tokens = window.message_tokens(context)
+        for i, message in enumerate(context.messages):
+            if message.get("role") != "tool":
+                continue
+            content = message.get("content")
+            if (
+                not isinstance(content, str)
+                or tokens[i] <= self.max_tokens_per_output
+            ):
+                continue
+
+            # 扣除消息开销和截断提示后，按比例保留前半部分内容
+            content_tokens = max(estimate_tokens(content), 1)
+            target = (
+                self.max_tokens_per_output
+                - (tokens[i] - content_tokens)
+                - estimate_tokens(self.marker)
+            )
+            keep = len(content) * max(target, 0) // content_tokens
+            context.messages[i] = {
+                **message,
+                "content": content[:keep] + self.marker,
+            }
+
+
+class DropOldestTurns(TrimStrategy):
+    """
+    从最早的对话轮次开始删除，直到满足预算
+
+    一轮从一条 user 消息开始，到下一条 user 消息之前结束，因此工具调用与
+    工具结果总是一起被删除。开头的系统消息和当前轮次永远不会被删除。
+    """
+
+    def trim(
+        self, context: Context, window: "ContextWindow", budget: int
+    ) -> None:
+        messages = context.messages
+
+        # 开头的系统消息受保护
+        start = 0
+        while start < len(messages) and _is_system(messages[start]):
+            start += 1
+
+        # 最后一条 user 消息开始的当前轮次受保护
+        turn_starts = [
+            i
+            for i in range(start, len(messages))
+            if messages[i].get("role") == "user"
+        ]
+        if len(turn_starts) <= 1:
+            return
+
+        # 在 token 序列上计算需要删除到哪一轮，最后一次性删除
+        tokens = window.message_tokens(context)
+        total = sum(tokens)
+        drop_until = start
+        for next_start in turn_starts[1:]:
+            if total <= budget:
+                break
+            total -= sum(tokens[drop_until:next_start])
+            drop_until = next_start
+
+        if drop_until > start:
+            del messages[start:drop_until]
+
+
+class ContextWindow:
+    """上下文窗口管理器，在调用模型前把对话历史控制在 token 预算内"""
+
+    def __init__(
+        self,
+        max_tokens: int,
+        strategies: list[TrimStrategy] | None = None,
+        reserve_tokens: int = 0,
+        estimator: Callable[[dict[str, Any]], int] = estimate_message_tokens,
+    ):
+        """
+        Args:
+            max_tokens: 模型上下文窗口大小
+            strategies: 裁剪策略，按顺序应用，默认先截断过长的工具输出，
+                再删除最早的对话轮次
+            reserve_tokens: 为模型输出预留的 token 数
+            estimator: 单条消息的 token 估算函数
+        """
+        self.max_tokens = max_tokens
+        self.reserve_tokens = reserve_tokens
+        self.strategies = (
+            strategies
+            if strategies is not None
+            else [TruncateToolOutputs(), DropOldestTurns()]
+        )
+        self.estimator = estimator
+
+        # 每个上下文一份缓存：(消息对象, token 数)，按位置对齐
+        self._caches: dict[int, list[tuple[dict[str, Any], int]]] = {}
+        self._tools_ref: list[dict[str, Any]] | None = None
+        self._tools_tokens = 0
+
+    def message_tokens(self, context: Context) -> list[int]:
+        """
+        获取每条消息的 token 估算值
+
+        只有新增或被替换的消息才会重新估算。
+        """
+        key = id(context)
+        cache = self._caches.get(key)
+        if cache is None:
+            cache = []
+            self._caches[key] = cache
+            # 上下文被回收后清理缓存
+            weakref.finalize(context, self._caches.pop, key, None)
+
+        messages = context.messages
+        tokens = []
+        for i, message in enumerate(messages):
+            if i < len(cache) and cache[i][0] is message:
+                tokens.append(cache[i][1])
+                continue
+            count = self.estimator(message)
+            if i < len(cache):
+                cache[i] = (message, count)
+            else:
+                cache.append((message, count))
+            tokens.append(count)
+        del cache[len(messages) :]
+        return tokens
+
+    def count_tokens(self, context: Context) -> int:
+        """估算上下文当前的 token 总数"""
+        return sum(self.message_tokens(context))
+
+    def fit(
+        self, context: Context, tools: list[dict[str, Any]] | None = None
+    ) -> int:
+        """
+        把上下文裁剪到预算以内
+
+        Args:
+            context: 要裁剪的上下文
+            tools: 本次请求携带的工具 schema，会计入预算
+
+        Returns:
+            int: 裁剪后的 token 估算值
+
+        Raises:
+            TokenLimitError: 应用所有策略后仍超出预算
+        """
+        # 消息可用的预算需扣除输出预留和工具 schema
+        budget = (
+            self.max_tokens - self.reserve_tokens - self._estimate_tools(tools)
+        )
+
+        total = self.count_tokens(context)
+        for strategy in self.strategies:
+            if total <= budget:
+                break
+            strategy.trim(context, self, budget)
+            total = self.count_tokens(context)
+
+        if total > budget:
+            raise TokenLimitError(total, budget)
+        return total
+
+    def _estimate_tools(self, tools: list[dict[str, Any]] | None) -> int:
+        """估算工具 schema 的 token 数，工具列表不变时复用结果"""
+        if not tools:
+            return 0
+        if tools is not self._tools_ref:
+            self._tools_tokens = estimate_tokens(
+                json.dumps(tools, ensure_ascii=False)
+            )
+            self._tools_ref = tools
+        return self._tools_tokens
@@ -34,11 +34,35 @@ class ModelError(ZipAgentError):
         message: str,
         model_name: str | None = None,
         status_code: int | None = None,
+        retry_after: float | None = None,
         **kwargs,
     ):
         details = {"model_name": model_name, "status_code": status_code}
+        if retry_after is not None:
+            details["retry_after"] = retry_after
         super().__init__(message, details, **kwargs)
 
+    @property
+    def status_code(self) -> int | None:
+        """HTTP 状态码（如果有）"""
+        return self.details.get("status_code")
+
+    @property
+    def retry_after(self) -> float | None:
+        """服务端建议的重试等待秒数（Retry-After）"""
+        return self.details.get("retry_after")
+
+
+class CircuitOpenError(ModelError):
+    """熔断器打开，请求被拒绝"""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(
+            f"模型端点 {endpoint} 已熔断，{retry_after:.1f} 秒后重试",
+            retry_after=retry_after,
+        )
+        self.details["endpoint"] = endpoint
+
 
 class ToolError(ZipAgentError):
     """工具执行相关错误"""
@@ -75,6 +99,20 @@ class ToolExecutionError(ToolError):
         )
 
 
+class ToolTimeoutError(ToolError):
+    """工具执行超时"""
+
+    def __init__(
+        self, tool_name: str, arguments: dict[str, Any], timeout: float
+    ):
+        super().__init__(
+            f"工具 '{tool_name}' 执行超时 ({timeout} 秒)",
+            tool_name=tool_name,
+            arguments=arguments,
+        )
+        self.details["timeout"] = timeout
+
+
 class ContextError(ZipAgentError):
     """上下文管理相关错误"""
 
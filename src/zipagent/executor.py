@@ -0,0 +1,302 @@
+"""Executor - 工具执行器模块
+
+提供工具执行所需的后台设施：常驻的后台事件循环（同步路径执行异步工具）、
+守护线程执行，以及 CPU 密集型工具的进程池执行模式。
+
+进程池模式下，工具函数在常驻的工作进程中运行，不再占用主进程的 GIL，
+其他对话可以继续执行。参数和结果通过 pickle 传递，
+结果在工作进程中序列化并检查大小，超出限制时不会传回主进程。
+
+使用示例:
+    from zipagent import function_tool
+
+    @function_tool(executor="process")
+    def parse_report(text: str) -> dict:
+        ...
+
+    # 可选：调整进程池大小
+    from zipagent.executor import configure_process_pool
+    configure_process_pool(max_workers=4)
+"""
+
+import asyncio
+import atexit
+import importlib
+import inspect
+import os
+import pickle
+import threading
+from collections.abc import Callable, Coroutine
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any
+
+DEFAULT_MAX_RESULT_BYTES = 10 * 1024 * 1024
+"""进程模式下工具结果（pickle 后）的默认大小上限"""
+
+
+class ToolResultTooLargeError(Exception):
+    """工具结果超出大小限制"""
+
+
+def _resolve_function(module_name: str, qualname: str) -> Callable[..., Any]:
+    """在工作进程中按模块和限定名找到工具函数"""
+    target: Any = importlib.import_module(module_name)
+    for part in qualname.split("."):
+        target = getattr(target, part)
+    # 被 @function_tool 装饰后，模块属性是 Tool 对象
+    if not inspect.isroutine(target):
+        target = target.function
+    return target
+
+
+def _call_in_worker(
+    module_name: str,
+    qualname: str,
+    arguments: dict[str, Any],
+    max_result_bytes: int | None,
+) -> bytes:
+    """工作进程入口：执行函数并返回 pickle 后的结果"""
+    function = _resolve_function(module_name, qualname)
+    payload = pickle.dumps(function(**arguments))
+    if max_result_bytes is not None and len(payload) > max_result_bytes:
+        raise ToolResultTooLargeError(
+            f"工具结果大小 {len(payload)} 字节，"
+            f"超过限制 {max_result_bytes} 字节"
+        )
+    return payload
+
+
+def _warmup() -> int:
+    return os.getpid()
+
+
+def is_importable(function: Callable[..., Any]) -> bool:
+    """函数能否在工作进程中按模块和限定名找到"""
+    qualname = getattr(function, "__qualname__", "")
+    module_name = getattr(function, "__module__", None)
+    return bool(module_name) and "<" not in qualname
+
+
+class ProcessPool:
+    """
+    常驻进程池
+
+    首次使用时创建，并预先启动工作进程；工作进程异常退出导致进程池损坏时，
+    下一次提交会自动重建。
+    """
+
+    def __init__(self, max_workers: int | None = None, warm: bool = True):
+        """
+        Args:
+            max_workers: 工作进程数，默认为 CPU 核数
+            warm: 创建时是否预先启动所有工作进程
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.warm = warm
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _ensure_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                if self.warm:
+                    warmups = [
+                        executor.submit(_warmup)
+                        for _ in range(self.max_workers)
+                    ]
+                    for future in warmups:
+                        future.result()
+                self._executor = executor
+            return self._executor
+
+    def submit(
+        self,
+        function: Callable[..., Any],
+        arguments: dict[str, Any],
+        max_result_bytes: int | None = DEFAULT_MAX_RESULT_BYTES,
+    ) -> Future:
+        """提交工具函数，返回结果的 Future"""
+        executor = self._ensure_executor()
+        args = (
+            function.__module__,
+            function.__qualname__,
+            arguments,
+            max_result_bytes,
+        )
+        try:
+            inner = executor.submit(_call_in_worker, *args)
+        except BrokenProcessPool:
+            self._discard(executor)
+            executor = self._ensure_executor()
+            inner = executor.submit(_call_in_worker, *args)
+
+        future: Future = Future()
+
+        def unpickle(done: Future) -> None:
+            if future.cancelled():
+                return
+            if done.cancelled():
+                future.cancel()
+                return
+            error = done.exception()
+            if isinstance(error, BrokenProcessPool):
+                # 工作进程崩溃，丢弃进程池，下次调用时重建
+                self._discard(executor)
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(pickle.loads(done.result()))
+
+        # 取消外层 Future 时，尚未开始的任务也不再执行
+        future.add_done_callback(
+            lambda f: inner.cancel() if f.cancelled() else None
+        )
+        inner.add_done_callback(unpickle)
+        return future
+
+    def call(
+        self,
+        function: Callable[..., Any],
+        arguments: dict[str, Any],
+        max_result_bytes: int | None = DEFAULT_MAX_RESULT_BYTES,
+    ) -> Any:
+        """在工作进程中执行函数并返回结果"""
+        return self.submit(function, arguments, max_result_bytes).result()
+
+    def _discard(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """关闭进程池"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def run_in_thread(
+    function: Callable[..., Any], *args: Any, name: str | None = None
+) -> Future:
+    """
+    在新的守护线程中执行函数，返回结果的 Future
+
+    与线程池不同，调用方放弃等待后线程不会占用共享的工作线程，
+    也不会阻止解释器退出。
+    """
+    future: Future = Future()
+
+    def target() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(function(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=target, name=name, daemon=True).start()
+    return future
+
+
+class BackgroundLoop:
+    """
+    在守护线程中常驻运行的事件循环
+
+    同步代码可以把协程提交到这里执行，而不必每次调用 asyncio.run
+    创建新的事件循环；协程之间共享同一个循环，I/O 可以并发进行。
+    """
+
+    def __init__(self, name: str = "zipagent-loop"):
+        self.name = name
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """后台事件循环，首次访问时启动"""
+        with self._lock:
+            if self._loop is None or not self._thread.is_alive():
+                loop = asyncio.new_event_loop()
+                started = threading.Event()
+
+                def run() -> None:
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(started.set)
+                    loop.run_forever()
+
+                thread = threading.Thread(
+                    target=run, name=self.name, daemon=True
+                )
+                thread.start()
+                started.wait()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    def in_loop_thread(self) -> bool:
+        """当前是否在后台事件循环的线程中"""
+        return threading.current_thread() is self._thread
+
+    def submit(self, coro: Coroutine[Any, Any, Any]) -> Future:
+        """提交协程，返回结果的 Future；取消 Future 会取消对应的任务"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(
+        self, coro: Coroutine[Any, Any, Any], timeout: float | None = None
+    ) -> Any:
+        """在后台事件循环中执行协程并同步等待结果"""
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("不能在后台事件循环线程中同步等待协程")
+        return self.submit(coro).result(timeout)
+
+    def stop(self) -> None:
+        """停止后台事件循环"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop, self._thread = None, None
+        if loop is None or thread is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not threading.current_thread():
+            thread.join()
+            loop.close()
+
+
+_background_loop = BackgroundLoop()
+
+
+def get_background_loop() -> BackgroundLoop:
+    """获取进程内共用的后台事件循环"""
+    return _background_loop
+
+
+_default_pool = ProcessPool()
+_default_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPool:
+    """获取进程模式工具共用的进程池"""
+    return _default_pool
+
+
+def configure_process_pool(
+    max_workers: int | None = None, warm: bool = True
+) -> ProcessPool:
+    """重新配置共用的进程池（旧的进程池会被关闭）"""
+    global _default_pool
+    with _default_pool_lock:
+        old_pool = _default_pool
+        _default_pool = ProcessPool(max_workers, warm)
+    old_pool.shutdown(wait=False)
+    return _default_pool
+
+
+@atexit.register
+def _shutdown_default_pool() -> None:
+    _default_pool.shutdown(wait=False)
+    _background_loop.stop()
@@ -26,9 +26,20 @@ MCP 工具集成模块
 """
 
 import asyncio
+import binascii
+import hashlib
+import json
+import mimetypes
 import os
+import random
+import tempfile
+import threading
+import time
 import uuid
-from contextlib import AsyncExitStack
+from collections import deque
+from collections.abc import AsyncIterator, Callable, Coroutine
+from concurrent.futures import Future
+from contextlib import AsyncExitStack, asynccontextmanager, suppress
 from dataclasses import dataclass, field
 from typing import TYPE_CHECKING, Any, Optional
 
@@ -38,24 +49,78 @@ if TYPE_CHECKING:
     MCPToolGroupType = TypeVar("MCPToolGroupType", bound="MCPToolGroup")
 
 from .exceptions import ToolError
-from .tool import Tool, ToolResult
+from .executor import get_background_loop
+from .tool import Tool, _tool_groups_changed
 
 # MCP 相关导入
 try:
+    import anyio
     from mcp import ClientSession, StdioServerParameters
     from mcp.client.stdio import stdio_client
 
     MCP_AVAILABLE = True
 except ImportError:
     MCP_AVAILABLE = False
+    anyio = None
     ClientSession = None
     StdioServerParameters = None
     stdio_client = None
 
+# HTTP 传输（streamable HTTP / SSE），需要较新版本的 MCP SDK
+try:
+    from mcp.client.sse import sse_client
+    from mcp.shared._httpx_utils import create_mcp_http_client
+
+    try:
+        from mcp.client.streamable_http import streamable_http_client
+
+        streamablehttp_client = None
+    except ImportError:
+        # mcp 1.x：共用的 client 通过 httpx_client_factory 传入
+        from mcp.client.streamable_http import streamablehttp_client
+
+        streamable_http_client = None
+
+    MCP_HTTP_AVAILABLE = True
+except ImportError:
+    MCP_HTTP_AVAILABLE = False
+    sse_client = None
+    streamable_http_client = None
+    streamablehttp_client = None
+    create_mcp_http_client = None
+
+TRANSPORTS = ("stdio", "streamable-http", "sse")
+
+# JSON-RPC 错误码：连接已关闭（服务器进程退出）
+_CONNECTION_CLOSED = -32000
+
+
+def _is_connection_lost(error: BaseException) -> bool:
+    """判断异常是否表示与服务器的连接已断开"""
+    code = getattr(getattr(error, "error", None), "code", None)
+    if code is None:
+        code = getattr(error, "code", None)
+    if code == _CONNECTION_CLOSED:
+        return True
+    lost_types: tuple[type[BaseException], ...] = (
+        BrokenPipeError,
+        ConnectionError,
+    )
+    if anyio is not None:
+        lost_types += (
+            anyio.BrokenResourceError,
+            anyio.ClosedResourceError,
+            anyio.EndOfStream,
+        )
+    return isinstance(error, lost_types)
+
 
 class MCPError(ToolError):
     """MCP 相关错误"""
 
+    def __init__(self, message: str, tool_name: str = "mcp", **kwargs):
+        super().__init__(message, tool_name=tool_name, **kwargs)
+
 
 class MCPNotAvailableError(MCPError):
     """MCP SDK 未安装"""
@@ -79,113 +144,920 @@ class MCPServerConfig:
     """MCP 服务器配置"""
 
     name: str
-    command: str
+    command: str = ""  # stdio 传输的启动命令
     args: list[str] = field(default_factory=list)
     env: dict[str, str] | None = None
     tools: list[str] | None = None  # 指定要导入的工具，None 表示全部
+    max_in_flight: int | None = 16  # 同时进行的请求数上限，None 表示不限制
+    version: str | None = None  # 服务器版本（可选），用于区分工具列表缓存
+    idle_timeout: float | None = None  # 空闲多久（秒）后关闭服务器进程
+    ping_interval: float | None = 30.0  # 健康检查间隔（秒），None 表示不检查
+    restart_backoff: float = 0.5  # 崩溃后重启失败时的初始退避时间（秒）
+    max_restart_backoff: float = 30.0  # 退避时间上限（秒）
+    idempotent_tools: list[str] | None = None  # 断线时可以安全重试的工具
+    spill_threshold: int | None = 256 * 1024  # 超过该大小的二进制内容写入文件
+    spill_dir: str | None = None  # 二进制内容的落盘目录，默认为系统临时目录
+    spill_ttl: float | None = 24 * 3600  # 落盘文件保留时间（秒）
+    url: str | None = None  # HTTP 传输的服务器地址
+    transport: str = "stdio"  # stdio / streamable-http / sse
+    headers: dict[str, str] | None = None  # HTTP 传输的请求头
+
+
+class _ToolListCache:
+    """
+    list_tools 结果的磁盘缓存
+
+    以 command / args / version（HTTP 传输时加上 url）为 key，
+    每个服务器一个 JSON 文件。
+    命中时可以先用缓存的 schema 创建工具组，真正的握手在后台完成。
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _file(self, config: MCPServerConfig) -> str:
+        fields: dict[str, Any] = {
+            "command": config.command,
+            "args": config.args,
+            "version": config.version,
+        }
+        if config.url:
+            fields["url"] = config.url
+        key = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def load(self, config: MCPServerConfig) -> list[dict[str, Any]] | None:
+        """读取缓存的工具列表，未命中返回 None"""
+        try:
+            with open(self._file(config), encoding="utf-8") as f:
+                return json.load(f)["tools"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(
+        self, config: MCPServerConfig, tools: list[dict[str, Any]]
+    ) -> None:
+        """保存工具列表"""
+        data = {
+            "command": config.command,
+            "args": config.args,
+            "version": config.version,
+            "tools": tools,
+        }
+        path = self._file(config)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError:
+            # 缓存只是优化，写入失败不影响连接
+            pass
+
+
+@dataclass
+class MCPContentPart:
+    """MCP 工具结果中的一个内容块"""
+
+    type: str  # text / image / audio / resource / resource_link
+    text: str | None = None
+    data: memoryview | None = None  # 解码后的二进制内容（未落盘时）
+    mime_type: str | None = None
+    uri: str | None = None
+    path: str | None = None  # 二进制内容落盘后的文件路径
+    size: int = 0
+
+    @property
+    def is_binary(self) -> bool:
+        return self.data is not None or self.path is not None
+
+    def read(self) -> bytes | memoryview:
+        """读取二进制内容（内存中的内容不复制，直接返回 memoryview）"""
+        if self.data is not None:
+            return self.data
+        if self.path is not None:
+            with open(self.path, "rb") as f:
+                return f.read()
+        raise ValueError(f"内容块不包含二进制数据: {self.type}")
+
+    def describe(self) -> str:
+        """放入上下文的紧凑描述：文本原样返回，二进制内容只保留引用"""
+        if self.text is not None:
+            return self.text
+        if not self.is_binary:
+            return f"[{self.type}: {self.uri}]"
+        fields = [self.mime_type or "application/octet-stream"]
+        fields.append(f"{self.size} 字节")
+        if self.uri:
+            fields.append(f"uri: {self.uri}")
+        if self.path:
+            fields.append(f"文件: {self.path}")
+        return f"[{self.type}: {', '.join(fields)}]"
+
+
+class MCPToolResult(str):
+    """
+    MCP 工具的结构化结果
+
+    保留结果中的全部内容块，图片、音频等二进制内容只解码一次；
+    超过 spill_threshold 的内容写入文件，内存中不再保留。上下文中保存的是
+    文件路径，因此文件不随结果对象回收：超过 spill_ttl 的文件在之后落盘时
+    被清理，也可以调用 cleanup 提前删除。需要长期保留的文件应自行复制。
+
+    作为字符串时是放入上下文的紧凑文本：文本块依次拼接，
+    二进制内容只包含类型、大小和文件路径，不会把 base64 数据放进上下文。
+    """
+
+    parts: list[MCPContentPart]
+    is_error: bool
+    structured: dict[str, Any] | None
+
+    def __new__(
+        cls,
+        parts: list[MCPContentPart],
+        is_error: bool = False,
+        structured: dict[str, Any] | None = None,
+    ) -> "MCPToolResult":
+        if parts:
+            text = "\n".join(part.describe() for part in parts)
+        elif structured is not None:
+            text = json.dumps(structured, ensure_ascii=False)
+        else:
+            text = ""
+        result = super().__new__(cls, text)
+        result.parts = parts
+        result.is_error = is_error
+        result.structured = structured
+        return result
+
+    @property
+    def text(self) -> str:
+        """全部文本块拼接后的内容"""
+        return "\n".join(
+            part.text for part in self.parts if part.text is not None
+        )
+
+    @property
+    def blobs(self) -> list[MCPContentPart]:
+        """包含二进制内容的内容块"""
+        return [part for part in self.parts if part.is_binary]
+
+    def cleanup(self) -> None:
+        """立即删除落盘的文件"""
+        for part in self.parts:
+            if part.path is not None:
+                with suppress(OSError):
+                    os.remove(part.path)
+            part.path = None
+
+
+_SPILL_PREFIX = "zipagent-mcp-"
+_SPILL_SWEEP_INTERVAL = 60.0  # 同一目录两次清理之间的最短间隔（秒）
+_spill_sweeps: dict[str, float] = {}
+_spill_lock = threading.Lock()
+
+
+def _sweep_spilled(directory: str, ttl: float) -> None:
+    """删除目录中超过保留时间的落盘文件"""
+    now = time.time()
+    with _spill_lock:
+        if now - _spill_sweeps.get(directory, 0) < _SPILL_SWEEP_INTERVAL:
+            return
+        _spill_sweeps[directory] = now
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+    for entry in entries:
+        if not entry.name.startswith(_SPILL_PREFIX):
+            continue
+        with suppress(OSError):
+            if entry.stat().st_mtime + ttl < now:
+                os.remove(entry.path)
+
+
+def _field(item: Any, name: str, legacy_name: str) -> Any:
+    """mcp 2.x 字段为 snake_case，1.x 为 camelCase"""
+    value = getattr(item, name, None)
+    return value if value is not None else getattr(item, legacy_name, None)
+
+
+def _binary_part(
+    kind: str,
+    encoded: str,
+    mime_type: str | None,
+    uri: str | None,
+    config: MCPServerConfig,
+) -> MCPContentPart:
+    """解码 base64 内容，超过阈值时写入文件（同时清理过期的落盘文件）"""
+    data = memoryview(binascii.a2b_base64(encoded))
+    part = MCPContentPart(
+        kind, data=data, mime_type=mime_type, uri=uri, size=len(data)
+    )
+    threshold = config.spill_threshold
+    if threshold is not None and part.size > threshold:
+        directory = config.spill_dir or tempfile.gettempdir()
+        if config.spill_ttl is not None:
+            _sweep_spilled(directory, config.spill_ttl)
+        suffix = mimetypes.guess_extension(mime_type or "") or ""
+        fd, path = tempfile.mkstemp(
+            prefix=_SPILL_PREFIX, suffix=suffix, dir=directory
+        )
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        part.data, part.path = None, path
+    return part
+
+
+def _content_part(item: Any, config: MCPServerConfig) -> MCPContentPart:
+    kind = getattr(item, "type", None)
+    mime_type = _field(item, "mime_type", "mimeType")
+    if kind == "text":
+        return MCPContentPart("text", text=item.text)
+    if kind in ("image", "audio"):
+        return _binary_part(kind, item.data, mime_type, None, config)
+    if kind == "resource":
+        resource = item.resource
+        uri = str(resource.uri)
+        mime_type = _field(resource, "mime_type", "mimeType")
+        if getattr(resource, "text", None) is not None:
+            return MCPContentPart(
+                "resource", text=resource.text, mime_type=mime_type, uri=uri
+            )
+        return _binary_part("resource", resource.blob, mime_type, uri, config)
+    if kind == "resource_link":
+        return MCPContentPart(
+            "resource_link",
+            mime_type=mime_type,
+            uri=str(item.uri),
+            size=getattr(item, "size", None) or 0,
+        )
+    return MCPContentPart(str(kind), text=str(item))
+
+
+def _build_result(result: Any, config: MCPServerConfig) -> MCPToolResult:
+    """把 CallToolResult 转换为 MCPToolResult"""
+    return MCPToolResult(
+        [_content_part(item, config) for item in result.content or []],
+        is_error=bool(_field(result, "is_error", "isError")),
+        structured=_field(result, "structured_content", "structuredContent"),
+    )
+
+
+class _SharedHTTPClient:
+    """把共用的 AsyncClient 交给 sse_client 等，退出时不关闭"""
+
+    def __init__(self, client: Any):
+        self.client = client
+
+    async def __aenter__(self) -> Any:
+        return self.client
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        return None
+
+
+class _HTTPConnectionPool:
+    """
+    进程内共用的 HTTP 连接池
+
+    请求头相同的 MCP 会话共用一个 AsyncClient，keep-alive 连接在会话之间复用；
+    最后一个会话关闭后 AsyncClient 随之关闭。只在后台事件循环中使用。
+    """
+
+    def __init__(self):
+        self._clients: dict[frozenset, Any] = {}
+        self._users: dict[int, int] = {}
+
+    def acquire(self, headers: dict[str, str] | None) -> Any:
+        key = frozenset((headers or {}).items())
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = create_mcp_http_client(headers=headers)
+            self._clients[key] = client
+        self._users[id(client)] = self._users.get(id(client), 0) + 1
+        return client
+
+    async def release(self, client: Any) -> None:
+        users = self._users.get(id(client), 0) - 1
+        if users > 0:
+            self._users[id(client)] = users
+            return
+        self._users.pop(id(client), None)
+        for key, value in list(self._clients.items()):
+            if value is client:
+                del self._clients[key]
+        await client.aclose()
+
+    @staticmethod
+    def factory(client: Any) -> Callable[..., _SharedHTTPClient]:
+        """httpx_client_factory 参数使用的工厂，始终返回共用的 client"""
+        return lambda **kwargs: _SharedHTTPClient(client)
+
+    def stats(self) -> dict[str, int]:
+        """共用的 AsyncClient 数和使用它们的会话数"""
+        return {
+            "clients": len(self._clients),
+            "sessions": sum(self._users.values()),
+        }
+
+
+_http_pool = _HTTPConnectionPool()
+
+
+def http_pool_stats() -> dict[str, int]:
+    """进程内共用 HTTP 连接池的统计"""
+    return _http_pool.stats()
 
 
 class MCPClient:
-    """MCP 客户端，基于官方 SDK 实现"""
+    """
+    MCP 客户端，基于官方 SDK 实现
+
+    会话始终运行在进程内共用的后台事件循环中（见 executor.BackgroundLoop），
+    由一个常驻任务持有传输连接（stdio 子进程或 HTTP）和 ClientSession。
+    无论调用方来自哪个事件循环或线程，请求都通过 run_coroutine_threadsafe
+    提交到这个循环，
+    会话在多次调用之间保持稳定，也不需要每次调用创建新的事件循环。
+
+    连接期间定期 ping 服务器；ping 失败或请求发现连接断开时视为崩溃，
+    在后台按指数退避重新启动服务器。
+    """
 
     def __init__(self, config: MCPServerConfig):
         if not MCP_AVAILABLE:
             raise MCPNotAvailableError()
+        if config.transport not in TRANSPORTS:
+            raise MCPError(f"不支持的 MCP 传输方式: {config.transport}")
+        if config.transport != "stdio":
+            if not MCP_HTTP_AVAILABLE:
+                raise MCPError("当前 MCP SDK 不支持 HTTP 传输，请升级 mcp")
+            if not config.url:
+                raise MCPError(f"{config.transport} 传输需要指定 url")
+        elif not config.command:
+            raise MCPError("stdio 传输需要指定启动命令")
 
         self.config = config
         self.session: ClientSession | None = None
-        self.exit_stack = AsyncExitStack()
-        self.stdio = None
-        self.write = None
         self.is_connected = False
+        self._serve_task: asyncio.Task | None = None
+        self._closing: asyncio.Event | None = None
+        self._connect_lock = asyncio.Lock()
+        self._draining = False
+        self._respawn_task: asyncio.Task | None = None
+        self._connected_at: float | None = None
+        self.restarts = 0
+        self.retries = 0
+
+        # 同一会话上的请求并发进行（JSON-RPC 按 id 匹配响应），
+        # 信号量限制单个服务器同时处理的请求数
+        self._slots = (
+            asyncio.Semaphore(config.max_in_flight)
+            if config.max_in_flight
+            else None
+        )
+        self._metrics_lock = threading.Lock()
+        self._queued = 0
+        self._in_flight = 0
+        self._peak_in_flight = 0
+        self._calls = 0
+        self._errors = 0
+        self._latencies: deque[float] = deque(maxlen=200)
+        self._last_used = time.monotonic()
+        self.idle_shutdowns = 0
+        self.suspended = True
+        """进程是否尚未启动或已主动关闭（空闲超时、suspend()），而不是崩溃"""
+
+    @staticmethod
+    async def _on_loop(coro: Coroutine[Any, Any, Any]) -> Any:
+        """在后台事件循环中执行协程；已在该循环中时直接 await"""
+        background = get_background_loop()
+        if background.in_loop_thread():
+            return await coro
+        return await asyncio.wrap_future(background.submit(coro))
 
     async def connect(self) -> None:
         """连接到 MCP 服务器"""
-        if self.is_connected:
-            return
-
-        try:
-            # 准备环境变量
-            env = dict(os.environ)
-            if self.config.env:
-                env.update(self.config.env)
-
-            # 创建服务器参数
-            server_params = StdioServerParameters(
-                command=self.config.command, args=self.config.args, env=env
-            )
-
-            # 建立连接
-            stdio_transport = await self.exit_stack.enter_async_context(
-                stdio_client(server_params)
+        await self._on_loop(self._connect())
+
+    async def _connect(self) -> None:
+        async with self._connect_lock:
+            if self.is_connected:
+                return
+
+            # 连接断开后重连：先等旧连接清理完毕
+            old_task = self._serve_task
+            if old_task is not None:
+                self._closing.set()
+                await asyncio.gather(old_task, return_exceptions=True)
+
+            ready = asyncio.get_running_loop().create_future()
+            self._closing = asyncio.Event()
+            self._draining = False
+            self._serve_task = asyncio.create_task(self._serve(ready))
+            try:
+                await ready
+            except Exception as e:
+                self._serve_task = None
+                raise MCPServerError(f"连接 MCP 服务器失败: {e}") from e
+
+    async def _ensure_connected(self, tool_name: str = "mcp") -> None:
+        """未连接时先建立连接（懒启动、空闲关闭之后），正在连接时等待其完成"""
+        if not self.is_connected and not self._draining:
+            if self._respawning:
+                # 崩溃后的重启由后台任务按退避进行，调用方不再额外重试
+                raise MCPCommunicationError(
+                    "MCP 服务器已断开，正在重启", tool_name=tool_name
+                )
+            await self._connect()
+        if not self.is_connected or not self.session:
+            raise MCPCommunicationError(
+                "未连接到 MCP 服务器", tool_name=tool_name
             )
-            self.stdio, self.write = stdio_transport
 
-            # 创建会话
-            self.session = await self.exit_stack.enter_async_context(
-                ClientSession(self.stdio, self.write)
-            )
+    def _connection_lost(self) -> None:
+        """服务器进程退出：标记为未连接，并让持有连接的任务退出"""
+        self.is_connected = False
+        self.suspended = False
+        if self._closing is not None:
+            self._closing.set()
+
+    @property
+    def _respawning(self) -> bool:
+        return self._respawn_task is not None and not self._respawn_task.done()
+
+    async def _respawn(self) -> None:
+        """崩溃后重新启动服务器，失败时按指数退避重试"""
+        delay = self.config.restart_backoff
+        while not self._draining:
+            try:
+                await self._connect()
+            except MCPServerError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.config.max_restart_backoff)
+                continue
+            self.restarts += 1
+            return
 
-            # 初始化连接
-            await self.session.initialize()
-            self.is_connected = True
+    @property
+    def load(self) -> int:
+        """排队和进行中的请求数"""
+        with self._metrics_lock:
+            return self._queued + self._in_flight
 
+    async def _serve(self, ready: asyncio.Future) -> None:
+        """持有连接的常驻任务，连接的建立和关闭都在这个任务中完成"""
+        crashed = False
+        try:
+            async with AsyncExitStack() as stack:
+                if self.config.transport == "stdio":
+                    streams = await stack.enter_async_context(
+                        self._stdio_transport()
+                    )
+                else:
+                    streams = await stack.enter_async_context(
+                        self._http_transport()
+                    )
+                read, write = streams[0], streams[1]
+                session = await stack.enter_async_context(
+                    ClientSession(read, write)
+                )
+                await session.initialize()
+
+                self.session = session
+                self.is_connected = True
+                self.suspended = False
+                self._last_used = self._connected_at = time.monotonic()
+                ready.set_result(None)
+                await self._supervise(session)
         except Exception as e:
-            raise MCPServerError(f"连接 MCP 服务器失败: {e}")
+            if not ready.done():
+                ready.set_exception(e)
+        finally:
+            # 连接建立后，既不是主动关闭也不是空闲关闭：服务器崩溃
+            crashed = (
+                ready.done()
+                and not ready.cancelled()
+                and ready.exception() is None
+                and not (self._draining or self.suspended)
+            )
+            self.session = None
+            self.is_connected = False
+            self._connected_at = None
+        if crashed and not self._respawning:
+            self._respawn_task = asyncio.create_task(self._respawn())
+
+    def _stdio_transport(self) -> Any:
+        # 准备环境变量
+        env = dict(os.environ)
+        if self.config.env:
+            env.update(self.config.env)
+
+        # 创建服务器参数
+        server_params = StdioServerParameters(
+            command=self.config.command, args=self.config.args, env=env
+        )
+        return stdio_client(server_params)
+
+    @asynccontextmanager
+    async def _http_transport(self) -> AsyncIterator[Any]:
+        """HTTP 传输：会话使用进程内共用的 HTTP 连接池"""
+        client = _http_pool.acquire(self.config.headers)
+        try:
+            if self.config.transport == "sse":
+                async with sse_client(
+                    self.config.url,
+                    headers=self.config.headers,
+                    httpx_client_factory=_http_pool.factory(client),
+                ) as streams:
+                    yield streams
+            elif streamable_http_client is not None:
+                async with streamable_http_client(
+                    self.config.url, http_client=client
+                ) as streams:
+                    yield streams
+            else:
+                async with streamablehttp_client(
+                    self.config.url,
+                    headers=self.config.headers,
+                    httpx_client_factory=_http_pool.factory(client),
+                ) as streams:
+                    yield streams
+        finally:
+            await _http_pool.release(client)
+
+    async def _supervise(self, session: "ClientSession") -> None:
+        """
+        连接期间的常驻循环：等待连接被关闭，定期 ping 服务器，
+        设置了 idle_timeout 时空闲超时后返回
+        """
+        idle_timeout = self.config.idle_timeout
+        ping_interval = self.config.ping_interval
+        next_ping = time.monotonic() + ping_interval if ping_interval else None
+
+        while not self._closing.is_set():
+            now = time.monotonic()
+            deadlines = []
+            if idle_timeout is not None:
+                idle_at = self._last_used + idle_timeout
+                if idle_at <= now and not self.load:
+                    # 先标记为未连接，之后的调用会重新启动服务器
+                    self.is_connected = False
+                    self.suspended = True
+                    self.idle_shutdowns += 1
+                    return
+                deadlines.append(max(idle_at, now + 0.05))
+            if next_ping is not None:
+                if next_ping <= now:
+                    try:
+                        await asyncio.wait_for(
+                            session.send_ping(), timeout=ping_interval
+                        )
+                    except Exception:
+                        # 服务器退出或无响应
+                        if not self._closing.is_set():
+                            self._connection_lost()
+                        return
+                    next_ping = time.monotonic() + ping_interval
+                    continue
+                deadlines.append(next_ping)
+
+            timeout = min(deadlines) - now if deadlines else None
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._closing.wait(), timeout=timeout)
+
+    async def suspend(self) -> None:
+        """关闭服务器进程但保留客户端，下次调用时重新启动"""
+        await self._on_loop(self._suspend())
+
+    async def _suspend(self) -> None:
+        async with self._connect_lock:
+            task = self._serve_task
+            if task is None:
+                return
+            self.is_connected = False
+            self.suspended = True
+            self._closing.set()
+            await asyncio.gather(task, return_exceptions=True)
 
     async def list_tools(self) -> list[dict[str, Any]]:
         """获取工具列表"""
-        if not self.is_connected or not self.session:
-            raise MCPCommunicationError("未连接到 MCP 服务器")
+        return await self._on_loop(self._list_tools())
+
+    async def _list_tools(self) -> list[dict[str, Any]]:
+        await self._ensure_connected()
 
         try:
             response = await self.session.list_tools()
-            tools = []
+        except Exception as e:
+            raise MCPCommunicationError(f"获取工具列表失败: {e}") from e
+
+        return [
+            {
+                "name": tool.name,
+                "description": tool.description,
+                # mcp 2.x 将 inputSchema 改名为 input_schema
+                "inputSchema": getattr(tool, "inputSchema", None)
+                or getattr(tool, "input_schema", {}),
+                "annotations": (
+                    tool.annotations.model_dump(
+                        by_alias=True, exclude_none=True
+                    )
+                    if tool.annotations
+                    else {}
+                ),
+            }
+            for tool in response.tools
+        ]
 
-            for tool in response.tools:
-                tool_dict = {
-                    "name": tool.name,
-                    "description": tool.description,
-                    "inputSchema": tool.inputSchema,
-                }
-                tools.append(tool_dict)
+    async def call_tool(
+        self, name: str, arguments: dict[str, Any], retry: bool = False
+    ) -> Any:
+        """
+        调用工具
 
-            return tools
+        Args:
+            name: 工具名称
+            arguments: 工具参数
+            retry: 调用过程中服务器崩溃时，是否在重启后重试一次
+                （只应用于幂等的工具）
 
-        except Exception as e:
-            raise MCPCommunicationError(f"获取工具列表失败: {e}")
+        Returns:
+            MCPToolResult: 包含全部内容块的结果，字符串值为紧凑的文本形式
+        """
+        return await self._on_loop(self._call_tool(name, arguments, retry))
 
-    async def call_tool(self, name: str, arguments: dict[str, Any]) -> Any:
-        """调用工具"""
-        if not self.is_connected or not self.session:
-            raise MCPCommunicationError("未连接到 MCP 服务器")
+    async def _call_tool(
+        self, name: str, arguments: dict[str, Any], retry: bool = False
+    ) -> Any:
+        if self._draining:
+            raise MCPCommunicationError("MCP 服务器正在关闭", tool_name=name)
+        await self._ensure_connected(name)
 
+        try:
+            result = await self._request(name, arguments)
+        except MCPCommunicationError as e:
+            if (
+                not retry
+                or self._draining
+                or not _is_connection_lost(e.__cause__)
+            ):
+                raise
+            # 幂等的调用：等服务器重启后重试一次
+            try:
+                await self._connect()
+            except MCPServerError:
+                raise e from e.__cause__
+            self.retries += 1
+            result = await self._request(name, arguments)
+
+        if not hasattr(result, "content"):
+            return str(result)
+        if all(
+            getattr(item, "type", None) == "text" for item in result.content
+        ):
+            return _build_result(result, self.config)
+        # 解码和落盘二进制内容不阻塞事件循环
+        return await asyncio.to_thread(_build_result, result, self.config)
+
+    async def _request(self, name: str, arguments: dict[str, Any]) -> Any:
+        """发送 tools/call 请求，受并发上限约束并记录延迟"""
+        with self._metrics_lock:
+            self._queued += 1
+        try:
+            if self._slots is not None:
+                await self._slots.acquire()
+        finally:
+            with self._metrics_lock:
+                self._queued -= 1
+
+        with self._metrics_lock:
+            self._in_flight += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._in_flight)
+        start = time.monotonic()
+        failed = False
         try:
             result = await self.session.call_tool(name, arguments)
+            # 服务器以 isError 结果报告的工具错误也计入失败数
+            failed = bool(
+                getattr(result, "isError", None)
+                or getattr(result, "is_error", None)
+            )
+            return result
+        except Exception as e:
+            failed = True
+            if _is_connection_lost(e):
+                self._connection_lost()
+            raise MCPCommunicationError(
+                f"调用工具 '{name}' 失败: {e}", tool_name=name
+            ) from e
+        finally:
+            self._last_used = time.monotonic()
+            latency = self._last_used - start
+            with self._metrics_lock:
+                self._in_flight -= 1
+                self._calls += 1
+                self._errors += failed
+                self._latencies.append(latency)
+            if self._slots is not None:
+                self._slots.release()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        请求统计
 
-            # 处理结果
-            if hasattr(result, "content") and result.content:
-                content = result.content
-                if isinstance(content, list) and len(content) > 0:
-                    first_item = content[0]
-                    if hasattr(first_item, "text"):
-                        return first_item.text
-                    elif hasattr(first_item, "data"):
-                        return first_item.data
-                    else:
-                        return str(first_item)
-                return str(content)
+        Returns:
+            dict: 排队数、进行中的请求数、峰值并发、调用数、失败数、
+                是否已连接、空闲关闭次数、崩溃重启次数、断线重试次数、
+                本次连接的运行时间（秒），
+                以及最近请求的平均 / p50 / p95 延迟（秒）
+        """
+        with self._metrics_lock:
+            latencies = sorted(self._latencies)
+            stats: dict[str, Any] = {
+                "queued": self._queued,
+                "in_flight": self._in_flight,
+                "peak_in_flight": self._peak_in_flight,
+                "max_in_flight": self.config.max_in_flight,
+                "calls": self._calls,
+                "errors": self._errors,
+                "connected": self.is_connected,
+                "idle_shutdowns": self.idle_shutdowns,
+                "restarts": self.restarts,
+                "retries": self.retries,
+                "uptime": (
+                    time.monotonic() - self._connected_at
+                    if self._connected_at is not None
+                    else 0.0
+                ),
+            }
 
-            return str(result)
+        def percentile(p: float) -> float | None:
+            if not latencies:
+                return None
+            return latencies[
+                min(int(len(latencies) * p / 100), len(latencies) - 1)
+            ]
 
-        except Exception as e:
-            raise MCPCommunicationError(f"调用工具 '{name}' 失败: {e}")
+        stats["latency_avg"] = (
+            sum(latencies) / len(latencies) if latencies else None
+        )
+        stats["latency_p50"] = percentile(50)
+        stats["latency_p95"] = percentile(95)
+        return stats
 
-    async def close(self) -> None:
-        """关闭连接"""
-        if self.exit_stack:
-            await self.exit_stack.aclose()
-        self.is_connected = False
+    async def close(self, drain_timeout: float | None = 30.0) -> None:
+        """
+        关闭连接
+
+        关闭前不再接受新请求，并等待进行中的请求完成。
+
+        Args:
+            drain_timeout: 等待进行中请求的最长时间（秒），None 表示一直等待
+        """
+        await self._on_loop(self._close(drain_timeout))
+
+    async def _close(self, drain_timeout: float | None = 30.0) -> None:
+        self._draining = True
+        if self._respawning:
+            self._respawn_task.cancel()
+        deadline = (
+            None if drain_timeout is None else time.monotonic() + drain_timeout
+        )
+        while self.load and (deadline is None or time.monotonic() < deadline):
+            await asyncio.sleep(0.01)
+
+        task, self._serve_task = self._serve_task, None
+        if task is None:
+            return
+        self._closing.set()
+        await task
+
+
+class MCPReplicaSet:
+    """
+    同一 MCP 服务器配置的多个副本进程
+
+    对外提供与 MCPClient 相同的接口，可以直接作为 MCPTool 的 client。
+    每次调用分发到负载最低（排队 + 进行中请求最少）的副本；副本进程崩溃后
+    不再接收请求，由副本自己在后台按退避重启。
+    """
+
+    def __init__(self, config: MCPServerConfig, replicas: int):
+        """
+        Args:
+            config: 服务器配置，所有副本共用
+            replicas: 副本数
+        """
+        if replicas < 1:
+            raise MCPError("副本数必须大于 0")
+        self.config = config
+        self.replicas = [MCPClient(config) for _ in range(replicas)]
+        self.retries = 0
+        self._restarting: set[int] = set()
+        self._draining = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_connected(self) -> bool:
+        return any(replica.is_connected for replica in self.replicas)
+
+    @property
+    def restarts(self) -> int:
+        """各副本崩溃后的重启次数之和"""
+        return sum(replica.restarts for replica in self.replicas)
+
+    async def connect(self) -> None:
+        """并行启动所有副本"""
+        await asyncio.gather(*(replica.connect() for replica in self.replicas))
+
+    async def suspend(self) -> None:
+        """关闭所有副本进程，下次调用时重新启动"""
+        await asyncio.gather(*(replica.suspend() for replica in self.replicas))
+
+    def _restart(self, index: int) -> None:
+        """在后台事件循环中启动空闲关闭（或尚未启动）的副本"""
+        with self._lock:
+            if index in self._restarting or self._draining:
+                return
+            self._restarting.add(index)
+
+        def done(future: Any) -> None:
+            with self._lock:
+                self._restarting.discard(index)
+
+        replica = self.replicas[index]
+        get_background_loop().submit(replica._connect()).add_done_callback(
+            done
+        )
+
+    async def _pick(self) -> MCPClient:
+        """选择负载最低的存活副本，同时启动空闲关闭的副本"""
+        if self._draining:
+            raise MCPCommunicationError("MCP 服务器正在关闭")
+
+        live = []
+        for index, replica in enumerate(self.replicas):
+            if replica.is_connected:
+                live.append(replica)
+            elif replica.suspended:
+                # 崩溃的副本由自己在后台重启
+                self._restart(index)
+        if not live:
+            # 全部副本都不可用：等待其中一个重启完成
+            replica = self.replicas[0]
+            await replica.connect()
+            return replica
+
+        random.shuffle(live)
+        return min(live, key=lambda replica: replica.load)
+
+    async def list_tools(self) -> list[dict[str, Any]]:
+        """获取工具列表（所有副本相同）"""
+        return await (await self._pick()).list_tools()
+
+    async def call_tool(
+        self, name: str, arguments: dict[str, Any], retry: bool = False
+    ) -> Any:
+        """调用工具，分发到负载最低的副本；retry 时副本崩溃后重新分发一次"""
+        try:
+            return await (await self._pick()).call_tool(name, arguments)
+        except MCPCommunicationError as e:
+            if not retry or not _is_connection_lost(e.__cause__):
+                raise
+            self.retries += 1
+            return await (await self._pick()).call_tool(name, arguments)
+
+    def stats(self) -> dict[str, Any]:
+        """汇总统计，per_replica 为各副本的 MCPClient.stats()"""
+        per_replica = [replica.stats() for replica in self.replicas]
+        return {
+            "replicas": len(self.replicas),
+            "live": sum(replica.is_connected for replica in self.replicas),
+            **{
+                key: sum(stats[key] for stats in per_replica)
+                for key in (
+                    "queued",
+                    "in_flight",
+                    "calls",
+                    "errors",
+                    "idle_shutdowns",
+                    "restarts",
+                )
+            },
+            "retries": self.retries
+            + sum(stats["retries"] for stats in per_replica),
+            "per_replica": per_replica,
+        }
+
+    async def close(self, drain_timeout: float | None = 30.0) -> None:
+        """停止分发新请求，等待各副本的请求完成后关闭"""
+        self._draining = True
+        await asyncio.gather(
+            *(replica.close(drain_timeout) for replica in self.replicas)
+        )
 
 
 class MCPTool(Tool):
@@ -199,11 +1071,19 @@ class MCPTool(Tool):
         name: str,
         description: str,
         schema: dict[str, Any],
-        client: MCPClient,
+        client: "MCPClient | MCPReplicaSet",
     ):
-        # 创建同步包装函数
-        def mcp_function(**kwargs):
-            return asyncio.run(client.call_tool(name, kwargs))
+        # 服务器标注为只读或幂等的工具，断线时可以安全地重试
+        annotations = schema.get("annotations") or {}
+        self.idempotent = bool(
+            annotations.get("readOnlyHint")
+            or annotations.get("idempotentHint")
+            or name in (client.config.idempotent_tools or ())
+        )
+
+        # 异步包装函数：同步路径在后台事件循环中执行，异步路径直接 await
+        async def mcp_function(**kwargs):
+            return await client.call_tool(name, kwargs, retry=self.idempotent)
 
         super().__init__(name, description, mcp_function)
         self.mcp_client = client
@@ -215,21 +1095,53 @@ class MCPTool(Tool):
     @classmethod
     async def connect(
         cls,
-        command: str,
+        command: str | None = None,
         args: list[str] | None = None,
         env: dict[str, str] | None = None,
         tools: list[str] | None = None,
         name: str | None = None,
+        max_in_flight: int | None = 16,
+        replicas: int = 1,
+        version: str | None = None,
+        cache_dir: str | None = None,
+        lazy: bool = False,
+        idle_timeout: float | None = None,
+        ping_interval: float | None = 30.0,
+        idempotent_tools: list[str] | None = None,
+        spill_threshold: int | None = 256 * 1024,
+        spill_dir: str | None = None,
+        spill_ttl: float | None = 24 * 3600,
+        url: str | None = None,
+        transport: str | None = None,
+        headers: dict[str, str] | None = None,
     ) -> "MCPToolGroup":
         """
         连接到 MCP 服务器并返回工具组
 
         Args:
-            command: 启动命令
+            command: 启动命令（stdio 传输）
             args: 命令参数
             env: 环境变量
             tools: 要导入的工具列表，None 表示导入全部
             name: 服务器名称（可选，自动生成唯一名称）
+            max_in_flight: 该服务器同时进行的请求数上限，None 表示不限制
+            replicas: 启动的服务器进程数，大于 1 时调用分发到负载最低的副本
+            version: 服务器版本（可选），与 command / args 一起作为缓存的 key
+            cache_dir: 工具列表缓存目录（可选），命中时立即返回工具组，
+                握手在后台完成
+            lazy: 懒启动，第一次调用工具时才启动服务器（配合 cache_dir 使用，
+                缓存命中时完全不启动）
+            idle_timeout: 服务器空闲多久（秒）后关闭进程，下次调用时重新启动
+            ping_interval: 健康检查间隔（秒），None 表示不检查
+            idempotent_tools: 调用中服务器崩溃时可以重试的工具
+            spill_threshold: 结果中超过该大小（字节）的二进制内容写入文件
+            spill_dir: 二进制内容的落盘目录，默认为系统临时目录
+            spill_ttl: 落盘文件的保留时间（秒），None 表示不自动删除
+            url: 远程 MCP 服务器地址（HTTP 传输），指定后不启动本地进程
+            transport: 传输方式 stdio / streamable-http / sse，
+                默认指定了 url 时为 streamable-http，否则为 stdio
+            headers: HTTP 请求头（如鉴权信息）。请求头相同的服务器共用
+                进程内的 HTTP 连接池
 
         Returns:
             MCP工具组，可直接放在 Agent.tools 列表中
@@ -242,7 +1154,10 @@ class MCPTool(Tool):
                 tools=["maps_weather"]
             )
 
-            agent = Agent(tools=[amap_tools])
+            # 远程服务器（streamable HTTP），进程内的 MCP 会话共用 HTTP 连接池
+            remote_tools = await MCPTool.connect(url="https://example.com/mcp")
+
+            agent = Agent(tools=[amap_tools, remote_tools])
         """
         # 获取或创建全局池
         if cls._global_pool is None:
@@ -254,9 +1169,84 @@ class MCPTool(Tool):
 
         # 使用内部池添加服务器
         return await cls._global_pool.add_mcp_server(
-            name=name, command=command, args=args, env=env, tools=tools
+            name=name,
+            command=command,
+            args=args,
+            env=env,
+            tools=tools,
+            max_in_flight=max_in_flight,
+            replicas=replicas,
+            version=version,
+            cache_dir=cache_dir,
+            lazy=lazy,
+            idle_timeout=idle_timeout,
+            ping_interval=ping_interval,
+            idempotent_tools=idempotent_tools,
+            spill_threshold=spill_threshold,
+            spill_dir=spill_dir,
+            spill_ttl=spill_ttl,
+            url=url,
+            transport=transport,
+            headers=headers,
         )
 
+    @classmethod
+    async def connect_many(
+        cls,
+        servers: list[dict[str, Any]],
+        cache_dir: str | None = None,
+    ) -> list["MCPToolGroup"]:
+        """
+        并发连接多个 MCP 服务器
+
+        各服务器的启动、握手和 list_tools 同时进行；任一服务器连接失败时，
+        已连接的服务器会被断开，然后抛出第一个错误。
+
+        Args:
+            servers: 每个服务器的 connect() 参数
+            cache_dir: 工具列表缓存目录（可选），可被单个服务器的参数覆盖
+
+        Returns:
+            与 servers 顺序一致的工具组列表
+
+        Example:
+            amap_tools, fs_tools = await MCPTool.connect_many(
+                [
+                    {"command": "npx", "args": ["-y", "amap-mcp"]},
+                    {"command": "npx", "args": ["-y", "fs"], "version": "1"},
+                ],
+                cache_dir=".zipagent_mcp_cache",
+            )
+        """
+        results = await asyncio.gather(
+            *(
+                cls.connect(**{"cache_dir": cache_dir, **server})
+                for server in servers
+            ),
+            return_exceptions=True,
+        )
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            for result in results:
+                if isinstance(result, MCPToolGroup):
+                    await cls.disconnect(result.name)
+            raise errors[0]
+        return results
+
+    @classmethod
+    async def wait_ready(cls, name: str) -> None:
+        """
+        等待服务器的后台握手完成
+
+        使用工具列表缓存时，connect() 在握手完成前就返回；握手失败时
+        这里抛出对应的错误。
+
+        Args:
+            name: 服务器名称
+        """
+        if cls._global_pool:
+            await cls._global_pool.wait_ready(name)
+
     @classmethod
     async def from_npm(
         cls,
@@ -294,7 +1284,7 @@ class MCPTool(Tool):
     @classmethod
     async def disconnect(cls, name: str) -> None:
         """
-        断开特定的 MCP 连接
+        断开特定的 MCP 连接（不再接受新调用，等待进行中的调用完成）
 
         Args:
             name: 服务器名称
@@ -321,6 +1311,18 @@ class MCPTool(Tool):
             return list(cls._global_pool.clients.keys())
         return []
 
+    @classmethod
+    def server_stats(cls) -> dict[str, dict[str, Any]]:
+        """
+        各 MCP 服务器的请求统计
+
+        Returns:
+            服务器名称到 MCPClient.stats() 的映射
+        """
+        if cls._global_pool:
+            return cls._global_pool.stats()
+        return {}
+
     def _convert_mcp_schema(
         self, mcp_schema: dict[str, Any]
     ) -> dict[str, Any]:
@@ -336,66 +1338,22 @@ class MCPTool(Tool):
             },
         }
 
-    def execute(self, arguments: dict[str, Any]) -> ToolResult:
-        """执行 MCP 工具"""
-        try:
-            # 简化的异步调用处理
-            try:
-                # 尝试获取当前事件循环
-                loop = asyncio.get_running_loop()
-                # 如果在事件循环中，创建一个任务但同步等待
-                import nest_asyncio
-
-                nest_asyncio.apply()
-                result = asyncio.run(
-                    self.mcp_client.call_tool(self.name, arguments)
-                )
-            except ImportError:
-                # 如果 nest_asyncio 不可用，使用替代方案
-                try:
-                    loop = asyncio.get_running_loop()
-                    # 直接返回错误，提示需要异步环境
-                    return ToolResult(
-                        name=self.name,
-                        arguments=arguments,
-                        result=None,
-                        success=False,
-                        error="MCP tools require async environment. Consider using nest_asyncio or calling from async context.",
-                    )
-                except RuntimeError:
-                    # 没有运行的事件循环，可以安全使用 asyncio.run
-                    result = asyncio.run(
-                        self.mcp_client.call_tool(self.name, arguments)
-                    )
-            except RuntimeError:
-                # 没有运行的事件循环
-                result = asyncio.run(
-                    self.mcp_client.call_tool(self.name, arguments)
-                )
-
-            return ToolResult(
-                name=self.name,
-                arguments=arguments,
-                result=result,
-                success=True,
-            )
-        except Exception as e:
-            return ToolResult(
-                name=self.name,
-                arguments=arguments,
-                result=None,
-                success=False,
-                error=str(e),
-            )
-
 
 class MCPToolGroup:
-    """MCP 工具组，包含多个 MCP 工具，可以直接放在 Agent.tools 列表中"""
+    """
+    MCP 工具组，包含多个 MCP 工具，可以直接放在 Agent.tools 列表中
+
+    工具增删采用写时复制：构建新的列表和索引后整体替换，
+    后台握手线程更新工具组时，其他线程读到的始终是完整的一份。
+    """
 
     def __init__(self, name: str, tools: list[MCPTool]):
         self.name = name
         self.tools = tools
         self._tools_dict = {tool.name: tool for tool in tools}
+        self._lock = threading.Lock()
+        self.version = 0
+        """修改次数，Agent 据此判断工具索引是否需要更新"""
 
     def __iter__(self):
         """支持迭代"""
@@ -426,31 +1384,100 @@ class MCPToolGroup:
         """根据名称查找工具"""
         return self._tools_dict.get(name)
 
+    def add_tool(self, tool: MCPTool) -> None:
+        """向工具组添加工具"""
+        with self._lock:
+            self._publish([*self.tools, tool])
+
+    def remove_tool(self, name: str) -> bool:
+        """从工具组移除工具"""
+        with self._lock:
+            tool = self._tools_dict.get(name)
+            if tool is None:
+                return False
+            self._publish([t for t in self.tools if t is not tool])
+            return True
+
+    def replace_tools(self, tools: list[MCPTool]) -> None:
+        """一次性替换全部工具，版本号只递增一次"""
+        with self._lock:
+            self._publish(list(tools))
+
+    def _publish(self, tools: list[MCPTool]) -> None:
+        """用新的列表和索引替换当前状态（调用方需持有锁）"""
+        tools_dict: dict[str, MCPTool] = {}
+        for tool in tools:
+            tools_dict.setdefault(tool.name, tool)
+        self._tools_dict = tools_dict
+        self.tools = tools
+        self.version += 1
+        _tool_groups_changed()
+
 
 class _MCPToolPool:
     """MCP 工具池（内部实现），管理多个 MCP 服务器和工具"""
 
     def __init__(self):
-        self.clients: dict[str, MCPClient] = {}
+        self.clients: dict[str, MCPClient | MCPReplicaSet] = {}
         self.tool_groups: dict[str, MCPToolGroup] = {}
+        self.handshakes: dict[str, Future] = {}
+        """使用缓存的工具列表时，后台进行中的握手"""
 
     async def add_mcp_server(
         self,
         name: str,
-        command: str,
+        command: str | None = None,
         args: list[str] | None = None,
         env: dict[str, str] | None = None,
         tools: list[str] | None = None,
+        max_in_flight: int | None = 16,
+        replicas: int = 1,
+        version: str | None = None,
+        cache_dir: str | None = None,
+        lazy: bool = False,
+        idle_timeout: float | None = None,
+        ping_interval: float | None = 30.0,
+        idempotent_tools: list[str] | None = None,
+        spill_threshold: int | None = 256 * 1024,
+        spill_dir: str | None = None,
+        spill_ttl: float | None = 24 * 3600,
+        url: str | None = None,
+        transport: str | None = None,
+        headers: dict[str, str] | None = None,
     ) -> MCPToolGroup:
         """
         添加 MCP 服务器并导入工具
 
         Args:
             name: 服务器名称
-            command: 启动命令
+            command: 启动命令（stdio 传输）
             args: 命令参数
             env: 环境变量
             tools: 要导入的工具列表，None 表示导入全部
+            max_in_flight: 每个服务器进程同时进行的请求数上限，None 表示不限制
+            replicas: 启动的服务器进程数。大于 1 时所有副本作为同一个工具组，
+                调用分发到负载最低的副本，崩溃的副本自动重启
+            version: 服务器版本（可选），与 command / args 一起作为缓存的 key
+            cache_dir: 工具列表缓存目录（可选）。命中时立即返回工具组，
+                连接和 list_tools 在后台完成，结果有变化时更新工具组和缓存
+            lazy: 懒启动。缓存命中时不启动服务器；未命中时获取工具列表后
+                关闭服务器。之后在第一次调用工具时才启动
+            idle_timeout: 服务器空闲多久（秒）后关闭进程，下次调用时重新启动；
+                None 表示一直保持
+            ping_interval: 健康检查间隔（秒），检查失败时视为崩溃并在后台
+                按退避重启；None 表示只在调用失败时发现崩溃
+            idempotent_tools: 额外视为幂等的工具（服务器标注了 readOnlyHint /
+                idempotentHint 的工具已包含在内）。调用中服务器崩溃时，
+                幂等工具的调用在重启后重试一次
+            spill_threshold: 工具结果中超过该大小（字节）的二进制内容写入文件，
+                None 表示始终保留在内存中
+            spill_dir: 二进制内容的落盘目录，默认为系统临时目录
+            spill_ttl: 落盘文件的保留时间（秒），None 表示不自动删除
+            url: 远程 MCP 服务器地址（HTTP 传输），指定后不启动本地进程
+            transport: 传输方式 stdio / streamable-http / sse，
+                默认指定了 url 时为 streamable-http，否则为 stdio
+            headers: HTTP 请求头（如鉴权信息）。请求头相同的服务器共用
+                进程内的 HTTP 连接池
 
         Returns:
             MCP工具组，可直接放在 Agent.tools 列表中
@@ -460,27 +1487,78 @@ class _MCPToolPool:
 
         # 创建配置
         config = MCPServerConfig(
-            name=name, command=command, args=args or [], env=env, tools=tools
+            name=name,
+            command=command or "",
+            args=args or [],
+            env=env,
+            tools=tools,
+            max_in_flight=max_in_flight,
+            version=version,
+            idle_timeout=idle_timeout,
+            ping_interval=ping_interval,
+            idempotent_tools=idempotent_tools,
+            spill_threshold=spill_threshold,
+            spill_dir=spill_dir,
+            spill_ttl=spill_ttl,
+            url=url,
+            transport=transport or ("streamable-http" if url else "stdio"),
+            headers=headers,
+        )
+        client = (
+            MCPReplicaSet(config, replicas)
+            if replicas > 1
+            else MCPClient(config)
         )
+        cache = _ToolListCache(cache_dir) if cache_dir else None
+        cached_tools = cache.load(config) if cache else None
 
-        # 创建客户端并连接
-        client = MCPClient(config)
-        await client.connect()
+        if cached_tools is not None and lazy:
+            # 懒启动：只使用缓存的 schema，第一次调用时才启动服务器
+            tool_group = MCPToolGroup(
+                name, self._create_tools(client, cached_tools, tools)
+            )
+        elif cached_tools is not None:
+            # 缓存命中：先用缓存的 schema 创建工具组，握手在后台完成；
+            # 握手完成前的调用会等待连接建立
+            tool_group = MCPToolGroup(
+                name, self._create_tools(client, cached_tools, tools)
+            )
+            self.handshakes[name] = get_background_loop().submit(
+                self._complete_handshake(
+                    client, tool_group, cached_tools, cache
+                )
+            )
+        else:
+            await client.connect()
+            available_tools = await client.list_tools()
+            if cache:
+                cache.save(config, available_tools)
+            if lazy:
+                await client.suspend()
+            tool_group = MCPToolGroup(
+                name, self._create_tools(client, available_tools, tools)
+            )
 
-        # 获取工具列表
-        available_tools = await client.list_tools()
+        # 保存到池中
+        self.clients[name] = client
+        self.tool_groups[name] = tool_group
+
+        return tool_group
 
-        # 过滤工具（如果指定了特定工具）
+    @staticmethod
+    def _create_tools(
+        client: "MCPClient | MCPReplicaSet",
+        available_tools: list[dict[str, Any]],
+        tools: list[str] | None,
+    ) -> list[MCPTool]:
+        """按工具列表创建工具实例（指定了 tools 时只导入其中的工具）"""
         if tools:
             tool_set = set(tools)
             available_tools = [
                 t for t in available_tools if t.get("name") in tool_set
             ]
-
-        # 创建工具实例
-        mcp_tools = []
-        for tool_info in available_tools:
-            tool = MCPTool(
+        return [
+            MCPTool(
                 name=tool_info["name"],
                 description=tool_info.get(
                     "description", f"MCP tool {tool_info['name']}"
@@ -488,24 +1566,66 @@ class _MCPToolPool:
                 schema=tool_info,
                 client=client,
             )
-            mcp_tools.append(tool)
+            for tool_info in available_tools
+        ]
 
-        # 创建工具组
-        tool_group = MCPToolGroup(name, mcp_tools)
+    async def _complete_handshake(
+        self,
+        client: "MCPClient | MCPReplicaSet",
+        tool_group: MCPToolGroup,
+        cached_tools: list[dict[str, Any]],
+        cache: _ToolListCache,
+    ) -> None:
+        """后台握手：连接并获取工具列表，与缓存不一致时更新工具组和缓存"""
+        await client.connect()
+        available_tools = await client.list_tools()
+        if available_tools == cached_tools:
+            return
 
-        # 保存到池中
-        self.clients[name] = client
-        self.tool_groups[name] = tool_group
+        cache.save(client.config, available_tools)
+        latest = {
+            tool.name: tool
+            for tool in self._create_tools(
+                client, available_tools, client.config.tools
+            )
+        }
+        # 握手在后台事件循环的线程中完成，工具组整体替换而不是逐个增删
+        kept = [
+            tool
+            for tool in tool_group.tools
+            if tool.name in latest
+            and tool.mcp_schema == latest[tool.name].mcp_schema
+        ]
+        kept_names = {tool.name for tool in kept}
+        tool_group.replace_tools(
+            kept
+            + [
+                tool
+                for tool_name, tool in latest.items()
+                if tool_name not in kept_names
+            ]
+        )
 
-        return tool_group
+    async def wait_ready(self, name: str) -> None:
+        """等待服务器的后台握手完成（未使用缓存时立即返回）"""
+        handshake = self.handshakes.get(name)
+        if handshake is not None:
+            await asyncio.wrap_future(handshake)
 
     async def remove_server(self, name: str) -> None:
         """移除 MCP 服务器"""
         if name in self.clients:
+            handshake = self.handshakes.pop(name, None)
+            if handshake is not None:
+                handshake.cancel()
             await self.clients[name].close()
             del self.clients[name]
             del self.tool_groups[name]
 
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """各服务器的请求统计"""
+        return {name: client.stats() for name, client in self.clients.items()}
+
     def get_tool_group(self, name: str) -> MCPToolGroup | None:
         """获取指定的工具组"""
         return self.tool_groups.get(name)
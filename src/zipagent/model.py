@@ -1,12 +1,18 @@
 """Model - LLM交互接口模块"""
 
+import functools
+import inspect
+import json
 import os
+import threading
 from abc import ABC, abstractmethod
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Callable, Generator, Iterator
+from contextlib import contextmanager
 from dataclasses import dataclass
 from typing import Any
 
-from .context import Usage
+from .context import RequestMessages, Usage
+from .exceptions import ModelError
 
 # 尝试加载环境变量
 try:
@@ -25,6 +31,8 @@ class ModelResponse:
     tool_calls: list[dict[str, Any]] | None
     usage: Usage
     finish_reason: str
+    error: ModelError | None = None
+    """调用失败时的错误（此时 finish_reason 为 "error"）"""
 
 
 @dataclass
@@ -63,77 +71,277 @@ class Model(ABC):
         yield response
 
 
-class OpenAIModel(Model):
-    """基于原生OpenAI的模型实现"""
+class AsyncModel(ABC):
+    """异步LLM模型抽象基类
 
-    def __init__(
+    与 Model 接口一一对应，但 generate 为协程、generate_stream 为异步生成器，
+    供 Runner.run_async / Runner.run_stream_async 在事件循环中直接驱动。
+    """
+
+    @abstractmethod
+    async def generate(
         self,
-        model: str | None = None,  # 统一参数名
-        model_name: str | None = None,  # 兼容旧版本
-        api_key: str | None = None,
-        base_url: str | None = None,
-        **kwargs: Any,
-    ):
-        """
-        初始化OpenAI模型
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+    ) -> ModelResponse:
+        """异步生成模型响应"""
+        pass
 
-        Args:
-            model_name: 模型名称，如果不指定会从环境变量MODEL读取
-            api_key: API密钥，如果不指定会从环境变量API_KEY读取
-            base_url: API基础URL，如果不指定会从环境变量BASE_URL读取
-            **kwargs: 其他参数
-        """
-        try:
-            from openai import OpenAI
+    async def generate_stream(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+    ) -> AsyncGenerator[StreamDelta | ModelResponse, None]:
+        """异步生成流式响应（可选实现）"""
+        # 默认实现：调用普通生成，然后逐字符yield
+        response = await self.generate(messages, tools)
+        if response.content:
+            for char in response.content:
+                yield StreamDelta(content=char)
+        # 最后yield完整的响应
+        yield response
 
-            # 从环境变量或参数获取配置，支持两种参数名，优先使用model
-            self.model_name = (
-                model or model_name or os.getenv("MODEL", "gpt-3.5-turbo")
-            )
-            self.api_key = api_key or os.getenv("API_KEY")
-            self.base_url = base_url or os.getenv("BASE_URL")
-
-            # 构建客户端参数
-            client_kwargs = {}
-            if self.api_key:
-                client_kwargs["api_key"] = self.api_key
-            if self.base_url:
-                client_kwargs["base_url"] = self.base_url
-
-            # 创建OpenAI客户端
-            self.client = OpenAI(**client_kwargs)
-
-            # 其他参数
-            self.kwargs = kwargs.copy()
-            # 从环境变量或参数获取 temperature 和 max_tokens
-            env_temp = os.getenv("TEMPERATURE")
-            self.temperature = (
-                float(env_temp) if env_temp else kwargs.get("temperature", 0.7)
-            )
 
-            env_max_tokens = os.getenv("MAX_TOKENS")
-            self.max_tokens = (
-                int(env_max_tokens)
-                if env_max_tokens
-                else kwargs.get("max_tokens")
+class _StreamAccumulator:
+    """累积 OpenAI 流式 chunk，供同步与异步模型共用"""
+
+    def __init__(self) -> None:
+        self.full_content = ""
+        self.tool_calls: list[dict[str, Any]] = []
+        self.finish_reason = "stop"
+        self.last_chunk: Any = None
+
+    def feed(self, chunk: Any) -> str | None:
+        """处理一个 chunk，返回其中的内容增量（如果有）"""
+        self.last_chunk = chunk
+
+        # 确保choices存在且不为空
+        if not chunk.choices or len(chunk.choices) == 0:
+            return None
+
+        delta = chunk.choices[0].delta
+        content = None
+
+        # 处理内容增量
+        if hasattr(delta, "content") and delta.content:
+            self.full_content += delta.content
+            content = delta.content
+
+        # 处理工具调用（流式累积）
+        if hasattr(delta, "tool_calls") and delta.tool_calls:
+            for tool_call_delta in delta.tool_calls:
+                self._feed_tool_call(tool_call_delta)
+
+        # 处理结束原因
+        if (
+            hasattr(chunk.choices[0], "finish_reason")
+            and chunk.choices[0].finish_reason
+        ):
+            self.finish_reason = chunk.choices[0].finish_reason
+
+        return content
+
+    def _feed_tool_call(self, tool_call_delta: Any) -> None:
+        """累积单个工具调用增量"""
+        index = tool_call_delta.index
+
+        # 确保tool_calls列表足够长
+        while len(self.tool_calls) <= index:
+            self.tool_calls.append(
+                {
+                    "id": "",
+                    "type": "function",
+                    "function": {"name": "", "arguments": ""},
+                }
             )
 
-        except ImportError as e:
-            raise ImportError("需要安装openai包: pip install openai") from e
+        # 累积工具调用信息
+        if hasattr(tool_call_delta, "id") and tool_call_delta.id:
+            self.tool_calls[index]["id"] = tool_call_delta.id
+
+        function = getattr(tool_call_delta, "function", None)
+        if function:
+            if getattr(function, "name", None):
+                self.tool_calls[index]["function"]["name"] = function.name
+            if getattr(function, "arguments", None):
+                self.tool_calls[index]["function"]["arguments"] += (
+                    function.arguments
+                )
+
+    def finish(self) -> ModelResponse:
+        """构造完整的响应"""
+        usage = Usage()
 
-    def generate(
+        # 解析使用量（在流式响应的最后一个chunk中）
+        last_chunk = self.last_chunk
+        if last_chunk and hasattr(last_chunk, "usage") and last_chunk.usage:
+            usage.input_tokens = last_chunk.usage.prompt_tokens or 0
+            usage.output_tokens = last_chunk.usage.completion_tokens or 0
+            usage.total_tokens = last_chunk.usage.total_tokens or 0
+
+        return ModelResponse(
+            content=self.full_content,
+            tool_calls=self.tool_calls,
+            usage=usage,
+            finish_reason=self.finish_reason,
+        )
+
+
+@functools.cache
+def _raw_body_param(post: Any) -> str:
+    """
+    原始请求体使用的 post 参数名
+
+    新版 SDK 通过 content 传递原始字节（bytes 形式的 body 已弃用），
+    旧版（如 1.99）没有 content 参数，bytes 形式的 body 会原样发送。
+    """
+    try:
+        parameters = inspect.signature(post).parameters
+    except (TypeError, ValueError):
+        return "body"
+    return "content" if "content" in parameters else "body"
+
+
+def _parse_retry_after(headers: Any) -> float | None:
+    """从响应头解析 Retry-After（秒）"""
+    if headers is None:
+        return None
+    try:
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms is not None:
+            return float(retry_after_ms) / 1000
+        retry_after = headers.get("retry-after")
+        if retry_after is not None:
+            return float(retry_after)
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def _to_model_error(
+    error: Exception, model_name: str | None = None
+) -> ModelError:
+    """把 SDK 等抛出的异常转换为 ModelError，保留状态码和 Retry-After"""
+    if isinstance(error, ModelError):
+        return error
+    response = getattr(error, "response", None)
+    status_code = getattr(error, "status_code", None)
+    return ModelError(
+        "模型调用失败",
+        model_name=model_name,
+        status_code=status_code if isinstance(status_code, int) else None,
+        retry_after=_parse_retry_after(getattr(response, "headers", None)),
+        original_error=error,
+    )
+
+
+def _stream_error_response(
+    error: Exception, model_name: str | None = None
+) -> list[StreamDelta | ModelResponse]:
+    """流式调用出错时返回的增量和响应"""
+    model_error = _to_model_error(error, model_name)
+    error_msg = f"模型流式调用出错: {error!s}"
+    return [
+        StreamDelta(content=error_msg, finish_reason="error"),
+        ModelResponse(
+            content=error_msg,
+            tool_calls=[],
+            usage=Usage(),
+            finish_reason="error",
+            error=model_error,
+        ),
+    ]
+
+
+_stream_watch = threading.local()
+
+
+@contextmanager
+def _watch_streams(on_open: Callable[[Any], None]) -> Iterator[None]:
+    """
+    在当前线程中监听流式请求打开的连接
+
+    Args:
+        on_open: 收到可关闭的对象（如 SDK 的 Stream）时调用，
+            调用方可以在另一个线程中关闭它以中断请求
+    """
+    previous = getattr(_stream_watch, "on_open", None)
+    _stream_watch.on_open = on_open
+    try:
+        yield
+    finally:
+        _stream_watch.on_open = previous
+
+
+def _stream_opened(stream: Any) -> None:
+    """通知当前线程的监听者：流式请求已打开连接"""
+    on_open = getattr(_stream_watch, "on_open", None)
+    if on_open is not None:
+        on_open(stream)
+
+
+class _OpenAIConfigMixin:
+    """OpenAI 兼容模型的公共配置与解析逻辑"""
+
+    model_name: str
+    temperature: float
+    max_tokens: int | None
+    kwargs: dict[str, Any]
+    client: Any
+
+    def _init_config(
+        self,
+        model: str | None,
+        model_name: str | None,
+        api_key: str | None,
+        base_url: str | None,
+        kwargs: dict[str, Any],
+    ) -> dict[str, Any]:
+        """读取配置，返回创建客户端所需的参数"""
+        # 从环境变量或参数获取配置，支持两种参数名，优先使用model
+        self.model_name = (
+            model or model_name or os.getenv("MODEL", "gpt-3.5-turbo")
+        )
+        self.api_key = api_key or os.getenv("API_KEY")
+        self.base_url = base_url or os.getenv("BASE_URL")
+
+        # 构建客户端参数
+        client_kwargs = {}
+        if self.api_key:
+            client_kwargs["api_key"] = self.api_key
+        if self.base_url:
+            client_kwargs["base_url"] = self.base_url
+
+        # 其他参数
+        self.kwargs = kwargs.copy()
+        # 从环境变量或参数获取 temperature 和 max_tokens
+        env_temp = os.getenv("TEMPERATURE")
+        self.temperature = (
+            float(env_temp) if env_temp else kwargs.get("temperature", 0.7)
+        )
+
+        env_max_tokens = os.getenv("MAX_TOKENS")
+        self.max_tokens = (
+            int(env_max_tokens) if env_max_tokens else kwargs.get("max_tokens")
+        )
+
+        return client_kwargs
+
+    def _build_call_kwargs(
         self,
         messages: list[dict[str, Any]],
-        tools: list[dict[str, Any]] | None = None,
-    ) -> ModelResponse:
-        """调用OpenAI生成响应"""
-        # 准备API调用参数
-        call_kwargs = {
+        tools: list[dict[str, Any]] | None,
+        stream: bool = False,
+    ) -> dict[str, Any]:
+        """准备API调用参数"""
+        call_kwargs: dict[str, Any] = {
             "model": self.model_name,
             "messages": messages,
             "temperature": self.temperature,
-            **self.kwargs,
         }
+        if stream:
+            call_kwargs["stream"] = True
+        call_kwargs.update(self.kwargs)
 
         # 只有当 max_tokens 有值时才添加
         if self.max_tokens is not None:
@@ -144,10 +352,51 @@ class OpenAIModel(Model):
             call_kwargs["tools"] = tools
             call_kwargs["tool_choice"] = "auto"
 
-        # 调用OpenAI API
-        response = self.client.chat.completions.create(**call_kwargs)
+        return call_kwargs
 
-        # 解析响应
+    # 由 SDK 处理、不属于请求体的参数，出现时回退到 SDK 的常规调用
+    _SDK_OPTIONS = frozenset(
+        {"extra_headers", "extra_query", "extra_body", "timeout"}
+    )
+
+    def _raw_request_kwargs(
+        self, call_kwargs: dict[str, Any], stream_cls: Any
+    ) -> dict[str, Any] | None:
+        """
+        使用预编码的消息构造原始请求参数
+
+        messages 为 Context.get_messages_for_api() 返回的 RequestMessages 时，
+        直接拼接已缓存的 JSON 片段作为请求体，跳过 SDK 对整段历史的转换和
+        序列化。无法使用预编码时返回 None。
+        """
+        messages = call_kwargs["messages"]
+        if (
+            not isinstance(messages, RequestMessages)
+            or self._SDK_OPTIONS & call_kwargs.keys()
+        ):
+            return None
+
+        params = {k: v for k, v in call_kwargs.items() if k != "messages"}
+        try:
+            params_json = json.dumps(params, ensure_ascii=False)
+        except TypeError:
+            return None
+
+        from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+        body = '{"messages": ' + messages.to_json() + ", " + params_json[1:]
+        post = getattr(type(self.client), "post", None)
+        return {
+            "cast_to": ChatCompletion,
+            _raw_body_param(post): body.encode("utf-8"),
+            "options": {"headers": {"Content-Type": "application/json"}},
+            "stream": bool(call_kwargs.get("stream")),
+            "stream_cls": stream_cls[ChatCompletionChunk],
+        }
+
+    @staticmethod
+    def _parse_response(response: Any) -> ModelResponse:
+        """解析非流式响应"""
         message = response.choices[0].message
         content = message.content
         tool_calls: list[dict[str, Any]] | None = None
@@ -180,6 +429,60 @@ class OpenAIModel(Model):
             finish_reason=response.choices[0].finish_reason or "stop",
         )
 
+
+class OpenAIModel(_OpenAIConfigMixin, Model):
+    """基于原生OpenAI的模型实现"""
+
+    def __init__(
+        self,
+        model: str | None = None,  # 统一参数名
+        model_name: str | None = None,  # 兼容旧版本
+        api_key: str | None = None,
+        base_url: str | None = None,
+        **kwargs: Any,
+    ):
+        """
+        初始化OpenAI模型
+
+        Args:
+            model_name: 模型名称，如果不指定会从环境变量MODEL读取
+            api_key: API密钥，如果不指定会从环境变量API_KEY读取
+            base_url: API基础URL，如果不指定会从环境变量BASE_URL读取
+            **kwargs: 其他参数
+        """
+        try:
+            from openai import OpenAI
+        except ImportError as e:
+            raise ImportError("需要安装openai包: pip install openai") from e
+
+        client_kwargs = self._init_config(
+            model, model_name, api_key, base_url, kwargs
+        )
+        # 创建OpenAI客户端
+        self.client = OpenAI(**client_kwargs)
+
+    def _create_completion(self, call_kwargs: dict[str, Any]) -> Any:
+        """发送请求，消息已预编码时直接使用缓存的 JSON"""
+        from openai import Stream
+
+        raw_kwargs = self._raw_request_kwargs(call_kwargs, Stream)
+        if raw_kwargs is None:
+            return self.client.chat.completions.create(**call_kwargs)
+        return self.client.post("/chat/completions", **raw_kwargs)
+
+    def generate(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+    ) -> ModelResponse:
+        """调用OpenAI生成响应"""
+        call_kwargs = self._build_call_kwargs(messages, tools)
+        try:
+            response = self._create_completion(call_kwargs)
+        except Exception as e:
+            raise _to_model_error(e, self.model_name) from e
+        return self._parse_response(response)
+
     def generate_stream(
         self,
         messages: list[dict[str, Any]],
@@ -187,106 +490,113 @@ class OpenAIModel(Model):
     ) -> Generator[StreamDelta | ModelResponse, None, None]:
         """调用OpenAI流式生成响应"""
         try:
-            # 准备API调用参数
-            call_kwargs = {
-                "model": self.model_name,
-                "messages": messages,
-                "temperature": self.temperature,  # 使用实例变量
-                "stream": True,  # 启用流式
-                **self.kwargs,
-            }
-
-            # 只有当 max_tokens 有值时才添加
-            if self.max_tokens is not None:
-                call_kwargs["max_tokens"] = self.max_tokens
-
-            # 如果有工具，添加到请求中
-            if tools:
-                call_kwargs["tools"] = tools
-                call_kwargs["tool_choice"] = "auto"
+            call_kwargs = self._build_call_kwargs(messages, tools, stream=True)
 
             # 调用OpenAI流式API
-            stream = self.client.chat.completions.create(**call_kwargs)
+            stream = self._create_completion(call_kwargs)
+            _stream_opened(stream)
 
             # 收集完整响应用于最终返回
-            full_content = ""
-            tool_calls: list[dict[str, Any]] = []
-            finish_reason = "stop"
-            usage = Usage()
-
-            # 处理流式响应
-            last_chunk = None
+            accumulator = _StreamAccumulator()
             try:
                 for chunk in stream:
-                    last_chunk = chunk
-
-                    # 确保choices存在且不为空
-                    if chunk.choices and len(chunk.choices) > 0:
-                        delta = chunk.choices[0].delta
-
-                        # 处理内容增量
-                        if hasattr(delta, 'content') and delta.content:
-                            full_content += delta.content
-                            yield StreamDelta(content=delta.content)
-
-                        # 处理工具调用（流式累积）
-                        if hasattr(delta, 'tool_calls') and delta.tool_calls:
-                            # 流式工具调用处理
-                            for tool_call_delta in delta.tool_calls:
-                                index = tool_call_delta.index
-
-                                # 确保tool_calls列表足够长
-                                while len(tool_calls) <= index:
-                                    tool_calls.append({
-                                        "id": "",
-                                        "type": "function",
-                                        "function": {"name": "", "arguments": ""}
-                                    })
-
-                                # 累积工具调用信息
-                                if hasattr(tool_call_delta, 'id') and tool_call_delta.id:
-                                    tool_calls[index]["id"] = tool_call_delta.id
-
-                                if hasattr(tool_call_delta, 'function') and tool_call_delta.function:
-                                    if hasattr(tool_call_delta.function, 'name') and tool_call_delta.function.name:
-                                        tool_calls[index]["function"]["name"] = tool_call_delta.function.name
-
-                                    if hasattr(tool_call_delta.function, 'arguments') and tool_call_delta.function.arguments:
-                                        tool_calls[index]["function"]["arguments"] += tool_call_delta.function.arguments
-
-                        # 处理结束原因
-                        if hasattr(chunk.choices[0], 'finish_reason') and chunk.choices[0].finish_reason:
-                            finish_reason = chunk.choices[0].finish_reason
-            except Exception as stream_error:
+                    content = accumulator.feed(chunk)
+                    if content:
+                        yield StreamDelta(content=content)
+            except Exception:
                 # 流式解析错误，但保留已经获得的内容和工具调用
                 # 这通常是由于API服务器返回格式不正确的SSE数据导致的
-                # 我们优雅地处理这个错误，保留已经成功解析的内容
                 pass
 
-            # 解析使用量（在流式响应的最后一个chunk中）
-            if last_chunk and hasattr(last_chunk, "usage") and last_chunk.usage:
-                usage.input_tokens = last_chunk.usage.prompt_tokens or 0
-                usage.output_tokens = last_chunk.usage.completion_tokens or 0
-                usage.total_tokens = last_chunk.usage.total_tokens or 0
-
             # 最后yield完整的响应
-            yield ModelResponse(
-                content=full_content,
-                tool_calls=tool_calls,
-                usage=usage,
-                finish_reason=finish_reason,
-            )
+            yield accumulator.finish()
 
         except Exception as e:
             # 错误处理 - 返回错误增量
-            error_msg = f"模型流式调用出错: {e!s}"
-            yield StreamDelta(content=error_msg)
-            yield ModelResponse(
-                content=error_msg,
-                tool_calls=[],
-                usage=Usage(),
-                finish_reason="error",
-            )
+            yield from _stream_error_response(e, self.model_name)
+
+
+class AsyncOpenAIModel(_OpenAIConfigMixin, AsyncModel):
+    """基于 openai.AsyncOpenAI 的异步模型实现
+
+    配置方式与 OpenAIModel 完全一致，流式输出的增量序列也与之相同。
+    """
+
+    def __init__(
+        self,
+        model: str | None = None,
+        model_name: str | None = None,
+        api_key: str | None = None,
+        base_url: str | None = None,
+        **kwargs: Any,
+    ):
+        """
+        初始化异步OpenAI模型
+
+        Args:
+            model_name: 模型名称，如果不指定会从环境变量MODEL读取
+            api_key: API密钥，如果不指定会从环境变量API_KEY读取
+            base_url: API基础URL，如果不指定会从环境变量BASE_URL读取
+            **kwargs: 其他参数
+        """
+        try:
+            from openai import AsyncOpenAI
+        except ImportError as e:
+            raise ImportError("需要安装openai包: pip install openai") from e
+
+        client_kwargs = self._init_config(
+            model, model_name, api_key, base_url, kwargs
+        )
+        # 创建异步OpenAI客户端
+        self.client = AsyncOpenAI(**client_kwargs)
+
+    async def _create_completion(self, call_kwargs: dict[str, Any]) -> Any:
+        """发送请求，消息已预编码时直接使用缓存的 JSON"""
+        from openai import AsyncStream
+
+        raw_kwargs = self._raw_request_kwargs(call_kwargs, AsyncStream)
+        if raw_kwargs is None:
+            return await self.client.chat.completions.create(**call_kwargs)
+        return await self.client.post("/chat/completions", **raw_kwargs)
+
+    async def generate(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+    ) -> ModelResponse:
+        """异步调用OpenAI生成响应"""
+        call_kwargs = self._build_call_kwargs(messages, tools)
+        try:
+            response = await self._create_completion(call_kwargs)
+        except Exception as e:
+            raise _to_model_error(e, self.model_name) from e
+        return self._parse_response(response)
+
+    async def generate_stream(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+    ) -> AsyncGenerator[StreamDelta | ModelResponse, None]:
+        """异步调用OpenAI流式生成响应"""
+        try:
+            call_kwargs = self._build_call_kwargs(messages, tools, stream=True)
+            stream = await self._create_completion(call_kwargs)
+
+            accumulator = _StreamAccumulator()
+            try:
+                async for chunk in stream:
+                    content = accumulator.feed(chunk)
+                    if content:
+                        yield StreamDelta(content=content)
+            except Exception:
+                # 与同步实现一致：保留已解析的内容
+                pass
+
+            yield accumulator.finish()
+
+        except Exception as e:
+            for item in _stream_error_response(e, self.model_name):
+                yield item
 
 
 # 为了向后兼容，保持LiteLLMModel别名
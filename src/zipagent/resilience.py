@@ -0,0 +1,341 @@
+"""Resilience - 模型调用容错模块
+
+提供可以包装任意 Model 的 ResilientModel：按错误类型分类重试、带抖动的指数
+退避、遵守服务端的 Retry-After，以及按端点共享的熔断器。瞬时的 429/5xx
+不会再以错误文本的形式写入对话，端点持续故障时也不会引发大量同时重试。
+
+使用示例:
+    from zipagent import Agent, OpenAIModel, ResilientModel
+
+    agent = Agent(
+        name="Assistant",
+        instructions="你是一个助手",
+        model=ResilientModel(OpenAIModel(), max_retries=3),
+    )
+"""
+
+import random
+import threading
+import time
+from collections.abc import Callable, Generator
+from typing import Any
+
+from .exceptions import CircuitOpenError, ModelError
+from .model import (
+    Model,
+    ModelResponse,
+    StreamDelta,
+    _stream_error_response,
+    _to_model_error,
+)
+
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+"""可以重试的 HTTP 状态码"""
+
+
+def is_retryable(error: ModelError) -> bool:
+    """
+    判断模型错误是否值得重试
+
+    限流、超时和服务端错误可以重试；鉴权失败、请求格式错误等客户端错误
+    重试也不会成功。没有状态码时，只有连接错误和超时被视为可重试。
+    """
+    if error.status_code is not None:
+        return error.status_code in RETRYABLE_STATUS_CODES
+
+    original = error.original_error
+    if isinstance(original, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        from openai import APIConnectionError
+    except ImportError:
+        return False
+    return isinstance(original, APIConnectionError)
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    连续失败达到阈值后进入打开状态，在冷却时间内直接拒绝请求；冷却结束后
+    进入半开状态，只放行一个探测请求，成功则恢复，失败则重新打开。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            failure_threshold: 触发熔断的连续失败次数
+            recovery_timeout: 熔断后的冷却时间（秒）
+            clock: 时间函数，便于测试
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        """当前状态：closed、open 或 half_open"""
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._clock() - self._opened_at < self.recovery_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow_request(self) -> bool:
+        """是否允许发起请求（半开状态下只允许一个探测请求）"""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def retry_in(self) -> float:
+        """距离允许探测请求的剩余秒数"""
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            elapsed = self._clock() - self._opened_at
+            return max(self.recovery_timeout - elapsed, 0.0)
+
+    def record_success(self) -> None:
+        """记录一次成功，恢复到关闭状态"""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """
+        放弃探测名额但不记录结果
+
+        请求没有得出结论就结束（流被消费方关闭、调用被中断）时调用，
+        半开状态下的下一个请求可以重新探测。
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        """记录一次失败，达到阈值或探测失败时打开熔断器"""
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+            self._probing = False
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(
+    endpoint: str, failure_threshold: int = 5, recovery_timeout: float = 30.0
+) -> CircuitBreaker:
+    """获取端点共享的熔断器，同一进程内包装同一端点的模型共用一个"""
+    with _breakers_lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            breaker = CircuitBreaker(failure_threshold, recovery_timeout)
+            _breakers[endpoint] = breaker
+        return breaker
+
+
+def _endpoint_of(model: Any) -> str:
+    """根据模型的 base_url 和模型名生成端点标识"""
+    base_url = getattr(model, "base_url", None) or "default"
+    model_name = getattr(model, "model_name", None) or type(model).__name__
+    return f"{base_url}#{model_name}"
+
+
+def _disable_client_retries(model: Any) -> None:
+    """关闭 OpenAI 客户端自带的重试（max_retries 默认为 2）"""
+    client = getattr(model, "client", None)
+    max_retries = getattr(client, "max_retries", None)
+    if isinstance(max_retries, int) and max_retries > 0:
+        model.client = client.with_options(max_retries=0)
+
+
+class ResilientModel(Model):
+    """
+    带重试、退避和熔断的模型包装器
+
+    可以包装任意 Model。流式调用只在尚未输出任何内容时重试，已经输出部分
+    内容后出错则直接返回错误响应，避免重复输出。
+
+    重试由本类统一负责：被包装模型的 OpenAI 客户端自带的重试会被关闭，
+    避免两层重试的次数相乘。
+    """
+
+    def __init__(
+        self,
+        model: Model,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        max_retry_after: float = 60.0,
+        circuit_breaker: CircuitBreaker | None = None,
+        endpoint: str | None = None,
+        retryable: Callable[[ModelError], bool] = is_retryable,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        Args:
+            model: 被包装的模型
+            max_retries: 最大重试次数（不含首次调用）
+            base_delay: 指数退避的基础延迟（秒）
+            max_delay: 指数退避的最大延迟（秒）
+            max_retry_after: 服务端 Retry-After 的最长等待时间（秒）
+            circuit_breaker: 熔断器，默认使用端点共享的熔断器
+            endpoint: 端点标识，默认由模型的 base_url 和模型名生成
+            retryable: 判断错误是否可重试的函数
+            sleep: 等待函数，便于测试
+        """
+        self.model = model
+        _disable_client_retries(model)
+        self.model_name = getattr(model, "model_name", None)
+        self.base_url = getattr(model, "base_url", None)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.endpoint = endpoint or _endpoint_of(model)
+        self.circuit_breaker = circuit_breaker or get_circuit_breaker(
+            self.endpoint
+        )
+        self.retryable = retryable
+        self._sleep = sleep
+
+    def backoff_delay(self, attempt: int, error: ModelError) -> float:
+        """第 attempt 次失败后的等待时间，优先使用 Retry-After"""
+        if error.retry_after is not None:
+            return min(error.retry_after, self.max_retry_after)
+        # 全抖动：在 [0, 指数上限] 内随机，分散同时失败的请求
+        ceiling = min(self.max_delay, self.base_delay * 2**attempt)
+        return random.uniform(0, ceiling)
+
+    def _record_failure(self, error: ModelError) -> bool:
+        """记录失败并返回是否可重试；客户端错误不计入熔断"""
+        retryable = self.retryable(error)
+        if retryable:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        return retryable
+
+    def _rejected_error(self, last_error: ModelError | None) -> ModelError:
+        """熔断器拒绝请求时返回的错误"""
+        if last_error is not None:
+            return last_error
+        return CircuitOpenError(self.endpoint, self.circuit_breaker.retry_in())
+
+    def _error_from_response(self, response: ModelResponse) -> ModelError:
+        return response.error or ModelError(
+            response.content or "模型调用失败", model_name=self.model_name
+        )
+
+    def generate(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+    ) -> ModelResponse:
+        """
+        生成模型响应，可重试的错误按退避策略重试
+
+        Raises:
+            CircuitOpenError: 熔断器打开
+            ModelError: 不可重试的错误，或重试次数用尽
+        """
+        last_error: ModelError | None = None
+        for attempt in range(self.max_retries + 1):
+            if not self.circuit_breaker.allow_request():
+                raise self._rejected_error(last_error)
+
+            try:
+                response = self.model.generate(messages, tools)
+            except Exception as e:
+                last_error = _to_model_error(e, self.model_name)
+            except BaseException:
+                # 被中断：没有结论，释放半开状态的探测名额
+                self.circuit_breaker.release_probe()
+                raise
+            else:
+                if response.finish_reason != "error":
+                    self.circuit_breaker.record_success()
+                    return response
+                last_error = self._error_from_response(response)
+
+            if not self._record_failure(last_error):
+                break
+            if attempt < self.max_retries:
+                self._sleep(self.backoff_delay(attempt, last_error))
+
+        assert last_error is not None
+        raise last_error
+
+    def generate_stream(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+    ) -> Generator[StreamDelta | ModelResponse, None, None]:
+        """流式生成响应，尚未输出内容时出错会按退避策略重试"""
+        last_error: ModelError | None = None
+        for attempt in range(self.max_retries + 1):
+            if not self.circuit_breaker.allow_request():
+                break
+
+            streamed = False
+            last_error = None
+            try:
+                for item in self.model.generate_stream(messages, tools):
+                    if isinstance(item, ModelResponse):
+                        if item.finish_reason == "error":
+                            last_error = self._error_from_response(item)
+                            break
+                        self.circuit_breaker.record_success()
+                        yield item
+                        return
+                    if item.finish_reason == "error":
+                        # 错误提示在放弃重试时统一生成
+                        continue
+                    streamed = True
+                    yield item
+            except Exception as e:
+                last_error = _to_model_error(e, self.model_name)
+            except BaseException:
+                # 消费方关闭了生成器（GeneratorExit）或被中断：没有结论，
+                # 释放探测名额，否则熔断器会一直停在半开状态
+                self.circuit_breaker.release_probe()
+                raise
+
+            if last_error is None:
+                # 被包装的模型没有返回最终响应，交给 Runner 处理
+                self.circuit_breaker.record_success()
+                return
+
+            if not self._record_failure(last_error) or streamed:
+                break
+            if attempt < self.max_retries:
+                self._sleep(self.backoff_delay(attempt, last_error))
+
+        yield from _stream_error_response(
+            self._rejected_error(last_error), self.model_name
+        )
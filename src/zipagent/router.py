@@ -0,0 +1,514 @@
+"""Router - 多端点负载均衡模块
+
+RouterModel 把请求分发到一组 OpenAI 兼容的端点上，支持按最少进行中请求数或
+延迟 EWMA 选择端点，跟踪每个端点的健康状态，并在端点故障时切换到其他端点。
+Agent 代码无需改动，吞吐量随端点数量扩展。
+
+开启对冲（hedging）后，如果流式请求在指定延迟内还没有输出首个增量，会向另一个
+端点发出相同的请求，保留先输出的一方并关闭另一方的连接，以降低慢副本造成的尾延迟。
+
+使用示例:
+    from zipagent import Agent, OpenAIModel, RouterModel
+
+    model = RouterModel(
+        [
+            OpenAIModel(base_url="http://gpu-1:8000/v1", api_key="k1"),
+            OpenAIModel(base_url="http://gpu-2:8000/v1", api_key="k2"),
+        ],
+        strategy="latency",
+        hedge_percentile=95,
+    )
+    agent = Agent(name="Assistant", instructions="你是一个助手", model=model)
+"""
+
+import queue
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Generator
+from contextlib import suppress
+from typing import Any
+
+from .exceptions import ConfigurationError, ModelError
+from .model import (
+    Model,
+    ModelResponse,
+    StreamDelta,
+    _stream_error_response,
+    _to_model_error,
+    _watch_streams,
+)
+from .resilience import CircuitBreaker, _endpoint_of, is_retryable
+
+FAILOVER_STATUS_CODES = frozenset({401, 403})
+"""与端点自身配置有关的错误（如密钥失效），可以切换到其他端点"""
+
+
+class _Endpoint:
+    """端点及其负载和健康状态"""
+
+    def __init__(self, model: Model, name: str, breaker: CircuitBreaker):
+        self.model = model
+        self.name = name
+        self.breaker = breaker
+        self.outstanding = 0
+        self.latency_ewma: float | None = None
+        self.requests = 0
+        self.failures = 0
+
+
+class _HedgeAttempt:
+    """对冲请求中的一次尝试"""
+
+    def __init__(self, index: int, endpoint: _Endpoint, hedge: bool):
+        self.index = index
+        self.endpoint = endpoint
+        self.hedge = hedge  # 是否为首个增量超时后发出的对冲请求
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._streams: list[Any] = []
+
+    def track(self, stream: Any) -> None:
+        """记录尝试打开的连接，已取消时立即关闭"""
+        with self._lock:
+            if not self.cancelled.is_set():
+                self._streams.append(stream)
+                return
+        _close_quietly(stream)
+
+    def cancel(self) -> None:
+        """取消尝试并关闭它打开的连接，阻塞中的读取会随之结束"""
+        with self._lock:
+            self.cancelled.set()
+            streams, self._streams = self._streams, []
+        for stream in streams:
+            _close_quietly(stream)
+
+
+def _close_quietly(stream: Any) -> None:
+    close = getattr(stream, "close", None)
+    if close is not None:
+        with suppress(Exception):
+            close()
+
+
+_ATTEMPT_DONE = object()
+
+
+class RouterModel(Model):
+    """
+    多端点负载均衡模型
+
+    每次请求选择一个健康的端点；端点出现可重试的错误时，在尚未输出任何内容的
+    前提下切换到下一个端点。连续失败的端点会被熔断一段时间后再探测恢复。
+    """
+
+    STRATEGIES = ("least_outstanding", "latency")
+
+    def __init__(
+        self,
+        models: list[Model],
+        strategy: str = "least_outstanding",
+        ewma_alpha: float = 0.3,
+        failure_threshold: int = 3,
+        recovery_timeout: float = 30.0,
+        max_failover: int | None = None,
+        hedge_delay: float | None = None,
+        hedge_percentile: float | None = None,
+        hedge_min_samples: int = 20,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            models: 端点模型列表
+            strategy: 选择策略，least_outstanding（最少进行中请求）或
+                latency（延迟 EWMA 乘以进行中请求数）
+            ewma_alpha: 延迟 EWMA 的平滑系数
+            failure_threshold: 端点被熔断前允许的连续失败次数
+            recovery_timeout: 端点熔断后的冷却时间（秒）
+            max_failover: 单次请求最多切换的端点数，默认可以尝试所有端点
+            hedge_delay: 流式请求超过该秒数仍未输出首个增量时发出对冲请求，
+                默认不对冲
+            hedge_percentile: 使用最近首增量延迟的该百分位数作为对冲延迟，
+                样本不足时使用 hedge_delay
+            hedge_min_samples: 使用百分位数所需的最少样本数
+            clock: 时间函数，便于测试
+        """
+        if not models:
+            raise ConfigurationError("RouterModel 至少需要一个端点", "models")
+        if strategy not in self.STRATEGIES:
+            raise ConfigurationError(
+                f"未知的负载均衡策略: {strategy}", "strategy"
+            )
+
+        self.strategy = strategy
+        self.ewma_alpha = ewma_alpha
+        self.max_failover = (
+            len(models) - 1 if max_failover is None else max_failover
+        )
+        self.model_name = getattr(models[0], "model_name", None)
+        self.hedge_delay = hedge_delay
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._ttft_samples: deque[float] = deque(maxlen=200)
+        self._hedge_counts = {"requests": 0, "hedged": 0, "hedge_wins": 0}
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._endpoints = [
+            _Endpoint(
+                model,
+                _endpoint_of(model),
+                CircuitBreaker(failure_threshold, recovery_timeout, clock),
+            )
+            for model in models
+        ]
+
+    def _score(self, endpoint: _Endpoint) -> float:
+        if self.strategy == "latency":
+            # 尚无延迟数据的端点优先，以便尽快获得测量值
+            latency = endpoint.latency_ewma or 0.0
+            return latency * (endpoint.outstanding + 1)
+        return endpoint.outstanding
+
+    def _acquire(self, exclude: list[_Endpoint]) -> _Endpoint | None:
+        """选择一个端点并占用一个进行中请求名额，没有可用端点时返回 None"""
+        with self._lock:
+            candidates = [
+                e
+                for e in self._endpoints
+                if e not in exclude and e.breaker.state != CircuitBreaker.OPEN
+            ]
+            # 打乱后稳定排序，分数相同的端点之间随机分配
+            random.shuffle(candidates)
+            candidates.sort(key=self._score)
+            for endpoint in candidates:
+                if endpoint.breaker.allow_request():
+                    endpoint.outstanding += 1
+                    endpoint.requests += 1
+                    return endpoint
+        return None
+
+    def _release(
+        self,
+        endpoint: _Endpoint,
+        error: ModelError | None,
+        latency: float | None,
+    ) -> None:
+        """释放名额并记录结果"""
+        with self._lock:
+            endpoint.outstanding -= 1
+            if latency is not None:
+                if endpoint.latency_ewma is None:
+                    endpoint.latency_ewma = latency
+                else:
+                    endpoint.latency_ewma += self.ewma_alpha * (
+                        latency - endpoint.latency_ewma
+                    )
+            if error is not None:
+                endpoint.failures += 1
+
+        if error is not None and self._should_failover(error):
+            endpoint.breaker.record_failure()
+        else:
+            endpoint.breaker.record_success()
+
+    @staticmethod
+    def _should_failover(error: ModelError) -> bool:
+        return (
+            is_retryable(error) or error.status_code in FAILOVER_STATUS_CODES
+        )
+
+    def _no_endpoint_error(self, last_error: ModelError | None) -> ModelError:
+        return last_error or ModelError(
+            "没有可用的模型端点", model_name=self.model_name
+        )
+
+    def generate(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+    ) -> ModelResponse:
+        """
+        在选中的端点上生成响应，失败时切换端点
+
+        Raises:
+            ModelError: 所有可尝试的端点都失败，或错误不适合切换端点
+        """
+        tried: list[_Endpoint] = []
+        last_error: ModelError | None = None
+        while len(tried) <= self.max_failover:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+
+            start = self._clock()
+            try:
+                response = endpoint.model.generate(messages, tools)
+            except Exception as e:
+                last_error = _to_model_error(e, self.model_name)
+                self._release(endpoint, last_error, None)
+            else:
+                if response.finish_reason != "error":
+                    self._release(endpoint, None, self._clock() - start)
+                    return response
+                last_error = response.error or ModelError(
+                    response.content or "模型调用失败",
+                    model_name=self.model_name,
+                )
+                self._release(endpoint, last_error, None)
+
+            if not self._should_failover(last_error):
+                break
+
+        raise self._no_endpoint_error(last_error)
+
+    def generate_stream(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None = None,
+    ) -> Generator[StreamDelta | ModelResponse, None, None]:
+        """
+        流式生成响应，端点在输出内容前失败时切换到下一个端点
+
+        开启对冲时，首个增量迟迟未到会向另一个端点发出对冲请求。
+        """
+        hedge_delay = self.current_hedge_delay()
+        if hedge_delay is not None and len(self._endpoints) > 1:
+            yield from self._hedged_stream(messages, tools, hedge_delay)
+            return
+
+        tried: list[_Endpoint] = []
+        last_error: ModelError | None = None
+        while len(tried) <= self.max_failover:
+            endpoint = self._acquire(tried)
+            if endpoint is None:
+                break
+            tried.append(endpoint)
+
+            start = self._clock()
+            # 流式请求以首个增量的延迟作为端点延迟，不受输出长度影响
+            latency: float | None = None
+            streamed = False
+            last_error = None
+            try:
+                for item in endpoint.model.generate_stream(messages, tools):
+                    if latency is None:
+                        latency = self._clock() - start
+                        self._record_ttft(latency)
+                    if isinstance(item, ModelResponse):
+                        if item.finish_reason == "error":
+                            last_error = item.error or ModelError(
+                                item.content or "模型调用失败",
+                                model_name=self.model_name,
+                            )
+                            break
+                        self._release(endpoint, None, latency)
+                        yield item
+                        return
+                    if item.finish_reason == "error":
+                        continue
+                    streamed = True
+                    yield item
+            except GeneratorExit:
+                # 调用方提前关闭了流
+                self._release(endpoint, None, latency)
+                raise
+            except Exception as e:
+                last_error = _to_model_error(e, self.model_name)
+
+            if last_error is None:
+                # 端点没有返回最终响应，交给 Runner 处理
+                self._release(endpoint, None, latency)
+                return
+
+            self._release(endpoint, last_error, None)
+            if streamed or not self._should_failover(last_error):
+                break
+
+        yield from _stream_error_response(
+            self._no_endpoint_error(last_error), self.model_name
+        )
+
+    def _record_ttft(self, latency: float) -> None:
+        with self._lock:
+            self._ttft_samples.append(latency)
+
+    def current_hedge_delay(self) -> float | None:
+        """当前的对冲延迟（秒），None 表示不对冲"""
+        if self.hedge_percentile is not None:
+            with self._lock:
+                samples = sorted(self._ttft_samples)
+            if len(samples) >= max(self.hedge_min_samples, 1):
+                index = int(len(samples) * self.hedge_percentile / 100)
+                return samples[min(index, len(samples) - 1)]
+        return self.hedge_delay
+
+    def _run_attempt(
+        self,
+        attempt: _HedgeAttempt,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None,
+        events: "queue.Queue[tuple[_HedgeAttempt, Any]]",
+    ) -> None:
+        """在后台线程中执行一次尝试，把输出放入事件队列"""
+        start = self._clock()
+        latency: float | None = None
+        error: ModelError | None = None
+        stream = attempt.endpoint.model.generate_stream(messages, tools)
+        try:
+            # 模型打开的连接登记到尝试上，取消时由调度线程直接关闭
+            with _watch_streams(attempt.track):
+                for item in stream:
+                    if attempt.cancelled.is_set():
+                        break
+                    if latency is None:
+                        latency = self._clock() - start
+                        self._record_ttft(latency)
+                    if isinstance(item, ModelResponse):
+                        if item.finish_reason == "error":
+                            error = item.error or ModelError(
+                                item.content or "模型调用失败",
+                                model_name=self.model_name,
+                            )
+                            break
+                    elif item.finish_reason == "error":
+                        continue
+                    events.put((attempt, item))
+        except Exception as e:
+            error = _to_model_error(e, self.model_name)
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+            # 被取消的一方不计入延迟和健康统计
+            cancelled = attempt.cancelled.is_set()
+            self._release(
+                attempt.endpoint,
+                None if cancelled else error,
+                None if cancelled or error else latency,
+            )
+            events.put((attempt, error or _ATTEMPT_DONE))
+
+    def _hedged_stream(
+        self,
+        messages: list[dict[str, Any]],
+        tools: list[dict[str, Any]] | None,
+        hedge_delay: float,
+    ) -> Generator[StreamDelta | ModelResponse, None, None]:
+        """对冲的流式请求：保留先输出首个增量的一方，取消另一方"""
+        events: queue.Queue[tuple[_HedgeAttempt, Any]] = queue.Queue()
+        attempts: list[_HedgeAttempt] = []
+
+        def launch(hedge: bool = False) -> bool:
+            endpoint = self._acquire([a.endpoint for a in attempts])
+            if endpoint is None:
+                return False
+            attempt = _HedgeAttempt(len(attempts), endpoint, hedge)
+            attempts.append(attempt)
+            threading.Thread(
+                target=self._run_attempt,
+                args=(attempt, messages, tools, events),
+                daemon=True,
+            ).start()
+            return True
+
+        with self._lock:
+            self._hedge_counts["requests"] += 1
+        if not launch():
+            yield from _stream_error_response(
+                self._no_endpoint_error(None), self.model_name
+            )
+            return
+
+        deadline: float | None = time.monotonic() + hedge_delay
+        running = 1
+        try:
+            # 等待任意一方输出首个增量
+            while True:
+                timeout = (
+                    None
+                    if deadline is None
+                    else max(deadline - time.monotonic(), 0)
+                )
+                try:
+                    attempt, item = events.get(timeout=timeout)
+                except queue.Empty:
+                    deadline = None
+                    if launch(hedge=True):
+                        running += 1
+                        with self._lock:
+                            self._hedge_counts["hedged"] += 1
+                    continue
+
+                if isinstance(item, ModelError):
+                    # 输出前失败：还有其他尝试时继续等待，否则尝试切换端点
+                    running -= 1
+                    deadline = None
+                    if (
+                        running == 0
+                        and self._should_failover(item)
+                        and len(attempts) <= self.max_failover
+                        and launch()
+                    ):
+                        running += 1
+                    if running == 0:
+                        yield from _stream_error_response(
+                            item, self.model_name
+                        )
+                        return
+                    continue
+                break
+
+            winner = attempt
+            for other in attempts:
+                if other is not winner:
+                    other.cancel()
+            # 失败后切换端点发出的尝试不算对冲胜出
+            if winner.hedge:
+                with self._lock:
+                    self._hedge_counts["hedge_wins"] += 1
+
+            # 转发胜出一方的输出
+            while True:
+                if item is _ATTEMPT_DONE:
+                    return
+                if isinstance(item, ModelError):
+                    yield from _stream_error_response(item, self.model_name)
+                    return
+                yield item
+                if isinstance(item, ModelResponse):
+                    return
+                attempt, item = events.get()
+                while attempt is not winner:
+                    attempt, item = events.get()
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    def hedge_stats(self) -> dict[str, int]:
+        """
+        对冲统计
+
+        Returns:
+            dict: requests 为对冲模式下的流式请求数，hedged 为发出对冲请求的
+            次数，hedge_wins 为对冲请求先输出的次数
+        """
+        with self._lock:
+            return dict(self._hedge_counts)
+
+    def stats(self) -> list[dict[str, Any]]:
+        """每个端点的负载、延迟和健康状态"""
+        with self._lock:
+            return [
+                {
+                    "endpoint": e.name,
+                    "state": e.breaker.state,
+                    "outstanding": e.outstanding,
+                    "latency_ewma": e.latency_ewma,
+                    "requests": e.requests,
+                    "failures": e.failures,
+                }
+                for e in self._endpoints
+            ]
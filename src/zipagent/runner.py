@@ -1,12 +1,26 @@
 """Runner - Agent运行引擎"""
 
+import asyncio
 import json
-from collections.abc import Callable, Generator
+import threading
+import time
+from collections.abc import AsyncGenerator, Callable, Generator, Iterable
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass, field
+from typing import Any
 
 from .agent import Agent
-from .context import Context
-from .model import ModelResponse
+from .context import Context, Usage
+from .exceptions import ConfigurationError
+from .executor import run_in_thread
+from .model import AsyncModel, Model, ModelResponse, StreamDelta
 from .stream import StreamEvent, StreamEventType
+from .tool import Tool, ToolResult
 
 
 class RunResult:
@@ -28,7 +42,78 @@ class RunResult:
         return self.content
 
     def __repr__(self) -> str:
-        return f"RunResult(content='{self.content[:50]}...', success={self.success})"
+        return (
+            f"RunResult(content='{self.content[:50]}...', "
+            f"success={self.success})"
+        )
+
+
+@dataclass
+class BatchStats:
+    """批量运行的汇总统计"""
+
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    usage: Usage = field(default_factory=Usage)
+    elapsed: float = 0.0
+    """总耗时（秒）"""
+
+    @property
+    def throughput(self) -> float:
+        """每秒完成的任务数"""
+        return self.total / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        """每秒消耗的 token 数"""
+        if self.elapsed <= 0:
+            return 0.0
+        return self.usage.total_tokens / self.elapsed
+
+
+BatchJob = tuple[Agent, str] | tuple[Agent, str, Context | None]
+"""批量任务：(agent, 用户输入) 或 (agent, 用户输入, 上下文)"""
+
+
+class _JobControl:
+    """批量任务的截止时间和取消标记，由任务线程和调度线程共享"""
+
+    def __init__(self, job: BatchJob, timeout: float | None):
+        self.timeout = timeout
+        self.deadline: float | None = None
+        self.cancelled = threading.Event()
+        context = job[2] if len(job) > 2 else None
+        self.context = context if context is not None else Context()
+        self._usage_before = Usage(
+            self.context.usage.input_tokens,
+            self.context.usage.output_tokens,
+            self.context.usage.total_tokens,
+        )
+
+    def start(self) -> None:
+        """任务开始运行，从此刻起计算超时"""
+        if self.timeout is not None:
+            self.deadline = time.monotonic() + self.timeout
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def usage_delta(self) -> Usage:
+        """任务开始以来消耗的 Usage"""
+        usage = self.context.usage
+        return Usage(
+            usage.input_tokens - self._usage_before.input_tokens,
+            usage.output_tokens - self._usage_before.output_tokens,
+            usage.total_tokens - self._usage_before.total_tokens,
+        )
+
+    def timed_out(self) -> tuple[RunResult, Usage, bool]:
+        """超时的任务结果"""
+        error_msg = f"任务超时 ({self.timeout} 秒)"
+        result = RunResult("", self.context, success=False, error=error_msg)
+        return result, self.usage_delta(), True
 
 
 class Runner:
@@ -41,6 +126,8 @@ class Runner:
         context: Context | None = None,
         max_turns: int = 10,
         stream_callback: Callable[[StreamEvent], None] | None = None,
+        max_parallel_tools: int = 1,
+        tool_timeout: float | None = None,
     ) -> RunResult:
         """
         运行Agent处理用户输入（基于 run_stream 实现）
@@ -51,36 +138,25 @@ class Runner:
             context: 上下文（可选，用于多轮对话）
             max_turns: 最大循环次数，防止无限循环
             stream_callback: 流式输出回调函数
+            max_parallel_tools: 同一轮多个工具调用的最大并发数，默认串行
+            tool_timeout: 本次运行中每个工具调用的超时时间（秒），
+                与工具自身的 timeout 取较小值
 
         Returns:
             RunResult: 包含最终结果和上下文的对象
         """
-
-        # 定义内部回调来处理流式事件
-        def internal_callback(event: StreamEvent):
-            # 如果有外部回调，先调用
-            if stream_callback:
-                stream_callback(event)
-            else:
-                # 默认的控制台输出
-                if event.type == StreamEventType.QUESTION:
-                    print(f"\n📝 问题：{event.content}")
-                elif event.type == StreamEventType.THINKING:
-                    print(f"\n💭 思考：{event.content}")
-                elif event.type == StreamEventType.TOOL_CALL:
-                    print(f"\n🔧 工具：{event.tool_name}({event.tool_args})")
-                elif event.type == StreamEventType.TOOL_RESULT:
-                    print(f"📊 工具结果：{event.tool_result}")
-                elif event.type == StreamEventType.ANSWER:
-                    print(f"\n✅ 回答：{event.content}")
-                elif event.type == StreamEventType.ERROR:
-                    print(f"\n❌ 错误：{event.error}")
+        callback = stream_callback or Runner._print_event
 
         # 执行流式处理，收集最终结果
         try:
             # 使用生成器执行流式处理
             stream_generator = Runner.run_stream(
-                agent, user_input, context, max_turns
+                agent,
+                user_input,
+                context,
+                max_turns,
+                max_parallel_tools,
+                tool_timeout,
             )
 
             # 遍历所有事件，并获取最终结果
@@ -88,7 +164,7 @@ class Runner:
             try:
                 while True:
                     event = next(stream_generator)
-                    internal_callback(event)
+                    callback(event)
             except StopIteration as e:
                 final_result = e.value
 
@@ -103,6 +179,77 @@ class Runner:
                 "", context or Context(), success=False, error=error_msg
             )
 
+    @staticmethod
+    async def run_async(
+        agent: Agent,
+        user_input: str,
+        context: Context | None = None,
+        max_turns: int = 10,
+        stream_callback: Callable[[StreamEvent], None] | None = None,
+        max_parallel_tools: int = 1,
+        tool_timeout: float | None = None,
+    ) -> RunResult:
+        """
+        异步运行Agent处理用户输入（run 的 asyncio 版本）
+
+        大量并发对话可以共享同一个事件循环，而不需要每个对话占用一个线程。
+
+        Args:
+            agent: 要运行的Agent
+            user_input: 用户输入
+            context: 上下文（可选，用于多轮对话）
+            max_turns: 最大循环次数，防止无限循环
+            stream_callback: 流式输出回调函数
+            max_parallel_tools: 同一轮多个工具调用的最大并发数，默认串行
+            tool_timeout: 本次运行中每个工具调用的超时时间（秒），
+                与工具自身的 timeout 取较小值
+
+        Returns:
+            RunResult: 包含最终结果和上下文的对象
+        """
+        callback = stream_callback or Runner._print_event
+
+        try:
+            final_result = None
+            async for item in Runner._run_stream_async(
+                agent,
+                user_input,
+                context,
+                max_turns,
+                max_parallel_tools,
+                tool_timeout,
+            ):
+                if isinstance(item, RunResult):
+                    final_result = item
+                else:
+                    callback(item)
+
+            return final_result or RunResult(
+                "", context or Context(), success=True
+            )
+
+        except Exception as e:
+            error_msg = f"运行过程中出现错误: {e!s}"
+            return RunResult(
+                "", context or Context(), success=False, error=error_msg
+            )
+
+    @staticmethod
+    def _print_event(event: StreamEvent) -> None:
+        """默认的控制台输出"""
+        if event.type == StreamEventType.QUESTION:
+            print(f"\n📝 问题：{event.content}")
+        elif event.type == StreamEventType.THINKING:
+            print(f"\n💭 思考：{event.content}")
+        elif event.type == StreamEventType.TOOL_CALL:
+            print(f"\n🔧 工具：{event.tool_name}({event.tool_args})")
+        elif event.type == StreamEventType.TOOL_RESULT:
+            print(f"📊 工具结果：{event.tool_result}")
+        elif event.type == StreamEventType.ANSWER:
+            print(f"\n✅ 回答：{event.content}")
+        elif event.type == StreamEventType.ERROR:
+            print(f"\n❌ 错误：{event.error}")
+
     @staticmethod
     def chat(agent: Agent, context: Context | None = None) -> Context:
         """
@@ -151,6 +298,8 @@ class Runner:
         user_input: str,
         context: Context | None = None,
         max_turns: int = 10,
+        max_parallel_tools: int = 1,
+        tool_timeout: float | None = None,
     ) -> Generator[StreamEvent, None, RunResult]:
         """
         流式运行Agent处理用户输入（逐字符输出）
@@ -160,6 +309,11 @@ class Runner:
             user_input: 用户输入
             context: 上下文（可选，用于多轮对话）
             max_turns: 最大循环次数，防止无限循环
+            max_parallel_tools: 同一轮多个工具调用的最大并发数，默认串行。
+                并发执行时结果仍按 tool_calls 的原始顺序写入上下文
+            tool_timeout: 本次运行中每个工具调用的超时时间（秒），
+                与工具自身的 timeout 取较小值。超时的工具调用以错误事件返回，
+                模型可以在下一轮中继续处理
 
         Yields:
             StreamEvent: 流式事件（包含增量内容）
@@ -167,147 +321,641 @@ class Runner:
         Returns:
             RunResult: 最终运行结果
         """
-        # 自动创建或使用现有 context
-        if context is None:
-            context = Context()
-            # 记录 Agent 信息
-            context.last_agent = agent.name
-
-        # 如果是传入的 context，也更新 last_agent
-        context.last_agent = agent.name
+        context = Runner._bind_context(agent, context)
 
         try:
-            # 添加系统消息（如果是新对话）
-            if not context.messages:
-                system_msg = agent.get_system_message()
-                context.add_message(system_msg["role"], system_msg["content"])
-
-            # 添加用户消息（新的一轮对话）
-            context.add_message("user", user_input)
-            context.turn_count += 1
+            Runner._start_turn(agent, user_input, context)
 
             # 发送问题事件
             yield StreamEvent.question(user_input)
 
-            # 预先缓存工具schema，避免在循环中重复计算
+            model = agent.model
+            if isinstance(model, AsyncModel):
+                raise ConfigurationError(
+                    "异步模型请使用 Runner.run_async 或 "
+                    "Runner.run_stream_async 运行",
+                    config_key="model",
+                )
+            assert model is not None, (
+                "Agent model should not be None after initialization"
+            )
+
+            # 预先缓存工具schema，工具集合变化时才重新获取
+            tools_version = agent.tools_version
             tools_schema = agent.get_tools_schema() if agent.tools else None
 
             # 主执行循环
-            for turn in range(max_turns):
-                # 获取当前消息列表
+            for _ in range(max_turns):
+                if agent.tools_version != tools_version:
+                    tools_version = agent.tools_version
+                    tools_schema = (
+                        agent.get_tools_schema() if agent.tools else None
+                    )
+
+                # 控制上下文长度，然后获取当前消息列表
+                Runner._fit_context_window(agent, context, tools_schema)
                 messages = context.get_messages_for_api()
 
                 # 调用模型流式API
-                assert agent.model is not None, (
-                    "Agent model should not be None after initialization"
-                )
-                stream_generator = agent.model.generate_stream(messages, tools_schema)
-
-                # 使用真正的流式处理
                 full_content = ""
                 response = None
 
-                for stream_item in stream_generator:
+                for stream_item in model.generate_stream(
+                    messages, tools_schema
+                ):
                     if isinstance(stream_item, ModelResponse):
                         # 这是最终的ModelResponse
                         response = stream_item
                         break
-                    elif (
-                        hasattr(stream_item, "content")
-                        and stream_item.content is not None
-                    ):
-                        # 这是StreamDelta，包含增量内容
-                        delta_content = stream_item.content
-                        full_content += delta_content
-
+                    delta_event = Runner._delta_event(stream_item)
+                    if delta_event is not None:
+                        full_content += delta_event.content or ""
                         # 实时yield增量内容
-                        yield StreamEvent.answer_delta(delta_content)
+                        yield delta_event
 
                 # 处理完整响应
-                if response:
-                    # 累计使用量统计
-                    context.usage.add(response.usage)
-
-                    # 检查是否有工具调用
-                    if response.tool_calls:
-                        # 有工具调用，发送思考完成事件
-                        yield StreamEvent.thinking(full_content)
-                        # 将思考内容添加到上下文
-                        context.add_message("assistant", full_content)
+                event, result = Runner._finish_response(
+                    context, full_content, response
+                )
+                yield event
+                if result is not None:
+                    return result
+
+                # 有工具调用，执行工具后继续下一轮
+                assert response is not None and response.tool_calls
+                calls = [
+                    Runner._resolve_tool_call(agent, tool_call)
+                    for tool_call in response.tool_calls
+                ]
+                yield from Runner._execute_tool_calls(
+                    context, calls, max_parallel_tools, tool_timeout
+                )
+
+            # 超过最大轮次
+            event, result = Runner._max_turns_exceeded(context, max_turns)
+            yield event
+            return result
+
+        except Exception as e:
+            event, result = Runner._run_failed(context, e)
+            yield event
+            return result
+
+    @staticmethod
+    async def run_stream_async(
+        agent: Agent,
+        user_input: str,
+        context: Context | None = None,
+        max_turns: int = 10,
+        max_parallel_tools: int = 1,
+        tool_timeout: float | None = None,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """
+        异步流式运行Agent处理用户输入（run_stream 的 asyncio 版本）
+
+        产生的事件序列与 run_stream 完全一致。由于异步生成器无法返回值，
+        最终结果可通过 context 获取，或改用 run_async 并传入 stream_callback。
+
+        Args:
+            agent: 要运行的Agent
+            user_input: 用户输入
+            context: 上下文（可选，用于多轮对话）
+            max_turns: 最大循环次数，防止无限循环
+            max_parallel_tools: 同一轮多个工具调用的最大并发数，默认串行。
+                并发执行时结果仍按 tool_calls 的原始顺序写入上下文
+            tool_timeout: 本次运行中每个工具调用的超时时间（秒），
+                与工具自身的 timeout 取较小值。超时的工具调用以错误事件返回，
+                模型可以在下一轮中继续处理
+
+        Yields:
+            StreamEvent: 流式事件（包含增量内容）
+        """
+        async for item in Runner._run_stream_async(
+            agent,
+            user_input,
+            context,
+            max_turns,
+            max_parallel_tools,
+            tool_timeout,
+        ):
+            if isinstance(item, StreamEvent):
+                yield item
+
+    @staticmethod
+    def run_many(
+        jobs: Iterable[BatchJob],
+        max_concurrency: int = 8,
+        timeout: float | None = None,
+        ordered: bool = False,
+        max_turns: int = 10,
+        max_parallel_tools: int = 1,
+        stats: BatchStats | None = None,
+        tool_timeout: float | None = None,
+    ) -> Generator[tuple[int, RunResult], None, BatchStats]:
+        """
+        批量运行多个任务（基于 run_stream 实现）
+
+        任务按需从 jobs 中读取，同时运行的任务数不超过 max_concurrency，
+        因此可以直接传入很大的生成器。每个任务完成后立即产出结果。
+
+        Args:
+            jobs: 任务序列，元素为 (agent, 用户输入) 或
+                (agent, 用户输入, 上下文)
+            max_concurrency: 最大并发任务数
+            timeout: 单个任务的超时时间（秒），从任务开始运行时计算。
+                到期后立即以失败结果返回并让出并发名额，即使任务仍阻塞在
+                模型或工具调用中；任务线程会在阻塞的调用返回后停止
+            ordered: 为 True 时按输入顺序产出结果，否则按完成顺序
+            max_turns: 每个任务的最大循环次数
+            max_parallel_tools: 每个任务中工具调用的最大并发数
+            stats: 统计对象（可选），传入后会在运行过程中实时更新
+            tool_timeout: 每个工具调用的超时时间（秒）。设置了 timeout 时，
+                工具调用也不会超过任务的超时时间
+
+        Yields:
+            (任务序号, RunResult)
+
+        Returns:
+            BatchStats: 汇总的任务数、成功/失败/超时数、Usage 和吞吐量
+        """
+        stats = stats if stats is not None else BatchStats()
+        started_at = time.monotonic()
+        # 按序产出时允许多提交一些任务，避免慢任务阻塞整个批次
+        window = max_concurrency * 2 if ordered else max_concurrency
+        job_iter = enumerate(jobs)
+        pending: dict[Future[tuple[RunResult, Usage, bool]], int] = {}
+        controls: dict[Future[tuple[RunResult, Usage, bool]], _JobControl] = {}
+        finished: dict[int, RunResult] = {}
+        next_index = 0
+        exhausted = False
+
+        def record(result: RunResult, usage: Usage, timed_out: bool) -> None:
+            stats.total += 1
+            stats.usage.add(usage)
+            if result.success:
+                stats.succeeded += 1
+            else:
+                stats.failed += 1
+            if timed_out:
+                stats.timed_out += 1
+            stats.elapsed = time.monotonic() - started_at
+
+        def wait_timeout() -> float | None:
+            """距离最近一个运行中任务到期的时间"""
+            if timeout is None:
+                return None
+            now = time.monotonic()
+            # 刚启动的线程可能还没有记录开始时间，最早也要 timeout 秒后才到期
+            deadline = min(
+                (
+                    control.deadline
+                    for control in controls.values()
+                    if control.deadline is not None
+                ),
+                default=now + timeout,
+            )
+            return max(deadline - now, 0)
+
+        def finish(
+            future: Future[tuple[RunResult, Usage, bool]],
+            outcome: tuple[RunResult, Usage, bool],
+        ) -> tuple[int, RunResult]:
+            index = pending.pop(future)
+            del controls[future]
+            result, usage, timed_out = outcome
+            record(result, usage, timed_out)
+            return index, result
+
+        try:
+            while True:
+                # 补充任务，直到达到并发上限或任务耗尽
+                while (
+                    not exhausted
+                    and len(pending) < max_concurrency
+                    and len(pending) + len(finished) < window
+                ):
+                    try:
+                        index, job = next(job_iter)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    control = _JobControl(job, timeout)
+                    # 每个任务使用独立的守护线程：超时的任务可能仍阻塞在
+                    # 模型调用中，它的线程不占用后续任务的并发名额
+                    future = run_in_thread(
+                        Runner._run_job,
+                        job,
+                        control,
+                        max_turns,
+                        max_parallel_tools,
+                        tool_timeout,
+                        name=f"run-many-{index}",
+                    )
+                    pending[future] = index
+                    controls[future] = control
+
+                if not pending:
+                    break
+
+                done, _ = wait(
+                    pending,
+                    timeout=wait_timeout(),
+                    return_when=FIRST_COMPLETED,
+                )
+                completed = [
+                    finish(future, future.result()) for future in done
+                ]
+                for future, control in list(controls.items()):
+                    if control.expired():
+                        # 到期的任务立即返回，任务线程在下一个事件时停止
+                        control.cancelled.set()
+                        completed.append(finish(future, control.timed_out()))
+
+                for index, result in completed:
+                    if not ordered:
+                        yield index, result
                     else:
-                        # 没有工具调用，发送回答完成事件
-                        yield StreamEvent.answer(full_content)
-                        context.add_message("assistant", full_content)
-                        return RunResult(full_content, context)
-
-                # 如果有工具调用，执行工具
-                if response and response.tool_calls:
-                    has_tool_results = False
-
-                    for tool_call in response.tool_calls:
-                        # 解析工具调用
-                        tool_name = tool_call["function"]["name"]
-
-                        try:
-                            arguments = json.loads(
-                                tool_call["function"]["arguments"]
-                            )
-                        except json.JSONDecodeError:
-                            # 如果JSON解析失败，尝试eval（简单处理）
-                            try:
-                                arguments = eval(
-                                    tool_call["function"]["arguments"]
-                                )
-                            except Exception:
-                                arguments = {}
-
-                        # 查找并执行工具
-                        tool = agent.find_tool(tool_name)
-                        if tool:
-                            # 发送工具调用事件
-                            yield StreamEvent.tool_call(tool_name, arguments)
-
-                            tool_result = tool.execute(arguments)
-
-                            if tool_result.success:
-                                # 发送工具结果事件
-                                yield StreamEvent.create_tool_result(
-                                    tool_name, tool_result.result
-                                )
-                                # 将工具调用和结果添加到上下文
-                                context.add_tool_call(
-                                    tool_name, arguments, tool_result.result
-                                )
-                                has_tool_results = True
-                            else:
-                                # 工具执行失败
-                                error_msg = f"工具 {tool_name} 执行失败: {tool_result.error}"
-                                yield StreamEvent.create_error(error_msg)
-                                context.add_message("system", error_msg)
-                        else:
-                            # 找不到工具
-                            error_msg = f"找不到工具: {tool_name}"
-                            yield StreamEvent.create_error(error_msg)
-                            context.add_message("system", error_msg)
-
-                    # 如果有工具结果，继续下一轮
-                    if has_tool_results:
-                        continue
-
-                # 如果既没有工具调用，也没有文本回复，说明出现了问题
-                if not response or not response.tool_calls:
-                    error_msg = "模型没有返回任何内容"
-                    yield StreamEvent.create_error(error_msg)
-                    return RunResult(
-                        "", context, success=False, error=error_msg
+                        finished[index] = result
+
+                while next_index in finished:
+                    yield next_index, finished.pop(next_index)
+                    next_index += 1
+        finally:
+            # 调用方提前停止时，运行中的任务尽快停止
+            for control in controls.values():
+                control.cancelled.set()
+
+        stats.elapsed = time.monotonic() - started_at
+        return stats
+
+    @staticmethod
+    def _run_job(
+        job: BatchJob,
+        control: _JobControl,
+        max_turns: int,
+        max_parallel_tools: int,
+        tool_timeout: float | None = None,
+    ) -> tuple[RunResult, Usage, bool]:
+        """
+        运行单个批量任务
+
+        每个事件之后检查取消标记和截止时间，到期时关闭事件流。
+
+        Returns:
+            (结果, 本次任务消耗的 Usage, 是否超时)
+        """
+        control.start()
+        if control.timeout is not None:
+            # 挂起的工具调用需要自己的超时，避免一直占用线程
+            tool_timeout = (
+                control.timeout
+                if tool_timeout is None
+                else min(tool_timeout, control.timeout)
+            )
+        stream = Runner.run_stream(
+            job[0],
+            job[1],
+            control.context,
+            max_turns,
+            max_parallel_tools,
+            tool_timeout,
+        )
+        try:
+            while True:
+                next(stream)
+                if control.cancelled.is_set() or control.expired():
+                    stream.close()
+                    return control.timed_out()
+        except StopIteration as e:
+            return e.value, control.usage_delta(), False
+
+    @staticmethod
+    async def _run_stream_async(
+        agent: Agent,
+        user_input: str,
+        context: Context | None,
+        max_turns: int,
+        max_parallel_tools: int = 1,
+        tool_timeout: float | None = None,
+    ) -> AsyncGenerator[StreamEvent | RunResult, None]:
+        """异步执行主循环，最后产出 RunResult"""
+        context = Runner._bind_context(agent, context)
+
+        try:
+            Runner._start_turn(agent, user_input, context)
+
+            yield StreamEvent.question(user_input)
+
+            assert agent.model is not None, (
+                "Agent model should not be None after initialization"
+            )
+            tools_version = agent.tools_version
+            tools_schema = agent.get_tools_schema() if agent.tools else None
+
+            for _ in range(max_turns):
+                if agent.tools_version != tools_version:
+                    tools_version = agent.tools_version
+                    tools_schema = (
+                        agent.get_tools_schema() if agent.tools else None
                     )
 
-            # 超过最大轮次
-            error_msg = f"达到最大执行轮次 ({max_turns})，可能存在无限循环"
-            yield StreamEvent.create_error(error_msg)
-            return RunResult("", context, success=False, error=error_msg)
+                Runner._fit_context_window(agent, context, tools_schema)
+                messages = context.get_messages_for_api()
+
+                full_content = ""
+                response = None
+
+                async for stream_item in Runner._agenerate_stream(
+                    agent.model, messages, tools_schema
+                ):
+                    if isinstance(stream_item, ModelResponse):
+                        response = stream_item
+                        break
+                    delta_event = Runner._delta_event(stream_item)
+                    if delta_event is not None:
+                        full_content += delta_event.content or ""
+                        yield delta_event
+
+                event, result = Runner._finish_response(
+                    context, full_content, response
+                )
+                yield event
+                if result is not None:
+                    yield result
+                    return
+
+                assert response is not None and response.tool_calls
+                calls = [
+                    Runner._resolve_tool_call(agent, tool_call)
+                    for tool_call in response.tool_calls
+                ]
+                async for event in Runner._aexecute_tool_calls(
+                    context, calls, max_parallel_tools, tool_timeout
+                ):
+                    yield event
+
+            event, result = Runner._max_turns_exceeded(context, max_turns)
+            yield event
+            yield result
 
         except Exception as e:
-            error_msg = f"运行过程中出现错误: {e!s}"
-            yield StreamEvent.create_error(error_msg)
-            return RunResult("", context, success=False, error=error_msg)
+            event, result = Runner._run_failed(context, e)
+            yield event
+            yield result
+
+    @staticmethod
+    async def _agenerate_stream(
+        model: Model | AsyncModel,
+        messages: list[dict[str, Any]],
+        tools_schema: list[dict[str, Any]] | None,
+    ) -> AsyncGenerator[StreamDelta | ModelResponse, None]:
+        """以异步方式驱动模型流式输出，同步模型在线程中逐项拉取"""
+        if isinstance(model, AsyncModel):
+            async for item in model.generate_stream(messages, tools_schema):
+                yield item
+            return
+
+        iterator = iter(model.generate_stream(messages, tools_schema))
+        sentinel = object()
+        while True:
+            item = await asyncio.to_thread(next, iterator, sentinel)
+            if item is sentinel:
+                return
+            yield item
+
+    # ---- 同步与异步路径共用的步骤，保证两者事件语义一致 ----
+
+    @staticmethod
+    def _bind_context(agent: Agent, context: Context | None) -> Context:
+        """自动创建或使用现有 context，并记录 Agent 信息"""
+        if context is None:
+            context = Context()
+        context.last_agent = agent.name
+        return context
+
+    @staticmethod
+    def _start_turn(agent: Agent, user_input: str, context: Context) -> None:
+        """写入系统消息（如果是新对话）和用户消息"""
+        if not context.messages:
+            system_msg = agent.get_system_message()
+            context.add_message(system_msg["role"], system_msg["content"])
+
+        # 添加用户消息（新的一轮对话）
+        context.turn_count += 1
+        context.add_message("user", user_input)
+
+    @staticmethod
+    def _fit_context_window(
+        agent: Agent,
+        context: Context,
+        tools_schema: list[dict[str, Any]] | None,
+    ) -> None:
+        """如果 Agent 配置了上下文窗口，把历史裁剪到预算内"""
+        if agent.context_window is not None:
+            agent.context_window.fit(context, tools_schema)
+
+    @staticmethod
+    def _delta_event(stream_item: Any) -> StreamEvent | None:
+        """将 StreamDelta 转换为回答增量事件"""
+        if getattr(stream_item, "finish_reason", None) == "error":
+            # 错误提示不属于回答内容，由最终响应统一报告
+            return None
+        if hasattr(stream_item, "content") and stream_item.content is not None:
+            return StreamEvent.answer_delta(stream_item.content)
+        return None
+
+    @staticmethod
+    def _finish_response(
+        context: Context, full_content: str, response: ModelResponse | None
+    ) -> tuple[StreamEvent, RunResult | None]:
+        """
+        处理一轮模型的完整响应
+
+        Returns:
+            (事件, 结果)：结果不为 None 时本次运行结束；
+            否则响应中包含工具调用，需要继续执行工具
+        """
+        if response is None:
+            # 既没有工具调用，也没有文本回复，说明出现了问题
+            error_msg = "模型没有返回任何内容"
+            return StreamEvent.create_error(error_msg), RunResult(
+                "", context, success=False, error=error_msg
+            )
+
+        if response.finish_reason == "error":
+            # 模型调用失败，错误信息不写入上下文，避免污染后续对话
+            error_msg = response.content or str(response.error)
+            return StreamEvent.create_error(error_msg), RunResult(
+                "", context, success=False, error=error_msg
+            )
+
+        # 累计使用量统计
+        context.usage.add(response.usage)
+        context.add_message("assistant", full_content)
+
+        if response.tool_calls:
+            # 有工具调用，发送思考完成事件
+            return StreamEvent.thinking(full_content), None
+
+        # 没有工具调用，发送回答完成事件
+        return StreamEvent.answer(full_content), RunResult(
+            full_content, context
+        )
+
+    @staticmethod
+    def _parse_tool_arguments(raw_arguments: str) -> dict[str, Any]:
+        """解析工具参数，失败时退化为空参数"""
+        try:
+            return json.loads(raw_arguments)
+        except json.JSONDecodeError:
+            # 如果JSON解析失败，尝试eval（简单处理）
+            try:
+                return eval(raw_arguments)
+            except Exception:
+                return {}
+
+    @staticmethod
+    def _resolve_tool_call(
+        agent: Agent, tool_call: dict[str, Any]
+    ) -> tuple[str, dict[str, Any], Tool | None]:
+        """解析工具调用并查找对应工具"""
+        tool_name = tool_call["function"]["name"]
+        arguments = Runner._parse_tool_arguments(
+            tool_call["function"]["arguments"]
+        )
+        return tool_name, arguments, agent.find_tool(tool_name)
+
+    @staticmethod
+    def _execute_tool_calls(
+        context: Context,
+        calls: list[tuple[str, dict[str, Any], Tool | None]],
+        max_parallel_tools: int,
+        tool_timeout: float | None = None,
+    ) -> Generator[StreamEvent, None, None]:
+        """执行一轮中的工具调用，必要时在线程池中并发执行"""
+        if max_parallel_tools <= 1 or len(calls) <= 1:
+            for tool_name, arguments, tool in calls:
+                if tool is None:
+                    yield Runner._record_missing_tool(context, tool_name)
+                    continue
+
+                # 发送工具调用事件
+                yield StreamEvent.tool_call(tool_name, arguments)
+                tool_result = tool.execute(arguments, tool_timeout)
+                yield Runner._record_tool_result(context, tool_result)
+            return
+
+        # 并发模式：先发送所有工具调用事件，再按原始顺序收集结果
+        for tool_name, arguments, tool in calls:
+            if tool is not None:
+                yield StreamEvent.tool_call(tool_name, arguments)
+
+        workers = min(max_parallel_tools, len(calls))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(tool.execute, arguments, tool_timeout)
+                if tool
+                else None
+                for _, arguments, tool in calls
+            ]
+            for (tool_name, _, _), future in zip(calls, futures, strict=True):
+                if future is None:
+                    yield Runner._record_missing_tool(context, tool_name)
+                else:
+                    yield Runner._record_tool_result(context, future.result())
+
+    @staticmethod
+    async def _aexecute_tool_calls(
+        context: Context,
+        calls: list[tuple[str, dict[str, Any], Tool | None]],
+        max_parallel_tools: int,
+        tool_timeout: float | None = None,
+    ) -> AsyncGenerator[StreamEvent, None]:
+        """
+        _execute_tool_calls 的异步版本
+
+        异步工具直接在事件循环中 await，同步工具放到后台线程中执行
+        """
+        if max_parallel_tools <= 1 or len(calls) <= 1:
+            for tool_name, arguments, tool in calls:
+                if tool is None:
+                    yield Runner._record_missing_tool(context, tool_name)
+                    continue
+
+                yield StreamEvent.tool_call(tool_name, arguments)
+                tool_result = await tool.aexecute(arguments, tool_timeout)
+                yield Runner._record_tool_result(context, tool_result)
+            return
+
+        for tool_name, arguments, tool in calls:
+            if tool is not None:
+                yield StreamEvent.tool_call(tool_name, arguments)
+
+        semaphore = asyncio.Semaphore(max_parallel_tools)
+
+        async def execute(tool: Tool, arguments: dict[str, Any]) -> ToolResult:
+            async with semaphore:
+                return await tool.aexecute(arguments, tool_timeout)
+
+        tasks = [
+            asyncio.ensure_future(execute(tool, arguments)) if tool else None
+            for _, arguments, tool in calls
+        ]
+        try:
+            for (tool_name, _, _), task in zip(calls, tasks, strict=True):
+                if task is None:
+                    yield Runner._record_missing_tool(context, tool_name)
+                else:
+                    yield Runner._record_tool_result(context, await task)
+        finally:
+            for task in tasks:
+                if task is not None and not task.done():
+                    task.cancel()
+
+    @staticmethod
+    def _record_tool_result(
+        context: Context, tool_result: ToolResult
+    ) -> StreamEvent:
+        """将工具执行结果写入上下文，返回对应事件"""
+        if tool_result.success:
+            # 将工具调用和结果添加到上下文
+            context.add_tool_call(
+                tool_result.name, tool_result.arguments, tool_result.result
+            )
+            return StreamEvent.create_tool_result(
+                tool_result.name, tool_result.result
+            )
+
+        # 工具执行失败（包括超时），模型可以在下一轮中根据错误继续处理
+        error_msg = f"工具 {tool_result.name} 执行失败: {tool_result.error}"
+        context.add_message("system", error_msg)
+        return StreamEvent.tool_error(
+            tool_result.name, error_msg, tool_result.exception
+        )
+
+    @staticmethod
+    def _record_missing_tool(context: Context, tool_name: str) -> StreamEvent:
+        """记录找不到工具的错误"""
+        error_msg = f"找不到工具: {tool_name}"
+        context.add_message("system", error_msg)
+        return StreamEvent.create_error(error_msg)
+
+    @staticmethod
+    def _max_turns_exceeded(
+        context: Context, max_turns: int
+    ) -> tuple[StreamEvent, RunResult]:
+        """超过最大轮次"""
+        error_msg = f"达到最大执行轮次 ({max_turns})，可能存在无限循环"
+        return StreamEvent.create_error(error_msg), RunResult(
+            "", context, success=False, error=error_msg
+        )
+
+    @staticmethod
+    def _run_failed(
+        context: Context, error: Exception
+    ) -> tuple[StreamEvent, RunResult]:
+        """运行过程中出现异常"""
+        error_msg = f"运行过程中出现错误: {error!s}"
+        return StreamEvent.create_error(error_msg), RunResult(
+            "", context, success=False, error=error_msg
+        )
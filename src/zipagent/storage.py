@@ -0,0 +1,433 @@
+"""Storage - 对话上下文持久化模块
+
+提供 Context 的存储后端接口以及 SQLite 和追加式 JSONL 两种实现。
+Context 设置 store 后，消息会在写入时增量持久化，写入量只与新增消息数相关。
+每条消息按只增不减的序号存储，上下文窗口裁剪掉的消息只是移出上下文，
+历史记录不会被改写或删除。
+ContextManager 负责按 context_id 懒加载上下文，并从内存中淘汰空闲的上下文。
+
+使用示例:
+    from zipagent import Runner
+    from zipagent.storage import ContextManager, SQLiteContextStore
+
+    manager = ContextManager(SQLiteContextStore("chats.db"))
+
+    context = manager.get_or_create(session_id)
+    Runner.run(agent, "你好", context=context)
+
+    # 定期淘汰空闲上下文，下次访问时从数据库重新加载
+    manager.evict_idle()
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any
+
+from .context import Context, MessageLog, Usage
+from .exceptions import ContextError
+
+
+def _restore_context(
+    store: "ContextStore",
+    context_id: str,
+    rows: list[tuple[int, dict[str, Any]]],
+    next_seq: int,
+    meta_json: str | None,
+) -> Context:
+    """根据存储的数据（按序号排列的消息）重建 Context"""
+    context = Context(context_id=context_id)
+    context.messages = MessageLog(message for _, message in rows)
+    if meta_json:
+        meta = json.loads(meta_json)
+        context.created_at = datetime.fromisoformat(meta["created_at"])
+        context.last_agent = meta.get("last_agent")
+        context.turn_count = meta.get("turn_count", 0)
+        context.usage = Usage(*meta.get("usage", [0, 0, 0]))
+        context.data = meta.get("data", {})
+    context.store = store
+    context._mark_persisted([seq for seq, _ in rows], next_seq)
+    return context
+
+
+class ContextStore(ABC):
+    """上下文存储后端抽象基类"""
+
+    @abstractmethod
+    def write_messages(
+        self, context_id: str, rows: list[tuple[int, dict[str, Any]]]
+    ) -> None:
+        """
+        写入消息：序号不存在时追加，已存在时替换
+
+        Args:
+            context_id: 上下文 ID
+            rows: (序号, 消息) 列表，新消息的序号大于所有已存储的序号
+        """
+
+    @abstractmethod
+    def drop_messages(self, context_id: str, seqs: list[int]) -> None:
+        """
+        把消息移出上下文（被裁剪、删除或清空）
+
+        移出的消息不再被 load 加载，但历史记录仍保留在存储中。
+        """
+
+    @abstractmethod
+    def save_meta(self, context_id: str, meta_json: str) -> None:
+        """保存消息以外的上下文状态（JSON 文本）"""
+
+    @abstractmethod
+    def load(self, context_id: str) -> Context | None:
+        """加载上下文，不存在时返回 None"""
+
+    @abstractmethod
+    def delete(self, context_id: str) -> None:
+        """删除上下文"""
+
+    @abstractmethod
+    def list_context_ids(self) -> list[str]:
+        """列出所有已存储的上下文 ID"""
+
+    def close(self) -> None:  # noqa: B027
+        """释放存储资源（默认无需处理）"""
+
+
+class SQLiteContextStore(ContextStore):
+    """基于 SQLite 的上下文存储，每条消息一行，移出上下文的消息只做标记"""
+
+    def __init__(self, path: str = ":memory:"):
+        """
+        Args:
+            path: 数据库文件路径，默认使用内存数据库
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS contexts (
+                    context_id TEXT PRIMARY KEY,
+                    meta TEXT
+                );
+                CREATE TABLE IF NOT EXISTS messages (
+                    context_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    message TEXT NOT NULL,
+                    dropped INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (context_id, seq)
+                );
+                """
+            )
+            self._conn.commit()
+
+    def write_messages(
+        self, context_id: str, rows: list[tuple[int, dict[str, Any]]]
+    ) -> None:
+        params = [
+            (context_id, seq, json.dumps(message, ensure_ascii=False))
+            for seq, message in rows
+        ]
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO contexts (context_id) VALUES (?)",
+                    (context_id,),
+                )
+                self._conn.executemany(
+                    "INSERT INTO messages (context_id, seq, message) "
+                    "VALUES (?, ?, ?) "
+                    "ON CONFLICT(context_id, seq) "
+                    "DO UPDATE SET message = excluded.message",
+                    params,
+                )
+        except sqlite3.Error as e:
+            raise ContextError("写入上下文消息失败", original_error=e) from e
+
+    def drop_messages(self, context_id: str, seqs: list[int]) -> None:
+        try:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "UPDATE messages SET dropped = 1 "
+                    "WHERE context_id = ? AND seq = ?",
+                    [(context_id, seq) for seq in seqs],
+                )
+        except sqlite3.Error as e:
+            raise ContextError("移除上下文消息失败", original_error=e) from e
+
+    def save_meta(self, context_id: str, meta_json: str) -> None:
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT INTO contexts (context_id, meta) VALUES (?, ?) "
+                    "ON CONFLICT(context_id) "
+                    "DO UPDATE SET meta = excluded.meta",
+                    (context_id, meta_json),
+                )
+        except sqlite3.Error as e:
+            raise ContextError("保存上下文状态失败", original_error=e) from e
+
+    def load(self, context_id: str) -> Context | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT meta FROM contexts WHERE context_id = ?",
+                (context_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            message_rows = self._conn.execute(
+                "SELECT seq, message FROM messages "
+                "WHERE context_id = ? AND dropped = 0 ORDER BY seq",
+                (context_id,),
+            ).fetchall()
+            (next_seq,) = self._conn.execute(
+                "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages "
+                "WHERE context_id = ?",
+                (context_id,),
+            ).fetchone()
+
+        rows = [(seq, json.loads(message)) for seq, message in message_rows]
+        return _restore_context(self, context_id, rows, next_seq, row[0])
+
+    def delete(self, context_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM messages WHERE context_id = ?", (context_id,)
+            )
+            self._conn.execute(
+                "DELETE FROM contexts WHERE context_id = ?", (context_id,)
+            )
+
+    def list_context_ids(self) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT context_id FROM contexts ORDER BY context_id"
+            ).fetchall()
+        return [context_id for (context_id,) in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class JSONLContextStore(ContextStore):
+    """
+    追加式 JSONL 上下文存储，每个上下文一个文件
+
+    每次写入都只在文件末尾追加一条记录，加载时按顺序重放。
+    被替换或移出上下文的消息会在文件中留下历史记录，可以调用 compact 压缩。
+    """
+
+    _SAFE_ID = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory: 存放 JSONL 文件的目录，不存在时自动创建
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, context_id: str) -> str:
+        if not self._SAFE_ID.match(context_id) or context_id.startswith("."):
+            raise ContextError(f"无效的 context_id: {context_id!r}")
+        return os.path.join(self.directory, f"{context_id}.jsonl")
+
+    def _append(self, context_id: str, record: dict[str, Any]) -> None:
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        try:
+            with self._lock, open(self._path(context_id), "ab+") as f:
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        # 进程崩溃留下了不完整的最后一行，先换行，
+                        # 避免新记录和它拼接成一行
+                        line = b"\n" + line
+                f.write(line)
+        except OSError as e:
+            raise ContextError("写入上下文记录失败", original_error=e) from e
+
+    def write_messages(
+        self, context_id: str, rows: list[tuple[int, dict[str, Any]]]
+    ) -> None:
+        self._append(context_id, {"op": "messages", "rows": rows})
+
+    def drop_messages(self, context_id: str, seqs: list[int]) -> None:
+        self._append(context_id, {"op": "drop", "seqs": seqs})
+
+    def save_meta(self, context_id: str, meta_json: str) -> None:
+        self._append(context_id, {"op": "meta", "meta": meta_json})
+
+    def _replay(
+        self, context_id: str
+    ) -> tuple[list[tuple[int, dict[str, Any]]], int, str | None] | None:
+        """重放记录，返回 (按序号排列的消息, 下一个序号, 状态)"""
+        path = self._path(context_id)
+        if not os.path.exists(path):
+            return None
+
+        messages: dict[int, dict[str, Any]] = {}
+        next_seq = 0
+        meta_json = None
+        with self._lock, open(path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 进程崩溃可能留下不完整的一行，跳过它继续读取之后的记录
+                    continue
+                if record["op"] == "messages":
+                    for seq, message in record["rows"]:
+                        messages[seq] = message
+                        next_seq = max(next_seq, seq + 1)
+                elif record["op"] == "drop":
+                    for seq in record["seqs"]:
+                        messages.pop(seq, None)
+                elif record["op"] == "meta":
+                    meta_json = record["meta"]
+        return sorted(messages.items()), next_seq, meta_json
+
+    def load(self, context_id: str) -> Context | None:
+        replayed = self._replay(context_id)
+        if replayed is None:
+            return None
+        rows, next_seq, meta_json = replayed
+        return _restore_context(self, context_id, rows, next_seq, meta_json)
+
+    def compact(self, context_id: str) -> None:
+        """
+        把上下文的历史记录压缩为一条消息记录和一条状态记录
+
+        压缩后不再保留被替换或移出上下文的消息。
+        """
+        replayed = self._replay(context_id)
+        if replayed is None:
+            return
+        rows, _, meta_json = replayed
+
+        path = self._path(context_id)
+        records: list[dict[str, Any]] = [{"op": "messages", "rows": rows}]
+        if meta_json is not None:
+            records.append({"op": "meta", "meta": meta_json})
+        tmp_path = path + ".tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, path)
+
+    def delete(self, context_id: str) -> None:
+        path = self._path(context_id)
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def list_context_ids(self) -> list[str]:
+        return sorted(
+            name[: -len(".jsonl")]
+            for name in os.listdir(self.directory)
+            if name.endswith(".jsonl")
+        )
+
+
+class ContextManager:
+    """
+    上下文管理器：按 context_id 懒加载上下文，并淘汰空闲的上下文
+
+    由于消息在写入时已经持久化，淘汰只是释放内存，不会丢失数据。
+    """
+
+    def __init__(self, store: ContextStore, max_idle_seconds: float = 600):
+        """
+        Args:
+            store: 存储后端
+            max_idle_seconds: 超过该时长未访问的上下文会被 evict_idle 淘汰
+        """
+        self.store = store
+        self.max_idle_seconds = max_idle_seconds
+        self._contexts: dict[str, Context] = {}
+        self._last_access: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, context_id: str) -> Context | None:
+        """获取上下文，不在内存中时从存储加载"""
+        with self._lock:
+            context = self._contexts.get(context_id)
+            if context is None:
+                context = self.store.load(context_id)
+                if context is None:
+                    return None
+                self._contexts[context_id] = context
+            self._last_access[context_id] = time.monotonic()
+            return context
+
+    def create(self, context_id: str | None = None) -> Context:
+        """创建新的持久化上下文"""
+        context = Context(store=self.store)
+        if context_id is not None:
+            context.context_id = context_id
+        context.persist()
+        with self._lock:
+            self._contexts[context.context_id] = context
+            self._last_access[context.context_id] = time.monotonic()
+        return context
+
+    def get_or_create(self, context_id: str) -> Context:
+        """获取上下文，不存在时创建"""
+        return self.get(context_id) or self.create(context_id)
+
+    def evict(self, context_id: str) -> bool:
+        """从内存中移除上下文（存储中的数据保留）"""
+        with self._lock:
+            context = self._contexts.pop(context_id, None)
+            self._last_access.pop(context_id, None)
+        if context is None:
+            return False
+        context.persist()
+        return True
+
+    def evict_idle(self, max_idle_seconds: float | None = None) -> int:
+        """
+        淘汰空闲的上下文
+
+        Returns:
+            int: 被淘汰的上下文数量
+        """
+        idle_limit = (
+            self.max_idle_seconds
+            if max_idle_seconds is None
+            else max_idle_seconds
+        )
+        deadline = time.monotonic() - idle_limit
+        with self._lock:
+            idle_ids = [
+                context_id
+                for context_id, last_access in self._last_access.items()
+                if last_access <= deadline
+            ]
+        return sum(self.evict(context_id) for context_id in idle_ids)
+
+    def delete(self, context_id: str) -> None:
+        """从内存和存储中删除上下文"""
+        with self._lock:
+            self._contexts.pop(context_id, None)
+            self._last_access.pop(context_id, None)
+        self.store.delete(context_id)
+
+    def __len__(self) -> int:
+        """当前驻留在内存中的上下文数量"""
+        return len(self._contexts)
+
+    def __contains__(self, context_id: str) -> bool:
+        return context_id in self._contexts
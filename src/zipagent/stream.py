@@ -85,6 +85,28 @@ class StreamEvent:
         """创建错误事件"""
         return cls(type=StreamEventType.ERROR, error=error)
 
+    @classmethod
+    def tool_error(
+        cls, tool_name: str, error: str, exception: Exception | None = None
+    ) -> "StreamEvent":
+        """
+        创建工具执行失败事件
+
+        metadata 中包含异常类型和异常的 details（工具名、参数、超时时间等）
+        """
+        metadata = None
+        if exception is not None:
+            metadata = {
+                "error_type": type(exception).__name__,
+                **getattr(exception, "details", {}),
+            }
+        return cls(
+            type=StreamEventType.ERROR,
+            tool_name=tool_name,
+            error=error,
+            metadata=metadata,
+        )
+
     def __str__(self) -> str:
         """字符串表示"""
         if self.type == StreamEventType.QUESTION:
@@ -1,10 +1,51 @@
 """Tool - 工具系统模块"""
 
+import asyncio
 import inspect
+import json
+import threading
 from collections.abc import Callable
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from dataclasses import dataclass
 from typing import Any, get_type_hints
 
+from .cache import LRUCache
+from .exceptions import (
+    ConfigurationError,
+    ToolError,
+    ToolExecutionError,
+    ToolTimeoutError,
+)
+from .executor import (
+    DEFAULT_MAX_RESULT_BYTES,
+    get_background_loop,
+    get_process_pool,
+    is_importable,
+    run_in_thread,
+)
+
+EXECUTORS = ("thread", "process")
+
+_MISSING = object()
+
+# 任意工具组增删工具时递增。Agent 只在它变化时才逐个检查工具组的版本号，
+# 查找工具时无需遍历工具列表
+_tool_group_generation = 0
+_tool_group_lock = threading.Lock()
+
+
+def _tool_groups_changed() -> None:
+    """工具组内容变化后调用"""
+    global _tool_group_generation
+    with _tool_group_lock:
+        _tool_group_generation += 1
+
+
+def _tool_groups_generation() -> int:
+    """工具组变化计数的当前值"""
+    return _tool_group_generation
+
 
 @dataclass
 class ToolResult:
@@ -15,17 +56,61 @@ class ToolResult:
     result: Any
     success: bool = True
     error: str | None = None
+    timed_out: bool = False
+    exception: ToolError | None = None
+    cached: bool = False
 
 
 class Tool:
     """工具基类"""
 
     def __init__(
-        self, name: str, description: str, function: Callable[..., Any]
+        self,
+        name: str,
+        description: str,
+        function: Callable[..., Any],
+        executor: str = "thread",
+        max_result_bytes: int | None = DEFAULT_MAX_RESULT_BYTES,
+        timeout: float | None = None,
+        cache: LRUCache | None = None,
     ):
+        """
+        Args:
+            name: 工具名称
+            description: 工具描述
+            function: 工具函数，可以是 async def 定义的协程函数
+            executor: 执行方式，"thread" 在调用方线程中执行，
+                "process" 在共用进程池中执行（适合 CPU 密集型工具）
+            max_result_bytes: 进程模式下结果 pickle 后的大小上限，
+                None 表示不限制
+            timeout: 单次调用的超时时间（秒），None 表示不限制
+            cache: 结果缓存（可选），相同参数的成功结果直接从缓存返回。
+                同一个缓存可以在多个工具、多个 Agent 之间共享
+        """
+        if executor not in EXECUTORS:
+            raise ConfigurationError(
+                f"不支持的工具执行方式: {executor}", config_key="executor"
+            )
+        if executor == "process" and not is_importable(function):
+            raise ConfigurationError(
+                f"进程执行模式要求工具函数定义在模块顶层: "
+                f"{function.__qualname__}",
+                config_key="executor",
+            )
+        is_async = inspect.iscoroutinefunction(function)
+        if executor == "process" and is_async:
+            raise ConfigurationError(
+                f"异步工具不支持进程执行模式: {function.__qualname__}",
+                config_key="executor",
+            )
         self.name = name
         self.description = description
         self.function = function
+        self.is_async = is_async
+        self.executor = executor
+        self.max_result_bytes = max_result_bytes
+        self.timeout = timeout
+        self.cache = cache
         self.schema = self._generate_schema()
 
     def _generate_schema(self) -> dict[str, Any]:
@@ -73,24 +158,175 @@ class Tool:
             },
         }
 
-    def execute(self, arguments: dict[str, Any]) -> ToolResult:
-        """执行工具"""
+    def execute(
+        self, arguments: dict[str, Any], timeout: float | None = None
+    ) -> ToolResult:
+        """
+        执行工具
+
+        设置了超时时，工具在后台线程（或进程池）中执行；超时后不再等待，
+        线程被放弃并在结束后自行退出，返回 timed_out 的失败结果。
+        异步工具在共用的后台事件循环中执行，超时后任务会被取消。
+
+        Args:
+            arguments: 工具参数
+            timeout: 本次调用的超时时间（秒），与工具自身的 timeout 取较小值
+        """
+        cached = self._cached_result(arguments)
+        if cached is not None:
+            return cached
+
+        timeout = self._effective_timeout(timeout)
         try:
-            result = self.function(**arguments)
-            return ToolResult(
-                name=self.name,
-                arguments=arguments,
-                result=result,
-                success=True,
-            )
+            if timeout is None:
+                result = self._call(arguments)
+            else:
+                future = self._submit(arguments)
+                try:
+                    result = future.result(timeout)
+                except FutureTimeoutError:
+                    if future.done():
+                        raise
+                    future.cancel()
+                    raise ToolTimeoutError(
+                        self.name, arguments, timeout
+                    ) from None
         except Exception as e:
-            return ToolResult(
-                name=self.name,
-                arguments=arguments,
-                result=None,
-                success=False,
-                error=str(e),
+            return self._failure(arguments, e)
+        return self._success(arguments, result)
+
+    async def aexecute(
+        self, arguments: dict[str, Any], timeout: float | None = None
+    ) -> ToolResult:
+        """
+        异步执行工具（execute 的 asyncio 版本）
+
+        异步工具直接在当前事件循环中 await，超时或外层任务被取消时工具任务
+        随之取消；同步工具在后台线程中执行，超时后只取消等待，
+        不会阻塞在仍在运行的线程上。
+
+        Args:
+            arguments: 工具参数
+            timeout: 本次调用的超时时间（秒），与工具自身的 timeout 取较小值
+        """
+        cached = self._cached_result(arguments)
+        if cached is not None:
+            return cached
+
+        timeout = self._effective_timeout(timeout)
+        task: asyncio.Future | None = None
+        try:
+            if self.is_async:
+                # 异步工具直接在当前事件循环中执行
+                task = asyncio.ensure_future(self.function(**arguments))
+            else:
+                task = asyncio.wrap_future(self._submit(arguments))
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+            if not done:
+                raise ToolTimeoutError(self.name, arguments, timeout)
+            result = task.result()
+        except Exception as e:
+            return self._failure(arguments, e)
+        finally:
+            # 超时或外层被取消：异步工具的任务被取消，同步工具的线程被放弃
+            if task is not None and not task.done():
+                task.cancel()
+        return self._success(arguments, result)
+
+    def cache_key(self, arguments: dict[str, Any]) -> tuple[str, str]:
+        """缓存 key：工具名 + 参数的规范化 JSON（键排序、紧凑格式）"""
+        canonical = json.dumps(
+            arguments,
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":"),
+            default=str,
+        )
+        return self.name, canonical
+
+    def invalidate(self, arguments: dict[str, Any] | None = None) -> int:
+        """
+        清除缓存的结果
+
+        Args:
+            arguments: 要清除的参数，None 表示清除本工具的全部缓存
+
+        Returns:
+            int: 清除的条目数
+        """
+        if self.cache is None:
+            return 0
+        if arguments is not None:
+            return int(self.cache.invalidate(self.cache_key(arguments)))
+        return self.cache.invalidate_where(
+            lambda key: isinstance(key, tuple) and key[0] == self.name
+        )
+
+    def _cached_result(self, arguments: dict[str, Any]) -> ToolResult | None:
+        if self.cache is None:
+            return None
+        result = self.cache.get(self.cache_key(arguments), _MISSING)
+        if result is _MISSING:
+            return None
+        return ToolResult(
+            name=self.name,
+            arguments=arguments,
+            result=result,
+            success=True,
+            cached=True,
+        )
+
+    def _effective_timeout(self, timeout: float | None) -> float | None:
+        """工具自身超时与调用方超时取较小值"""
+        timeouts = [t for t in (self.timeout, timeout) if t is not None]
+        return min(timeouts) if timeouts else None
+
+    def _call(self, arguments: dict[str, Any]) -> Any:
+        """调用工具函数并返回原始结果，异常直接抛出"""
+        if self.is_async:
+            return get_background_loop().run(self.function(**arguments))
+        if self.executor == "process":
+            return get_process_pool().call(
+                self.function, arguments, self.max_result_bytes
             )
+        return self.function(**arguments)
+
+    def _submit(self, arguments: dict[str, Any]) -> Future:
+        """在后台执行工具函数，返回结果的 Future"""
+        if self.is_async:
+            return get_background_loop().submit(self.function(**arguments))
+        if self.executor == "process":
+            return get_process_pool().submit(
+                self.function, arguments, self.max_result_bytes
+            )
+        return run_in_thread(self._call, arguments, name=f"tool-{self.name}")
+
+    def _success(self, arguments: dict[str, Any], result: Any) -> ToolResult:
+        # 只缓存成功的结果
+        if self.cache is not None:
+            self.cache.set(self.cache_key(arguments), result)
+        return ToolResult(
+            name=self.name,
+            arguments=arguments,
+            result=result,
+            success=True,
+        )
+
+    def _failure(
+        self, arguments: dict[str, Any], error: Exception
+    ) -> ToolResult:
+        error_message = str(error)
+        if not isinstance(error, ToolError):
+            error = ToolExecutionError(self.name, arguments, error)
+        return ToolResult(
+            name=self.name,
+            arguments=arguments,
+            result=None,
+            success=False,
+            error=error_message,
+            timed_out=isinstance(error, ToolTimeoutError),
+            exception=error,
+        )
 
     def to_dict(self) -> dict[str, Any]:
         """转换为字典格式，用于API调用"""
@@ -102,6 +338,10 @@ def function_tool(
     *,
     name: str | None = None,
     description: str | None = None,
+    executor: str = "thread",
+    max_result_bytes: int | None = DEFAULT_MAX_RESULT_BYTES,
+    timeout: float | None = None,
+    cache: LRUCache | None = None,
 ) -> Callable[[Callable[..., Any]], Tool] | Tool:
     """
     将Python函数转换为Tool的装饰器
@@ -115,12 +355,40 @@ def function_tool(
     @function_tool(name="custom_name", description="Custom description")
     def my_func(x: int) -> str:
         return str(x)
+
+    CPU 密集型工具可以放到进程池中执行（函数需定义在模块顶层）:
+    @function_tool(executor="process")
+    def parse(text: str) -> dict:
+        ...
+
+    限制单次调用的执行时间:
+    @function_tool(timeout=10)
+    def fetch(url: str) -> str:
+        ...
+
+    异步工具（同步运行时在后台事件循环中执行）:
+    @function_tool
+    async def fetch_page(url: str) -> str:
+        ...
+
+    缓存相同参数的结果:
+    @function_tool(cache=LRUCache(maxsize=256, ttl=600))
+    def get_weather(city: str) -> str:
+        ...
     """
 
     def decorator(f: Callable[..., Any]) -> Tool:
         tool_name = name or f.__name__
         tool_description = description or f.__doc__ or f"Function {f.__name__}"
-        return Tool(tool_name, tool_description, f)
+        return Tool(
+            tool_name,
+            tool_description,
+            f,
+            executor,
+            max_result_bytes,
+            timeout,
+            cache,
+        )
 
     if func is None:
         # 带参数调用: @function_tool(name="xxx")
@@ -0,0 +1,65 @@
+"""测试用的本地 MCP 服务器（stdio）
+
+同时支持 mcp 1.x 的 FastMCP 和 mcp 2.x 的 MCPServer。
+"""
+
+import asyncio
+import os
+import sys
+
+from mcp.types import ToolAnnotations
+
+try:
+    from mcp.server.mcpserver import Image, MCPServer
+
+    LEGACY_SERVER = False
+except ImportError:  # mcp 1.x
+    from mcp.server.fastmcp import FastMCP as MCPServer
+    from mcp.server.fastmcp import Image
+
+    LEGACY_SERVER = True
+
+server = MCPServer("echo")
+
+
+@server.tool()
+def echo(message: str) -> str:
+    """回显消息"""
+    return message
+
+
+# 按协议字段名构造，兼容 1.x（camelCase）和 2.x（snake_case）的模型
+@server.tool(
+    annotations=ToolAnnotations.model_validate({"idempotentHint": True})
+)
+async def sleep(seconds: float) -> str:
+    """等待指定秒数"""
+    await asyncio.sleep(seconds)
+    return "ok"
+
+
+@server.tool()
+def pid() -> str:
+    """返回服务器进程的 pid"""
+    return str(os.getpid())
+
+
+@server.tool()
+def picture(size: int):
+    """返回一段说明文字和一张 size 字节的 PNG 图片"""
+    data = bytes(i % 251 for i in range(size))
+    return [f"picture of {size} bytes", Image(data=data, format="png")]
+
+
+if __name__ == "__main__":
+    # 用法: mcp_echo_server.py [stdio | streamable-http PORT | sse PORT]
+    if len(sys.argv) > 2:
+        port = int(sys.argv[2])
+        if LEGACY_SERVER:
+            # mcp 1.x 通过 settings 配置端口
+            server.settings.port = port
+            server.run(sys.argv[1])
+        else:
+            server.run(sys.argv[1], port=port)
+    else:
+        server.run()
@@ -1,8 +1,10 @@
 """Agent 模块测试"""
 
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
-from zipagent import Agent, Tool
+from zipagent import Agent, Tool, function_tool
+from zipagent.agent import _ToolList
+from zipagent.mcp_tool import MCPToolGroup
 from zipagent.model import OpenAIModel
 
 
@@ -88,3 +90,92 @@ class TestAgent:
         assert len(schemas) == 1
         assert schemas[0]["type"] == "function"
         assert schemas[0]["function"]["name"] == "test_function"
+
+    def test_tools_schema_reused_until_tools_change(
+        self, agent_with_tools: Agent, sample_tool: Tool
+    ) -> None:
+        """测试工具未变化时复用 schema，变化后版本号递增"""
+        schemas = agent_with_tools.get_tools_schema()
+        version = agent_with_tools.tools_version
+
+        assert agent_with_tools.get_tools_schema() is schemas
+        assert agent_with_tools.tools_version == version
+
+        @function_tool
+        def other_tool(x: int) -> int:
+            """另一个工具"""
+            return x
+
+        agent_with_tools.add_tool(other_tool)
+
+        assert agent_with_tools.tools_version > version
+        assert agent_with_tools.find_tool("other_tool") is other_tool
+        names = [
+            s["function"]["name"] for s in agent_with_tools.get_tools_schema()
+        ]
+        assert names == ["test_function", "other_tool"]
+
+    def test_index_follows_direct_list_mutation(
+        self, agent_with_tools: Agent
+    ) -> None:
+        """测试直接修改 tools 列表后索引同步更新"""
+        agent_with_tools.tools.clear()
+
+        assert agent_with_tools.find_tool("test_function") is None
+        assert agent_with_tools.get_tools_schema() == []
+
+        @function_tool
+        def replaced(x: int) -> int:
+            """替换后的工具"""
+            return x
+
+        agent_with_tools.tools = [replaced]
+
+        assert agent_with_tools.find_tool("replaced") is replaced
+
+    def test_lookup_does_not_scan_tools(
+        self, agent_with_tools: Agent, sample_tool: Tool
+    ) -> None:
+        """测试工具未变化时查找工具不遍历工具列表"""
+        group = MCPToolGroup("group", [])
+        agent_with_tools.add_tool(group)
+        version = agent_with_tools.tools_version
+        # 其他工具组的变化只触发版本号检查，不会重建索引
+        MCPToolGroup("other", []).add_tool(sample_tool)
+
+        with patch.object(
+            _ToolList, "__iter__", side_effect=AssertionError("遍历了工具列表")
+        ):
+            assert agent_with_tools.find_tool("test_function") is sample_tool
+            assert agent_with_tools.tools_version == version
+            assert len(agent_with_tools.get_tools_schema()) == 1
+
+    def test_index_follows_tool_group_mutation(
+        self, sample_agent: Agent, sample_tool: Tool
+    ) -> None:
+        """测试工具组增删工具后索引同步更新"""
+        group = MCPToolGroup("group", [])
+        sample_agent.add_tool(group)
+        assert sample_agent.find_tool("test_function") is None
+
+        group.add_tool(sample_tool)
+        assert sample_agent.find_tool("test_function") is sample_tool
+
+        assert sample_agent.remove_tool("test_function") is True
+        assert sample_agent.find_tool("test_function") is None
+        assert sample_agent.tools == []
+
+    def test_system_message_lists_new_tools(
+        self, agent_with_tools: Agent
+    ) -> None:
+        """测试系统消息缓存会随工具变化更新"""
+        agent_with_tools.get_system_message()
+
+        @function_tool
+        def late_tool() -> str:
+            """后加入的工具"""
+            return "ok"
+
+        agent_with_tools.add_tool(late_tool)
+
+        assert "late_tool" in agent_with_tools.get_system_message()["content"]
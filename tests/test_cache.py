@@ -0,0 +1,291 @@
+"""Cache 模块测试"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from zipagent import (
+    CachedModel,
+    Context,
+    LRUCache,
+    Model,
+    ModelResponse,
+    SingleFlightModel,
+)
+from zipagent.model import StreamDelta, Usage, _stream_error_response
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingModel(Model):
+    """记录调用次数的模型，流式输出两个增量"""
+
+    def __init__(self, fail: bool = False):
+        self.model_name = "gpt-test"
+        self.temperature = 0
+        self.max_tokens = None
+        self.fail = fail
+        self.calls = 0
+
+    def _response(self) -> ModelResponse:
+        return ModelResponse(
+            content="你好",
+            tool_calls=None,
+            usage=Usage(10, 2, 12),
+            finish_reason="stop",
+        )
+
+    def generate(self, messages, tools=None):
+        self.calls += 1
+        return self._response()
+
+    def generate_stream(self, messages, tools=None):
+        self.calls += 1
+        if self.fail:
+            yield from _stream_error_response(RuntimeError("失败"))
+            return
+        yield StreamDelta(content="你")
+        yield StreamDelta(content="好")
+        yield self._response()
+
+
+MESSAGES = [{"role": "user", "content": "问题"}]
+
+
+class TestLRUCache:
+    """LRUCache 测试"""
+
+    def test_evicts_least_recently_used(self) -> None:
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+
+        assert "b" not in cache
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_ttl_and_stats(self) -> None:
+        clock = FakeClock()
+        cache = LRUCache(maxsize=10, ttl=5, clock=clock)
+        cache.set("a", 1)
+
+        assert cache.get("a") == 1
+        clock.now = 6
+        assert cache.get("a") is None
+        assert cache.stats() == {"hits": 1, "misses": 1, "size": 0}
+
+    def test_invalidate(self) -> None:
+        cache = LRUCache()
+        cache.set("a", 1)
+
+        assert cache.invalidate("a") is True
+        assert cache.invalidate("a") is False
+        assert len(cache) == 0
+
+
+class TestCachedModel:
+    """CachedModel 测试"""
+
+    def test_generate_hits_cache(self) -> None:
+        inner = CountingModel()
+        model = CachedModel(inner)
+
+        first = model.generate(MESSAGES)
+        second = model.generate(list(MESSAGES))
+
+        assert inner.calls == 1
+        assert second.content == first.content
+        assert second.usage.total_tokens == 0
+
+    def test_stream_replays_recorded_deltas(self) -> None:
+        inner = CountingModel()
+        model = CachedModel(inner)
+
+        live = list(model.generate_stream(MESSAGES))
+        replay = list(model.generate_stream(MESSAGES))
+
+        assert inner.calls == 1
+        assert [type(i) for i in replay] == [type(i) for i in live]
+        assert [i.content for i in replay] == [i.content for i in live]
+
+    def test_fingerprint_covers_request(self) -> None:
+        inner = CountingModel()
+        model = CachedModel(inner)
+        base = model.fingerprint(MESSAGES)
+
+        assert model.fingerprint(MESSAGES, [{"type": "function"}]) != base
+        assert model.fingerprint([{"role": "user", "content": "别的"}]) != base
+        inner.temperature = 0.5
+        assert model.fingerprint(MESSAGES) != base
+
+    def test_request_messages_match_plain_list(self) -> None:
+        """上下文快照与普通列表的请求命中同一条缓存"""
+        inner = CountingModel()
+        model = CachedModel(inner)
+        context = Context()
+        context.add_message("user", "问题")
+
+        model.generate(context.get_messages_for_api())
+        model.generate(MESSAGES)
+
+        assert inner.calls == 1
+
+    def test_errors_are_not_cached(self) -> None:
+        inner = CountingModel(fail=True)
+        model = CachedModel(inner)
+
+        list(model.generate_stream(MESSAGES))
+        list(model.generate_stream(MESSAGES))
+
+        assert inner.calls == 2
+
+    def test_disk_tier_shared_between_instances(self, tmp_path) -> None:
+        first_inner = CountingModel()
+        list(
+            CachedModel(first_inner, disk_path=str(tmp_path)).generate_stream(
+                MESSAGES
+            )
+        )
+
+        second_inner = CountingModel()
+        second = CachedModel(second_inner, disk_path=str(tmp_path))
+        replay = list(second.generate_stream(MESSAGES))
+
+        assert second_inner.calls == 0
+        assert second.disk_hits == 1
+        assert [i.content for i in replay] == ["你", "好", "你好"]
+
+    def test_stream_after_generate_records_real_deltas(self) -> None:
+        """generate() 写入的条目不会被当作单个增量重放"""
+        inner = CountingModel()
+        model = CachedModel(inner)
+
+        model.generate(MESSAGES)
+        live = list(model.generate_stream(MESSAGES))
+        replay = list(model.generate_stream(MESSAGES))
+
+        assert inner.calls == 2
+        assert [i.content for i in replay] == [i.content for i in live]
+        assert [i.content for i in replay] == ["你", "好", "你好"]
+
+    def test_disk_tier_is_bounded(self, tmp_path) -> None:
+        inner = CountingModel()
+        model = CachedModel(inner, disk_path=str(tmp_path), disk_maxsize=2)
+
+        for i in range(5):
+            model.generate([{"role": "user", "content": f"问题{i}"}])
+
+        assert len(list(tmp_path.glob("*.json"))) == 2
+
+
+class TestSingleFlightModel:
+    """SingleFlightModel 测试"""
+
+    @staticmethod
+    def gated_model(gate: threading.Event) -> CountingModel:
+        class GatedModel(CountingModel):
+            def generate(self, messages, tools=None):
+                gate.wait(5)
+                return super().generate(messages, tools)
+
+            def generate_stream(self, messages, tools=None):
+                self.calls += 1
+                yield StreamDelta(content="你")
+                gate.wait(5)
+                yield StreamDelta(content="好")
+                yield self._response()
+
+        return GatedModel()
+
+    def test_concurrent_streams_share_upstream(self) -> None:
+        gate = threading.Event()
+        inner = self.gated_model(gate)
+        model = SingleFlightModel(inner)
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            futures = [
+                pool.submit(lambda: list(model.generate_stream(MESSAGES)))
+                for _ in range(5)
+            ]
+            while model.coalesced_requests < 4:
+                time.sleep(0.01)
+            gate.set()
+            results = [f.result() for f in futures]
+
+        assert inner.calls == 1
+        assert model.upstream_requests == 1
+        for items in results:
+            assert [i.content for i in items] == ["你", "好", "你好"]
+        # 每个订阅者拿到独立的响应对象
+        assert results[0][-1] is not results[1][-1]
+
+    def test_concurrent_generate_share_upstream(self) -> None:
+        gate = threading.Event()
+        inner = self.gated_model(gate)
+        model = SingleFlightModel(inner)
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(model.generate, MESSAGES) for _ in range(3)]
+            while model.coalesced_requests < 2:
+                time.sleep(0.01)
+            gate.set()
+            responses = [f.result() for f in futures]
+
+        assert inner.calls == 1
+        assert {r.content for r in responses} == {"你好"}
+
+    def test_sequential_requests_not_coalesced(self) -> None:
+        inner = CountingModel()
+        model = SingleFlightModel(inner)
+
+        list(model.generate_stream(MESSAGES))
+        list(model.generate_stream(MESSAGES))
+
+        assert inner.calls == 2
+        assert model.coalesced_requests == 0
+
+    def test_upstream_error_reaches_subscribers(self) -> None:
+        model = SingleFlightModel(CountingModel(fail=True))
+
+        items = list(model.generate_stream(MESSAGES))
+
+        assert items[-1].finish_reason == "error"
+
+    def test_late_caller_after_abandon_starts_new_flight(self) -> None:
+        """上游请求被放弃后才加入的调用方会发起新的请求"""
+        gate = threading.Event()
+        landing = threading.Event()
+        proceed = threading.Event()
+
+        class SlowLanding(SingleFlightModel):
+            def _land(self, key, flight):
+                # 拉长放弃请求到通知订阅者之间的窗口
+                if not landing.is_set():
+                    landing.set()
+                    proceed.wait(5)
+                super()._land(key, flight)
+
+        inner = self.gated_model(gate)
+        model = SlowLanding(inner)
+        first = model.generate_stream(MESSAGES)
+        assert next(first).content == "你"
+        first.close()
+        gate.set()
+        assert landing.wait(5)
+
+        try:
+            late = list(model.generate_stream(MESSAGES))
+        finally:
+            proceed.set()
+
+        assert isinstance(late[-1], ModelResponse)
+        assert late[-1].content == "你好"
+        assert model.upstream_requests == 2
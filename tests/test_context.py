@@ -3,7 +3,7 @@
 from datetime import datetime
 
 from zipagent import Context
-from zipagent.context import Usage
+from zipagent.context import MessageLog, Usage
 
 
 class TestUsage:
@@ -219,6 +219,34 @@ class TestContext:
         assert original.data["nested"]["key"] == "value"
         assert cloned.data["nested"]["key"] == "modified"
 
+    def test_clone_copies_data_lazily(self) -> None:
+        """测试 data 在克隆时不复制，只复制被写入的字典和被取出的可变值"""
+        copies = []
+
+        class Tracked:
+            def __deepcopy__(self, memo):
+                copies.append(self)
+                return Tracked()
+
+        original = Context()
+        original.set_data("value", Tracked())
+        original.set_data("name", "原始")
+
+        first = original.clone()
+        second = original.clone()
+        first.data["extra"] = 1
+        assert first.get_data("name") == "原始"
+        assert "extra" not in original.data
+        assert "extra" not in second.data
+        assert first.data != second.data
+        assert copies == []
+
+        # 取出的可变值可能被原地修改，只复制这一个值
+        tracked = first.get_data("value")
+        assert len(copies) == 1
+        assert first.get_data("value") is tracked
+        assert second.get_data("value") is not tracked
+
     def test_clone_usage_independence(self) -> None:
         """测试克隆后 Usage 统计的独立性"""
         original = Context()
@@ -280,3 +308,149 @@ class TestContext:
         assert cloned.turn_count == 5
         assert cloned.context_id == original.context_id
         assert cloned.created_at == original.created_at
+
+    def test_clone_shares_messages(self) -> None:
+        """测试克隆共享消息而不复制"""
+        original = Context()
+        for i in range(5):
+            original.add_message("user", f"消息{i}")
+
+        cloned = original.clone()
+
+        assert all(
+            a is b
+            for a, b in zip(cloned.messages, original.messages, strict=True)
+        )
+        assert cloned.messages == original.messages
+
+    def test_clone_isolation_after_fork(self) -> None:
+        """测试克隆双方的修改互不影响"""
+        original = Context()
+        for i in range(3):
+            original.add_message("user", f"消息{i}")
+        cloned = original.clone()
+
+        original.add_message("assistant", "原始回复")
+        cloned.messages[0] = {"role": "system", "content": "替换"}
+        cloned.messages.pop()
+
+        assert [m["content"] for m in original.messages] == [
+            "消息0",
+            "消息1",
+            "消息2",
+            "原始回复",
+        ]
+        assert [m["content"] for m in cloned.messages] == ["替换", "消息1"]
+
+    def test_repeated_clone(self) -> None:
+        """测试多次克隆后各自追加"""
+        context = Context()
+        context.add_message("user", "根")
+        clones = []
+        for i in range(3):
+            clone = context.clone()
+            clone.add_message("assistant", f"分支{i}")
+            clones.append(clone)
+            context.add_message("user", f"主线{i}")
+
+        assert len(context.messages) == 4
+        assert [len(c.messages) for c in clones] == [2, 3, 4]
+        assert clones[2].messages[-1]["content"] == "分支2"
+        assert clones[2].messages[-2]["content"] == "主线1"
+
+
+class TestMessageLog:
+    """MessageLog 测试"""
+
+    def build(self, count: int) -> MessageLog:
+        return MessageLog({"content": i} for i in range(count))
+
+    def contents(self, log: MessageLog) -> list:
+        return [m["content"] for m in log]
+
+    def test_list_behaviour(self) -> None:
+        log = self.build(5)
+
+        assert len(log) == 5
+        assert log[-1] == {"content": 4}
+        assert log[1:3] == [{"content": 1}, {"content": 2}]
+        assert log.copy() == list(log)
+        assert log == list(log)
+
+    def test_fork_then_mutate_shared_prefix(self) -> None:
+        log = self.build(4)
+        fork = log.fork()
+        fork.append({"content": 4})
+        shared = fork.fork()
+
+        del fork[1:3]
+        fork.insert(0, {"content": "head"})
+        shared[-1] = {"content": "last"}
+
+        assert self.contents(log) == [0, 1, 2, 3]
+        assert self.contents(fork) == ["head", 0, 3, 4]
+        assert self.contents(shared) == [0, 1, 2, 3, "last"]
+
+    def test_pop_shared_tail_and_fork_again(self) -> None:
+        log = self.build(3)
+        fork = log.fork()
+
+        fork.pop()
+        again = fork.fork()
+        again.append({"content": "new"})
+
+        assert self.contents(log) == [0, 1, 2]
+        assert self.contents(fork) == [0, 1]
+        assert self.contents(again) == [0, 1, "new"]
+
+    def test_slice_assignment_and_clear(self) -> None:
+        log = self.build(4)
+        fork = log.fork()
+
+        fork[::2] = [{"content": "a"}, {"content": "b"}]
+        log.clear()
+
+        assert self.contents(fork) == ["a", 1, "b", 3]
+        assert len(log) == 0
+
+
+class TestMessageEncoder:
+    """MessageEncoder 测试"""
+
+    def test_encodes_only_new_messages(self, monkeypatch) -> None:
+        import json
+
+        from zipagent import context as context_module
+
+        calls = []
+        real_dumps = json.dumps
+
+        def counting_dumps(obj, **kwargs):
+            calls.append(obj)
+            return real_dumps(obj, **kwargs)
+
+        context = Context()
+        context.add_message("user", "问题")
+        context.add_message("assistant", "回答")
+        monkeypatch.setattr(context_module.json, "dumps", counting_dumps)
+
+        first = context.get_messages_for_api().to_json()
+        assert json.loads(first) == list(context.messages)
+        assert len(calls) == 2
+
+        context.add_message("user", "追问")
+        context.messages[0] = {"role": "user", "content": "替换"}
+        second = context.get_messages_for_api().to_json()
+
+        assert json.loads(second) == list(context.messages)
+        assert len(calls) == 4
+
+    def test_snapshot_is_independent_list(self) -> None:
+        context = Context()
+        context.add_message("user", "问题")
+
+        snapshot = context.get_messages_for_api()
+        context.add_message("assistant", "回答")
+
+        assert isinstance(snapshot, list)
+        assert len(snapshot) == 1
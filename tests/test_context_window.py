@@ -0,0 +1,209 @@
+"""ContextWindow 模块测试"""
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from zipagent import (
+    Agent,
+    Context,
+    ContextWindow,
+    DropOldestTurns,
+    ModelResponse,
+    Runner,
+    TokenLimitError,
+    TruncateToolOutputs,
+)
+from zipagent.context_window import estimate_message_tokens, estimate_tokens
+from zipagent.model import Usage
+
+
+def build_context(turns: int, answer: str = "回答" * 50) -> Context:
+    """构造包含多轮对话的上下文"""
+    context = Context()
+    context.add_message("system", "系统提示")
+    for i in range(turns):
+        context.add_message("user", f"问题{i}")
+        context.add_message("assistant", answer)
+    return context
+
+
+def window_size(context: Context) -> int:
+    """不裁剪时上下文的 token 估算值"""
+    return ContextWindow(max_tokens=0).count_tokens(context)
+
+
+class TestEstimateTokens:
+    """token 估算测试"""
+
+    def test_empty(self) -> None:
+        assert estimate_tokens("") == 0
+        assert estimate_tokens(None) == 0
+
+    def test_ascii_and_cjk(self) -> None:
+        assert estimate_tokens("abcdefgh") == 2
+        assert estimate_tokens("你好世界") == 4
+        assert estimate_tokens("你好abcd") == 3
+
+    def test_message_with_tool_calls(self) -> None:
+        message = {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {"function": {"name": "add", "arguments": '{"a": 1}'}}
+            ],
+        }
+        assert estimate_message_tokens(message) > 8
+
+
+class TestContextWindow:
+    """ContextWindow 测试"""
+
+    def test_message_tokens_cached(self) -> None:
+        """测试只估算新增或被替换的消息"""
+        calls = []
+
+        def estimator(message):
+            calls.append(message)
+            return 10
+
+        window = ContextWindow(max_tokens=1000, estimator=estimator)
+        context = build_context(2)
+
+        assert window.count_tokens(context) == 50
+        assert len(calls) == 5
+
+        context.add_message("user", "新问题")
+        assert window.count_tokens(context) == 60
+        assert len(calls) == 6
+
+        context.add_tool_call("echo", {"x": 1}, "结果")
+        window.count_tokens(context)
+        assert len(calls) == 8
+
+    def test_fit_within_budget_keeps_messages(self) -> None:
+        window = ContextWindow(max_tokens=10_000)
+        context = build_context(3)
+
+        window.fit(context)
+
+        assert len(context.messages) == 7
+
+    def test_drop_oldest_turns(self) -> None:
+        """测试删除最早的轮次，保留系统消息和当前轮次"""
+        context = build_context(5)
+        context.add_message("user", "当前问题")
+        per_turn = sum(
+            estimate_message_tokens(m) for m in context.messages[1:3]
+        )
+        window = ContextWindow(
+            max_tokens=per_turn * 2 + 30, strategies=[DropOldestTurns()]
+        )
+
+        total = window.fit(context)
+
+        assert total <= window.max_tokens
+        assert context.messages[0]["content"] == "系统提示"
+        assert context.messages[1]["content"] == "问题3"
+        assert context.messages[-1]["content"] == "当前问题"
+
+    def test_drop_keeps_tool_pairs_atomic(self) -> None:
+        """测试工具调用与工具结果一起被删除"""
+        context = Context()
+        context.add_message("system", "系统提示")
+        context.add_message("user", "旧问题")
+        context.add_message("assistant", "思考" * 100)
+        context.add_tool_call("echo", {"x": 1}, "结果" * 100)
+        context.add_message("assistant", "旧回答")
+        context.add_message("user", "新问题")
+
+        window = ContextWindow(max_tokens=50, strategies=[DropOldestTurns()])
+        window.fit(context)
+
+        roles = [m["role"] for m in context.messages]
+        assert roles == ["system", "user"]
+
+    def test_truncate_tool_outputs(self) -> None:
+        context = Context()
+        context.add_message("user", "查询")
+        context.add_tool_call("search", {}, "x" * 4000)
+
+        window = ContextWindow(
+            max_tokens=300,
+            strategies=[TruncateToolOutputs(max_tokens_per_output=100)],
+        )
+        window.fit(context)
+
+        tool_message = context.messages[-1]
+        assert tool_message["role"] == "tool"
+        assert tool_message["content"].endswith("[内容已截断]")
+        assert estimate_message_tokens(tool_message) <= 100
+
+    def test_tools_schema_counts_against_budget(self) -> None:
+        context = build_context(1)
+        window = ContextWindow(max_tokens=window_size(context) + 5)
+        tools = [{"type": "function", "function": {"name": "x" * 400}}]
+
+        with pytest.raises(TokenLimitError):
+            window.fit(context, tools)
+
+    def test_raises_when_cannot_fit(self) -> None:
+        context = Context()
+        context.add_message("user", "很长的问题" * 100)
+        window = ContextWindow(max_tokens=20)
+
+        with pytest.raises(TokenLimitError) as exc_info:
+            window.fit(context)
+
+        assert exc_info.value.details["max_tokens"] == 20
+
+
+class TestRunnerIntegration:
+    """Runner 集成测试"""
+
+    def test_runner_trims_before_model_call(self) -> None:
+        context = build_context(10)
+        sent_messages = []
+
+        def generate_stream(messages, tools=None):
+            sent_messages.append(messages)
+            yield ModelResponse(
+                content="好的",
+                tool_calls=None,
+                usage=Usage(),
+                finish_reason="stop",
+            )
+
+        mock_model = MagicMock()
+        mock_model.generate_stream.side_effect = generate_stream
+        agent = Agent(
+            name="TestAgent",
+            instructions="测试",
+            model=mock_model,
+            context_window=ContextWindow(max_tokens=200),
+        )
+
+        result = Runner.run(
+            agent, "新问题", context=context, stream_callback=lambda e: None
+        )
+
+        assert result.success is True
+        assert len(sent_messages[0]) < 22
+        assert sent_messages[0][0]["role"] == "system"
+        assert sent_messages[0][-1]["content"] == "新问题"
+
+    def test_runner_reports_token_limit(self) -> None:
+        mock_model = MagicMock()
+        agent = Agent(
+            name="TestAgent",
+            instructions="测试",
+            model=mock_model,
+            use_system_prompt=False,
+            context_window=ContextWindow(max_tokens=5),
+        )
+
+        result = Runner.run(agent, "问题" * 50, stream_callback=lambda e: None)
+
+        assert result.success is False
+        assert "Token" in result.error
+        mock_model.generate_stream.assert_not_called()
@@ -4,21 +4,68 @@ MCP 工具集成测试
 测试 MCP 工具的集成功能，包括工具组、工具池等。
 """
 
+import asyncio
+import gc
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
 from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
 
-from zipagent import Agent, function_tool
+from zipagent import Agent, Context, function_tool
+from zipagent.executor import get_background_loop
 from zipagent.mcp_tool import (
     MCPClient,
+    MCPCommunicationError,
+    MCPContentPart,
     MCPError,
     MCPNotAvailableError,
+    MCPReplicaSet,
     MCPServerConfig,
     MCPTool,
     MCPToolGroup,
+    MCPToolResult,
+    _binary_part,
     _MCPToolPool,  # 现在是内部类
+    http_pool_stats,
 )
 
+try:
+    import mcp.server.fastmcp
+
+    MCP_SERVER_AVAILABLE = True
+except ImportError:
+    try:
+        import mcp.server.mcpserver  # noqa: F401
+
+        MCP_SERVER_AVAILABLE = True
+    except ImportError:
+        MCP_SERVER_AVAILABLE = False
+
+ECHO_SERVER = os.path.join(os.path.dirname(__file__), "mcp_echo_server.py")
+
+requires_mcp_server = pytest.mark.skipif(
+    not MCP_SERVER_AVAILABLE, reason="需要 mcp 的 FastMCP 或 MCPServer"
+)
+
+
+@pytest.fixture(scope="module")
+def echo_group():
+    """连接本地 echo MCP 服务器，模块内的测试共用"""
+    pool = _MCPToolPool()
+    loop = get_background_loop()
+    group = loop.run(
+        pool.add_mcp_server("echo", command=sys.executable, args=[ECHO_SERVER])
+    )
+    yield group
+    loop.run(pool.close_all())
+
 
 class TestMCPToolGroup:
     """测试 MCPToolGroup 类"""
@@ -87,6 +134,41 @@ class TestMCPToolGroup:
         assert group.find_tool("tool_1") == mock_tools[1]
         assert group.find_tool("nonexistent") is None
 
+    def test_add_and_remove_tool(self):
+        """测试工具组增删工具并更新版本号"""
+        group = MCPToolGroup("test", [])
+        tool = Mock(spec=MCPTool)
+        tool.name = "tool_0"
+
+        group.add_tool(tool)
+        assert group.find_tool("tool_0") is tool
+        assert group.version == 1
+
+        assert group.remove_tool("tool_0") is True
+        assert group.remove_tool("tool_0") is False
+        assert len(group) == 0
+        assert group.version == 2
+
+    def test_replace_tools_publishes_new_list(self):
+        """测试整体替换工具时不修改读者手中的旧列表"""
+        old_tools = []
+        for i in range(2):
+            tool = Mock(spec=MCPTool)
+            tool.name = f"tool_{i}"
+            old_tools.append(tool)
+        group = MCPToolGroup("test", old_tools)
+        snapshot = group.tools
+
+        new_tool = Mock(spec=MCPTool)
+        new_tool.name = "tool_2"
+        group.replace_tools([old_tools[0], new_tool])
+
+        assert snapshot == old_tools
+        assert group.tools is not snapshot
+        assert group.find_tool("tool_1") is None
+        assert group.find_tool("tool_2") is new_tool
+        assert group.version == 1
+
 
 class TestMCPToolPool:
     """测试 _MCPToolPool 类（内部实现）"""
@@ -290,6 +372,740 @@ class TestMCPServerConfig:
         assert config.tools is None
 
 
+@requires_mcp_server
+class TestBackgroundLoopSession:
+    """测试 MCP 会话运行在常驻的后台事件循环中"""
+
+    def test_sync_calls_reuse_session(self, echo_group):
+        client = echo_group["echo"].mcp_client
+        session = client.session
+
+        with patch(
+            "asyncio.run", side_effect=AssertionError("不应创建新循环")
+        ):
+            results = [
+                echo_group["echo"].execute({"message": str(i)})
+                for i in range(5)
+            ]
+
+        assert [r.result for r in results] == ["0", "1", "2", "3", "4"]
+        assert client.session is session
+
+    def test_calls_from_many_threads(self, echo_group):
+        results = {}
+
+        def call(i):
+            results[i] = echo_group["echo"].execute({"message": str(i)})
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert {i: r.result for i, r in results.items()} == {
+            i: str(i) for i in range(8)
+        }
+
+    @pytest.mark.asyncio
+    async def test_async_calls_share_session(self, echo_group):
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(echo_group["sleep"].aexecute({"seconds": 0.2}) for _ in range(5))
+        )
+
+        assert time.perf_counter() - start < 0.8  # 串行需要 1 秒
+        assert [r.result for r in results] == ["ok"] * 5
+
+    @pytest.mark.asyncio
+    async def test_timeout_keeps_session(self, echo_group):
+        result = await echo_group["sleep"].aexecute(
+            {"seconds": 2}, timeout=0.05
+        )
+
+        assert result.timed_out is True
+        assert echo_group["echo"].execute({"message": "仍然可用"}).success
+
+
+@requires_mcp_server
+class TestConcurrentRequests:
+    """测试同一会话上的并发请求"""
+
+    @pytest.mark.asyncio
+    async def test_requests_multiplexed_over_one_session(self, echo_group):
+        client = echo_group["sleep"].mcp_client
+        calls_before = client.stats()["calls"]
+
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(echo_group["sleep"].aexecute({"seconds": 0.2}) for _ in range(8))
+        )
+
+        assert time.perf_counter() - start < 0.8
+        stats = client.stats()
+        assert stats["calls"] == calls_before + 8
+        assert stats["peak_in_flight"] >= 2
+        assert stats["in_flight"] == 0 and stats["queued"] == 0
+        assert stats["latency_p95"] >= 0.2
+
+    @pytest.mark.asyncio
+    async def test_in_flight_limit(self):
+        pool = _MCPToolPool()
+        group = await pool.add_mcp_server(
+            "limited",
+            command=sys.executable,
+            args=[ECHO_SERVER],
+            tools=["sleep"],
+            max_in_flight=2,
+        )
+        try:
+            start = time.perf_counter()
+            await asyncio.gather(
+                *(group["sleep"].aexecute({"seconds": 0.2}) for _ in range(6))
+            )
+            elapsed = time.perf_counter() - start
+
+            stats = pool.stats()["limited"]
+            assert elapsed >= 0.55  # 每次最多 2 个请求，共 3 批
+            assert stats["peak_in_flight"] == 2
+            assert stats["max_in_flight"] == 2
+        finally:
+            await pool.close_all()
+
+    @pytest.mark.asyncio
+    async def test_errors_counted(self, echo_group):
+        client = echo_group["echo"].mcp_client
+        errors_before = client.stats()["errors"]
+
+        await client.call_tool("missing_tool", {})
+
+        assert client.stats()["errors"] == errors_before + 1
+
+
+@requires_mcp_server
+class TestReplicas:
+    """测试同一服务器配置的多副本"""
+
+    @pytest.mark.asyncio
+    async def test_least_busy_dispatch_restart_and_drain(self):
+        pool = _MCPToolPool()
+        group = await pool.add_mcp_server(
+            "replicas", command=sys.executable, args=[ECHO_SERVER], replicas=2
+        )
+        replica_set = group["echo"].mcp_client
+        assert isinstance(replica_set, MCPReplicaSet)
+        first, second = replica_set.replicas
+        try:
+            # 负载最低的副本优先：一个副本忙时请求都交给另一个
+            busy = asyncio.ensure_future(
+                group["sleep"].aexecute({"seconds": 0.5})
+            )
+            while not (first.load or second.load):
+                await asyncio.sleep(0.01)
+            idle = second if first.load else first
+            pids = {(await group["pid"].aexecute({})).result for _ in range(3)}
+            assert pids == {await idle.call_tool("pid", {})}
+            assert (await busy).success
+
+            # 副本崩溃后请求转到存活的副本，崩溃的副本在后台重启
+            crashed_pid = int(await first.call_tool("pid", {}))
+            os.kill(crashed_pid, signal.SIGKILL)
+            with pytest.raises(MCPCommunicationError):
+                while True:
+                    await first.call_tool("echo", {"message": "x"})
+            assert not first.is_connected
+            assert (await group["echo"].aexecute({"message": "ok"})).success
+            for _ in range(500):
+                if first.is_connected:
+                    break
+                await asyncio.sleep(0.01)
+            assert int(await first.call_tool("pid", {})) != crashed_pid
+            assert replica_set.stats()["restarts"] == 1
+            assert replica_set.stats()["live"] == 2
+
+            # 关闭时等待进行中的调用完成，之后的调用被拒绝
+            slow = asyncio.ensure_future(
+                group["sleep"].aexecute({"seconds": 0.3})
+            )
+            while not replica_set.stats()["in_flight"]:
+                await asyncio.sleep(0.01)
+            closing = asyncio.ensure_future(pool.remove_server("replicas"))
+            await asyncio.sleep(0.05)
+            rejected = await group["echo"].aexecute({"message": "late"})
+            assert rejected.success is False
+            assert (await slow).result == "ok"
+            await closing
+        finally:
+            await pool.close_all()
+
+    def test_rejects_invalid_replica_count(self):
+        with pytest.raises(MCPError):
+            MCPReplicaSet(MCPServerConfig(name="x", command="echo"), 0)
+
+
+@requires_mcp_server
+class TestConnectMany:
+    """测试并发连接和工具列表缓存"""
+
+    @pytest.mark.asyncio
+    async def test_connect_many(self):
+        try:
+            first, second = await MCPTool.connect_many(
+                [
+                    {"command": sys.executable, "args": [ECHO_SERVER]},
+                    {
+                        "command": sys.executable,
+                        "args": [ECHO_SERVER],
+                        "tools": ["echo"],
+                        "name": "echo_only",
+                    },
+                ]
+            )
+            assert "sleep" in first.get_tool_names()
+            assert second.name == "echo_only"
+            assert second.get_tool_names() == ["echo"]
+            result = await second["echo"].aexecute({"message": "hi"})
+            assert result.result == "hi"
+        finally:
+            await MCPTool.disconnect_all()
+
+    @pytest.mark.asyncio
+    async def test_connect_many_rolls_back_on_failure(self):
+        with pytest.raises(MCPError):
+            await MCPTool.connect_many(
+                [
+                    {"command": sys.executable, "args": [ECHO_SERVER]},
+                    {"command": "/nonexistent/mcp-server"},
+                ]
+            )
+        assert MCPTool.list_connections() == []
+
+    @pytest.mark.asyncio
+    async def test_cached_tool_list(self, tmp_path):
+        cache_dir = str(tmp_path)
+        pool = _MCPToolPool()
+        try:
+            await pool.add_mcp_server(
+                "first",
+                command=sys.executable,
+                args=[ECHO_SERVER],
+                cache_dir=cache_dir,
+            )
+            assert len(os.listdir(cache_dir)) == 1
+
+            # 缓存命中：工具组立即可用，握手在后台进行
+            group = await pool.add_mcp_server(
+                "second",
+                command=sys.executable,
+                args=[ECHO_SERVER],
+                tools=["echo"],
+                cache_dir=cache_dir,
+            )
+            assert group.get_tool_names() == ["echo"]
+            assert group["echo"].schema["function"]["parameters"]
+            # 握手完成前的调用等待连接建立
+            result = await group["echo"].aexecute({"message": "early"})
+            assert result.result == "early"
+            await pool.wait_ready("second")
+            assert group.version == 0
+        finally:
+            await pool.close_all()
+
+    @pytest.mark.asyncio
+    async def test_stale_cache_refreshed(self, tmp_path):
+        cache_dir = str(tmp_path)
+        pool = _MCPToolPool()
+        try:
+            first = await pool.add_mcp_server(
+                "first",
+                command=sys.executable,
+                args=[ECHO_SERVER],
+                version="1",
+                cache_dir=cache_dir,
+            )
+            # 伪造过期的缓存：多一个已不存在的工具，echo 的 schema 也不同
+            (cache_file,) = tmp_path.iterdir()
+            data = json.loads(cache_file.read_text(encoding="utf-8"))
+            data["tools"] = [
+                {"name": "echo", "description": "old", "inputSchema": {}},
+                {"name": "removed", "description": "", "inputSchema": {}},
+            ]
+            cache_file.write_text(json.dumps(data), encoding="utf-8")
+
+            group = await pool.add_mcp_server(
+                "second",
+                command=sys.executable,
+                args=[ECHO_SERVER],
+                version="1",
+                cache_dir=cache_dir,
+            )
+            assert group.get_tool_names() == ["echo", "removed"]
+
+            await pool.wait_ready("second")
+            assert "removed" not in group.get_tool_names()
+            assert set(group.get_tool_names()) == set(first.get_tool_names())
+            assert group["echo"].description != "old"
+            assert group.version > 0
+            refreshed = json.loads(cache_file.read_text(encoding="utf-8"))
+            assert len(refreshed["tools"]) == len(first)
+
+            # 版本不同时不使用缓存
+            await pool.add_mcp_server(
+                "third",
+                command=sys.executable,
+                args=[ECHO_SERVER],
+                version="2",
+                cache_dir=cache_dir,
+            )
+            assert "third" not in pool.handshakes
+            assert len(list(tmp_path.iterdir())) == 2
+        finally:
+            await pool.close_all()
+
+
+@requires_mcp_server
+class TestLazyServers:
+    """测试懒启动和空闲关闭"""
+
+    @staticmethod
+    async def _wait_disconnected(client, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while client.is_connected and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    @pytest.mark.asyncio
+    async def test_lazy_start_and_idle_shutdown(self, tmp_path):
+        pool = _MCPToolPool()
+        try:
+            # 缓存未命中：获取工具列表后关闭服务器
+            group = await pool.add_mcp_server(
+                "lazy",
+                command=sys.executable,
+                args=[ECHO_SERVER],
+                cache_dir=str(tmp_path),
+                lazy=True,
+                idle_timeout=0.5,
+            )
+            client = group["pid"].mcp_client
+            assert "pid" in group.get_tool_names()
+            assert not client.is_connected
+
+            # 第一次调用时启动，空闲超时后关闭
+            first_pid = (await group["pid"].aexecute({})).result
+            assert client.is_connected
+            await self._wait_disconnected(client)
+            assert not client.is_connected
+            assert client.stats()["idle_shutdowns"] == 1
+
+            # 关闭后再次调用会重新启动服务器
+            second_pid = (await group["pid"].aexecute({})).result
+            assert second_pid != first_pid
+        finally:
+            await pool.close_all()
+
+    @pytest.mark.asyncio
+    async def test_lazy_with_cached_tools_never_starts(self, tmp_path):
+        pool = _MCPToolPool()
+        try:
+            await pool.add_mcp_server(
+                "warm",
+                command=sys.executable,
+                args=[ECHO_SERVER],
+                cache_dir=str(tmp_path),
+            )
+            group = await pool.add_mcp_server(
+                "cold",
+                command=sys.executable,
+                args=[ECHO_SERVER],
+                cache_dir=str(tmp_path),
+                lazy=True,
+            )
+            client = group["echo"].mcp_client
+            assert "cold" not in pool.handshakes
+            assert client.stats()["connected"] is False
+            assert client.session is None
+
+            result = group["echo"].execute({"message": "wake"})
+            assert result.result == "wake"
+            assert client.stats()["connected"] is True
+        finally:
+            await pool.close_all()
+
+    @pytest.mark.asyncio
+    async def test_idle_replicas_not_counted_as_restarts(self):
+        pool = _MCPToolPool()
+        try:
+            group = await pool.add_mcp_server(
+                "idle_replicas",
+                command=sys.executable,
+                args=[ECHO_SERVER],
+                replicas=2,
+                idle_timeout=0.3,
+            )
+            replica_set = group["echo"].mcp_client
+            for replica in replica_set.replicas:
+                await self._wait_disconnected(replica)
+            assert replica_set.stats()["idle_shutdowns"] == 2
+
+            result = await group["echo"].aexecute({"message": "again"})
+            assert result.result == "again"
+            for _ in range(500):
+                if not replica_set._restarting:
+                    break
+                await asyncio.sleep(0.01)
+            assert replica_set.stats()["restarts"] == 0
+        finally:
+            await pool.close_all()
+
+
+@requires_mcp_server
+class TestServerHealth:
+    """测试崩溃检测、自动重启和幂等调用的重试"""
+
+    @staticmethod
+    async def _wait_until(predicate, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while not predicate() and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        return predicate()
+
+    @pytest.mark.asyncio
+    async def test_ping_detects_crash_and_respawns(self):
+        pool = _MCPToolPool()
+        try:
+            group = await pool.add_mcp_server(
+                "pinged",
+                command=sys.executable,
+                args=[ECHO_SERVER],
+                ping_interval=0.2,
+            )
+            client = group["pid"].mcp_client
+            old_pid = int(await client.call_tool("pid", {}))
+            assert client.stats()["uptime"] > 0
+
+            # 没有任何调用，也能通过 ping 发现服务器退出
+            os.kill(old_pid, signal.SIGKILL)
+            assert await self._wait_until(lambda: not client.is_connected)
+            assert await self._wait_until(lambda: client.is_connected)
+
+            assert int(await client.call_tool("pid", {})) != old_pid
+            stats = client.stats()
+            assert stats["restarts"] == 1
+            assert stats["idle_shutdowns"] == 0
+        finally:
+            await pool.close_all()
+
+    @pytest.mark.asyncio
+    async def test_idempotent_call_retried_after_crash(self):
+        pool = _MCPToolPool()
+        try:
+            group = await pool.add_mcp_server(
+                "retried",
+                command=sys.executable,
+                args=[ECHO_SERVER],
+                ping_interval=None,
+            )
+            # sleep 在服务器上标注了 idempotentHint
+            assert group["sleep"].idempotent
+            assert not group["echo"].idempotent
+            client = group["sleep"].mcp_client
+            old_pid = int(await client.call_tool("pid", {}))
+
+            call = asyncio.ensure_future(
+                group["sleep"].aexecute({"seconds": 1.0})
+            )
+            assert await self._wait_until(lambda: client.load > 0)
+            os.kill(old_pid, signal.SIGKILL)
+
+            result = await call
+            assert result.success
+            assert result.result == "ok"
+            assert client.stats()["retries"] == 1
+            assert await self._wait_until(lambda: client.restarts == 1)
+            assert int(await client.call_tool("pid", {})) != old_pid
+        finally:
+            await pool.close_all()
+
+    @pytest.mark.asyncio
+    async def test_non_idempotent_call_not_retried(self):
+        pool = _MCPToolPool()
+        try:
+            group = await pool.add_mcp_server(
+                "not_retried",
+                command=sys.executable,
+                args=[ECHO_SERVER],
+                ping_interval=None,
+                idempotent_tools=["echo"],
+            )
+            assert group["echo"].idempotent
+            client = group["sleep"].mcp_client
+            old_pid = int(await client.call_tool("pid", {}))
+
+            call = asyncio.ensure_future(
+                client.call_tool("sleep", {"seconds": 1.0})
+            )
+            assert await self._wait_until(lambda: client.load > 0)
+            os.kill(old_pid, signal.SIGKILL)
+
+            with pytest.raises(MCPCommunicationError):
+                await call
+            assert client.stats()["retries"] == 0
+            # 重启由后台任务完成，之后的调用恢复正常
+            assert await self._wait_until(lambda: client.is_connected)
+            assert (await group["echo"].aexecute({"message": "x"})).success
+        finally:
+            await pool.close_all()
+
+
+class TestMCPToolResult:
+    """测试结构化的 MCP 工具结果"""
+
+    def test_compact_text(self):
+        result = MCPToolResult(
+            [
+                MCPContentPart("text", text="第一段"),
+                MCPContentPart(
+                    "image",
+                    data=memoryview(b"x" * 10),
+                    mime_type="image/png",
+                    size=10,
+                ),
+                MCPContentPart("text", text="第二段"),
+            ]
+        )
+        assert isinstance(result, str)
+        assert result.text == "第一段\n第二段"
+        assert result == "第一段\n[image: image/png, 10 字节]\n第二段"
+        assert len(result.blobs) == 1
+        assert bytes(result.blobs[0].read()) == b"x" * 10
+
+    def test_structured_only(self):
+        result = MCPToolResult([], structured={"value": 1})
+        assert result == '{"value": 1}'
+
+    def test_context_keeps_plain_string(self):
+        context = Context()
+        result = MCPToolResult([MCPContentPart("text", text="ok")])
+        context.add_tool_call("tool", {}, result)
+        assert type(context.messages[-1]["content"]) is str
+
+    def test_spilled_file_outlives_result(self, tmp_path):
+        config = MCPServerConfig(
+            "spill", spill_threshold=4, spill_dir=str(tmp_path)
+        )
+        part = _binary_part("image", "AAECAwQFBgc=", "image/png", None, config)
+        result = MCPToolResult([part])
+        path = part.path
+
+        # 运行流程中只有字符串进入上下文，结果本身随后被回收
+        context = Context()
+        context.add_tool_call("picture", {}, result)
+        del part, result
+        gc.collect()
+
+        assert os.path.exists(path)
+        assert path in context.messages[-1]["content"]
+
+    def test_expired_files_swept_on_spill(self, tmp_path):
+        config = MCPServerConfig(
+            "spill", spill_threshold=4, spill_dir=str(tmp_path), spill_ttl=60
+        )
+        stale = tmp_path / "zipagent-mcp-old.png"
+        stale.write_bytes(b"old")
+        os.utime(stale, (time.time() - 120, time.time() - 120))
+        other = tmp_path / "notes.txt"
+        other.write_bytes(b"keep")
+        os.utime(other, (time.time() - 120, time.time() - 120))
+
+        part = _binary_part("image", "AAECAwQFBgc=", "image/png", None, config)
+
+        assert not stale.exists()
+        assert other.exists()
+        assert os.path.exists(part.path)
+
+    def test_cleanup_removes_file_early(self, tmp_path):
+        config = MCPServerConfig(
+            "spill", spill_threshold=4, spill_dir=str(tmp_path)
+        )
+        result = MCPToolResult(
+            [_binary_part("image", "AAECAwQFBgc=", None, None, config)]
+        )
+
+        result.cleanup()
+
+        assert result.parts[0].path is None
+        assert os.listdir(tmp_path) == []
+
+
+@requires_mcp_server
+class TestBinaryResults:
+    """测试多内容块和二进制结果"""
+
+    @pytest.mark.asyncio
+    async def test_all_parts_kept_and_decoded(self, echo_group):
+        result = (await echo_group["picture"].aexecute({"size": 1000})).result
+
+        assert isinstance(result, MCPToolResult)
+        text, image = result.parts
+        assert text.text == "picture of 1000 bytes"
+        assert image.type == "image"
+        assert image.mime_type == "image/png"
+        assert isinstance(image.data, memoryview)
+        assert bytes(image.read()) == bytes(i % 251 for i in range(1000))
+        # 上下文中只有紧凑的引用，没有 base64 数据
+        assert result == (
+            "picture of 1000 bytes\n[image: image/png, 1000 字节]"
+        )
+
+    @pytest.mark.asyncio
+    async def test_large_blob_spilled_to_file(self, tmp_path):
+        pool = _MCPToolPool()
+        try:
+            group = await pool.add_mcp_server(
+                "spill",
+                command=sys.executable,
+                args=[ECHO_SERVER],
+                tools=["picture"],
+                spill_threshold=4096,
+                spill_dir=str(tmp_path),
+            )
+            size = 2 * 1024 * 1024
+            tool_result = await group["picture"].aexecute({"size": size})
+            result = tool_result.result
+            (image,) = result.blobs
+
+            assert image.data is None
+            assert image.size == size
+            assert os.path.dirname(image.path) == str(tmp_path)
+            assert image.path.endswith(".png")
+            assert image.read() == bytes(i % 251 for i in range(size))
+            assert image.path in result
+            assert len(result) < 200
+
+            context = Context()
+            context.add_tool_call("picture", {"size": size}, result)
+            assert len(context.messages[-1]["content"]) < 200
+
+            result.cleanup()
+            assert os.listdir(tmp_path) == []
+        finally:
+            await pool.close_all()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def http_echo_server():
+    """以 HTTP 方式运行的 echo MCP 服务器，返回 transport 到 url 的映射"""
+    servers = {}
+    processes = []
+    for transport, path in (("streamable-http", "/mcp"), ("sse", "/sse")):
+        port = _free_port()
+        processes.append(
+            subprocess.Popen(
+                [sys.executable, ECHO_SERVER, transport, str(port)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        )
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), 0.2).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+        servers[transport] = f"http://127.0.0.1:{port}{path}"
+    yield servers
+    for process in processes:
+        process.terminate()
+        process.wait()
+
+
+@requires_mcp_server
+class TestHTTPTransport:
+    """测试 HTTP 传输和进程内共用的连接池"""
+
+    @pytest.mark.asyncio
+    async def test_streamable_http_shared_pool(self, http_echo_server):
+        url = http_echo_server["streamable-http"]
+        pool = _MCPToolPool()
+        try:
+            first, second = await asyncio.gather(
+                pool.add_mcp_server("remote_a", url=url),
+                pool.add_mcp_server("remote_b", url=url, tools=["pid"]),
+            )
+            assert first["echo"].mcp_client.config.transport == (
+                "streamable-http"
+            )
+            # 两个会话连接同一个远程服务器，共用一个 HTTP 客户端
+            assert http_pool_stats() == {"clients": 1, "sessions": 2}
+
+            results = await asyncio.gather(
+                *(
+                    first["echo"].aexecute({"message": str(i)})
+                    for i in range(10)
+                ),
+                second["pid"].aexecute({}),
+                first["pid"].aexecute({}),
+            )
+            assert [r.result for r in results[:10]] == [
+                str(i) for i in range(10)
+            ]
+            assert results[10].result == results[11].result
+            # 同步路径同样可用
+            assert first["echo"].execute({"message": "sync"}).result == "sync"
+
+            await pool.remove_server("remote_a")
+            assert http_pool_stats() == {"clients": 1, "sessions": 1}
+            assert (await second["pid"].aexecute({})).success
+        finally:
+            await pool.close_all()
+        assert http_pool_stats() == {"clients": 0, "sessions": 0}
+
+    @pytest.mark.asyncio
+    async def test_separate_clients_per_headers(self, http_echo_server):
+        url = http_echo_server["streamable-http"]
+        pool = _MCPToolPool()
+        try:
+            await pool.add_mcp_server("plain", url=url)
+            group = await pool.add_mcp_server(
+                "with_headers", url=url, headers={"X-Tenant": "a"}
+            )
+            assert http_pool_stats()["clients"] == 2
+            result = await group["echo"].aexecute({"message": "hi"})
+            assert result.result == "hi"
+        finally:
+            await pool.close_all()
+
+    @pytest.mark.asyncio
+    async def test_sse_transport(self, http_echo_server):
+        try:
+            group = await MCPTool.connect(
+                url=http_echo_server["sse"], transport="sse", name="sse"
+            )
+            result = await group["echo"].aexecute({"message": "over sse"})
+            assert result.result == "over sse"
+            assert http_pool_stats()["sessions"] == 1
+        finally:
+            await MCPTool.disconnect_all()
+        assert http_pool_stats()["sessions"] == 0
+
+    def test_invalid_transport_config(self):
+        with pytest.raises(MCPError):
+            MCPClient(MCPServerConfig(name="x", transport="websocket"))
+        with pytest.raises(MCPError):
+            MCPClient(MCPServerConfig(name="x", transport="sse"))
+        with pytest.raises(MCPError):
+            MCPClient(MCPServerConfig(name="x"))
+
+
 @pytest.mark.integration
 class TestMCPIntegration:
     """集成测试（需要真实的 MCP 环境）"""
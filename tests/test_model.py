@@ -1,16 +1,19 @@
 """测试 Model 模块"""
 
 import os
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
 from zipagent.model import (
+    AsyncModel,
+    AsyncOpenAIModel,
     Model,
     ModelResponse,
     OpenAIModel,
     StreamDelta,
     Usage,
+    _watch_streams,
 )
 
 
@@ -311,6 +314,24 @@ class TestOpenAIModel:
         call_args = mock_client.chat.completions.create.call_args
         assert call_args[1]["stream"] is True
 
+    @patch("openai.OpenAI")
+    def test_openai_model_stream_reports_open_connection(
+        self, mock_openai_class
+    ):
+        """测试流式请求把打开的连接交给当前线程的监听者"""
+        mock_client = MagicMock()
+        mock_openai_class.return_value = mock_client
+        stream = MagicMock()
+        stream.__iter__.return_value = iter([])
+        mock_client.chat.completions.create.return_value = stream
+
+        model = OpenAIModel(model_name="gpt-3.5-turbo", api_key="test")
+        opened = []
+        with _watch_streams(opened.append):
+            list(model.generate_stream([{"role": "user", "content": "测试"}]))
+
+        assert opened == [stream]
+
     @patch("openai.OpenAI")
     def test_openai_model_error_handling(self, mock_openai_class):
         """测试错误处理"""
@@ -329,3 +350,284 @@ class TestOpenAIModel:
             model.generate(messages)
 
         assert "API Error" in str(exc_info.value)
+
+
+class TestAsyncModel:
+    """测试 AsyncModel 抽象类"""
+
+    def test_async_model_abstract_methods(self):
+        """测试抽象方法"""
+        with pytest.raises(TypeError):
+            AsyncModel()
+
+    @pytest.mark.asyncio
+    async def test_async_model_generate_stream_default(self):
+        """测试默认的异步流式生成实现"""
+
+        class ConcreteAsyncModel(AsyncModel):
+            async def generate(self, messages, tools=None):
+                return ModelResponse(
+                    content="测试内容",
+                    tool_calls=None,
+                    usage=Usage(10, 20, 30),
+                    finish_reason="stop",
+                )
+
+        model = ConcreteAsyncModel()
+        deltas = [delta async for delta in model.generate_stream([], None)]
+
+        assert [d.content for d in deltas[:-1]] == list("测试内容")
+        assert isinstance(deltas[-1], ModelResponse)
+        assert deltas[-1].content == "测试内容"
+
+
+class TestAsyncOpenAIModel:
+    """测试 AsyncOpenAIModel 类"""
+
+    @staticmethod
+    def _chunk(content, finish_reason=None, usage=None):
+        chunk = MagicMock()
+        chunk.choices = [MagicMock()]
+        chunk.choices[0].delta.content = content
+        chunk.choices[0].delta.tool_calls = None
+        chunk.choices[0].finish_reason = finish_reason
+        chunk.usage = usage
+        return chunk
+
+    @patch("openai.AsyncOpenAI")
+    @pytest.mark.asyncio
+    async def test_async_openai_model_generate_stream(self, mock_openai_class):
+        """测试异步流式生成"""
+        usage = MagicMock()
+        usage.prompt_tokens = 10
+        usage.completion_tokens = 20
+        usage.total_tokens = 30
+        chunks = [
+            self._chunk("测"),
+            self._chunk("试"),
+            self._chunk(None, finish_reason="stop", usage=usage),
+        ]
+
+        async def fake_stream():
+            for chunk in chunks:
+                yield chunk
+
+        mock_client = MagicMock()
+        mock_client.chat.completions.create = AsyncMock(
+            return_value=fake_stream()
+        )
+        mock_openai_class.return_value = mock_client
+
+        model = AsyncOpenAIModel(model_name="gpt-3.5-turbo", api_key="test")
+        messages = [{"role": "user", "content": "测试"}]
+        deltas = [d async for d in model.generate_stream(messages)]
+
+        assert [d.content for d in deltas[:-1]] == ["测", "试"]
+        assert isinstance(deltas[-1], ModelResponse)
+        assert deltas[-1].content == "测试"
+        assert deltas[-1].usage.total_tokens == 30
+
+        call_args = mock_client.chat.completions.create.call_args
+        assert call_args[1]["stream"] is True
+        assert call_args[1]["model"] == "gpt-3.5-turbo"
+
+    @patch("openai.AsyncOpenAI")
+    @pytest.mark.asyncio
+    async def test_async_openai_model_stream_error(self, mock_openai_class):
+        """测试异步流式调用出错时返回错误响应"""
+        mock_client = MagicMock()
+        mock_client.chat.completions.create = AsyncMock(
+            side_effect=Exception("API Error")
+        )
+        mock_openai_class.return_value = mock_client
+
+        model = AsyncOpenAIModel(model_name="gpt-3.5-turbo", api_key="test")
+        deltas = [d async for d in model.generate_stream([])]
+
+        assert isinstance(deltas[-1], ModelResponse)
+        assert deltas[-1].finish_reason == "error"
+        assert "API Error" in deltas[-1].content
+
+
+class TestPreEncodedRequest:
+    """测试使用预编码消息发送请求"""
+
+    @staticmethod
+    def _model_with_mock_client():
+        model = OpenAIModel(model_name="gpt-test", api_key="test")
+        model.client = MagicMock()
+        response = MagicMock(choices=[MagicMock()], usage=None)
+        response.choices[0].message.content = "好"
+        response.choices[0].message.tool_calls = None
+        response.choices[0].finish_reason = "stop"
+        model.client.post.return_value = response
+        model.client.chat.completions.create.return_value = response
+        return model
+
+    def test_generate_sends_cached_json_body(self):
+        """测试请求体由缓存的消息片段拼接而成"""
+        import json
+
+        from zipagent import Context
+
+        model = self._model_with_mock_client()
+        context = Context()
+        context.add_message("user", "你好")
+
+        response = model.generate(context.get_messages_for_api())
+
+        assert response.content == "好"
+        model.client.chat.completions.create.assert_not_called()
+        call_args = model.client.post.call_args
+        assert call_args[0][0] == "/chat/completions"
+        assert call_args[1]["stream"] is False
+        body = json.loads(call_args[1].get("content") or call_args[1]["body"])
+        assert body == {
+            "messages": [{"role": "user", "content": "你好"}],
+            "model": "gpt-test",
+            "temperature": model.temperature,
+        }
+
+    def test_plain_list_uses_sdk(self):
+        """测试普通列表仍然走 SDK 的常规调用"""
+        model = self._model_with_mock_client()
+
+        model.generate([{"role": "user", "content": "你好"}])
+
+        model.client.chat.completions.create.assert_called_once()
+        model.client.post.assert_not_called()
+
+    def test_sdk_options_use_sdk(self):
+        """测试包含 SDK 专用参数时回退到常规调用"""
+        from zipagent import Context
+
+        model = self._model_with_mock_client()
+        model.kwargs["extra_headers"] = {"X-Test": "1"}
+        context = Context()
+        context.add_message("user", "你好")
+
+        model.generate(context.get_messages_for_api())
+
+        model.client.chat.completions.create.assert_called_once()
+        model.client.post.assert_not_called()
+
+    @staticmethod
+    def _real_client_model(handler):
+        """使用真实 SDK 客户端，HTTP 请求交给 handler 处理"""
+        import openai._base_client as base_client
+
+        # openai 1.x 使用 httpx，新版本使用 httpx2
+        httpx = getattr(base_client, "httpx", None) or base_client.httpx2
+        model = OpenAIModel(model_name="gpt-test", api_key="test")
+        model.client = model.client.with_options(
+            http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+            max_retries=0,
+        )
+        return model, httpx
+
+    def test_real_sdk_sends_cached_json_body(self):
+        """测试按真实 SDK 的 post 签名发送预编码的请求体"""
+        import json
+        import warnings
+
+        from zipagent import Context
+
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(
+                200,
+                json={
+                    "id": "chatcmpl-1",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": "gpt-test",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "好"},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                },
+            )
+
+        model, httpx = self._real_client_model(handler)
+        context = Context()
+        context.add_message("user", "你好")
+
+        with warnings.catch_warnings():
+            # 使用当前 SDK 支持且未弃用的参数
+            warnings.simplefilter("error", DeprecationWarning)
+            response = model.generate(context.get_messages_for_api())
+
+        assert response.content == "好"
+        (request,) = requests
+        assert request.url.path.endswith("/chat/completions")
+        assert request.headers["content-type"] == "application/json"
+        assert json.loads(request.content)["messages"] == [
+            {"role": "user", "content": "你好"}
+        ]
+
+    def test_real_sdk_streams_cached_json_body(self):
+        """测试流式请求同样可以通过真实 SDK 发送"""
+        import json
+
+        from zipagent import Context
+
+        chunk = {
+            "id": "chatcmpl-1",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-test",
+            "choices": [
+                {"index": 0, "delta": {"content": "好"}, "finish_reason": None}
+            ],
+        }
+        sse = f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n"
+        bodies = []
+
+        def handler(request):
+            bodies.append(json.loads(request.content))
+            return httpx.Response(
+                200,
+                content=sse.encode(),
+                headers={"content-type": "text/event-stream"},
+            )
+
+        model, httpx = self._real_client_model(handler)
+        context = Context()
+        context.add_message("user", "你好")
+
+        items = list(model.generate_stream(context.get_messages_for_api()))
+
+        assert bodies[0]["stream"] is True
+        assert items[-1].finish_reason != "error"
+        assert items[-1].content == "好"
+
+    def test_raw_body_param_matches_sdk_signature(self):
+        """测试原始请求体参数与 SDK 的 post 签名一致"""
+        import inspect
+
+        from openai import OpenAI
+
+        from zipagent.model import _raw_body_param
+
+        param = _raw_body_param(OpenAI.post)
+        assert param in inspect.signature(OpenAI.post).parameters
+
+        # openai 1.99 的 post 没有 content 参数，使用 bytes 形式的 body
+        def legacy_post(
+            path,
+            *,
+            cast_to,
+            body=None,
+            options=None,
+            files=None,
+            stream=False,
+            stream_cls=None,
+        ):
+            pass
+
+        assert _raw_body_param(legacy_post) == "body"
@@ -0,0 +1,281 @@
+"""Resilience 模块测试"""
+
+import pytest
+
+from zipagent import (
+    Agent,
+    CircuitBreaker,
+    CircuitOpenError,
+    Context,
+    Model,
+    ModelError,
+    ModelResponse,
+    ResilientModel,
+    Runner,
+    StreamDelta,
+)
+from zipagent.model import Usage, _stream_error_response
+from zipagent.resilience import get_circuit_breaker, is_retryable
+
+
+def ok_response(content: str = "好的") -> ModelResponse:
+    return ModelResponse(
+        content=content, tool_calls=None, usage=Usage(), finish_reason="stop"
+    )
+
+
+class FlakyModel(Model):
+    """按顺序抛出给定错误，之后返回正常响应"""
+
+    def __init__(self, errors: list[Exception], partial: str | None = None):
+        self.errors = list(errors)
+        self.partial = partial
+        self.calls = 0
+
+    def generate(self, messages, tools=None):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return ok_response()
+
+    def generate_stream(self, messages, tools=None):
+        self.calls += 1
+        if self.errors:
+            if self.partial:
+                yield StreamDelta(content=self.partial)
+            yield from _stream_error_response(self.errors.pop(0))
+            return
+        yield StreamDelta(content="好的")
+        yield ok_response()
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def wrap(model: Model, **kwargs) -> ResilientModel:
+    delays: list[float] = []
+    kwargs.setdefault("circuit_breaker", CircuitBreaker())
+    resilient = ResilientModel(model, sleep=delays.append, **kwargs)
+    resilient.delays = delays  # type: ignore[attr-defined]
+    return resilient
+
+
+class TestIsRetryable:
+    """错误分类测试"""
+
+    def test_status_codes(self) -> None:
+        assert is_retryable(ModelError("限流", status_code=429))
+        assert is_retryable(ModelError("服务错误", status_code=503))
+        assert not is_retryable(ModelError("鉴权失败", status_code=401))
+        assert not is_retryable(ModelError("参数错误", status_code=400))
+
+    def test_connection_errors(self) -> None:
+        error = ModelError("连接失败", original_error=ConnectionError())
+        assert is_retryable(error)
+        assert not is_retryable(ModelError("未知错误"))
+
+
+class TestCircuitBreaker:
+    """熔断器测试"""
+
+    def test_opens_after_threshold_and_probes(self) -> None:
+        clock = FakeClock()
+        breaker = CircuitBreaker(
+            failure_threshold=2, recovery_timeout=10, clock=clock
+        )
+
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.CLOSED
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not breaker.allow_request()
+
+        clock.now = 10
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow_request()
+        assert not breaker.allow_request()  # 只放行一个探测请求
+
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+        clock.now = 20
+        assert breaker.allow_request()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_release_probe(self) -> None:
+        clock = FakeClock()
+        breaker = CircuitBreaker(
+            failure_threshold=1, recovery_timeout=10, clock=clock
+        )
+        breaker.record_failure()
+        clock.now = 10
+
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+        breaker.release_probe()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert breaker.allow_request()
+
+    def test_shared_per_endpoint(self) -> None:
+        first = get_circuit_breaker("http://a#gpt")
+        assert get_circuit_breaker("http://a#gpt") is first
+        assert get_circuit_breaker("http://b#gpt") is not first
+
+
+class TestResilientModel:
+    """ResilientModel 测试"""
+
+    def test_retries_transient_errors(self) -> None:
+        inner = FlakyModel([ModelError("限流", status_code=429)] * 2)
+        model = wrap(inner, base_delay=1.0)
+
+        response = model.generate([])
+
+        assert response.content == "好的"
+        assert inner.calls == 3
+        assert len(model.delays) == 2
+        assert 0 <= model.delays[1] <= 2.0
+
+    def test_honors_retry_after(self) -> None:
+        inner = FlakyModel(
+            [ModelError("限流", status_code=429, retry_after=7.0)]
+        )
+        model = wrap(inner)
+
+        model.generate([])
+
+        assert model.delays == [7.0]
+
+    def test_non_retryable_error_raises(self) -> None:
+        inner = FlakyModel([ModelError("参数错误", status_code=400)])
+        model = wrap(inner)
+
+        with pytest.raises(ModelError) as exc_info:
+            model.generate([])
+
+        assert exc_info.value.status_code == 400
+        assert inner.calls == 1
+        assert model.delays == []
+
+    def test_gives_up_after_max_retries(self) -> None:
+        inner = FlakyModel([ModelError("服务错误", status_code=500)] * 5)
+        model = wrap(inner, max_retries=2)
+
+        with pytest.raises(ModelError):
+            model.generate([])
+
+        assert inner.calls == 3
+
+    def test_open_circuit_rejects_without_calling(self) -> None:
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60)
+        inner = FlakyModel([ModelError("服务错误", status_code=503)] * 5)
+        model = wrap(inner, max_retries=3, circuit_breaker=breaker)
+
+        with pytest.raises(ModelError):
+            model.generate([])
+        assert inner.calls == 1
+
+        with pytest.raises(CircuitOpenError):
+            model.generate([])
+        assert inner.calls == 1
+
+    def test_stream_retries_before_output(self) -> None:
+        inner = FlakyModel([ModelError("服务错误", status_code=502)])
+        model = wrap(inner)
+
+        items = list(model.generate_stream([]))
+
+        assert [i.content for i in items[:-1]] == ["好的"]
+        assert items[-1].finish_reason == "stop"
+        assert inner.calls == 2
+
+    def test_stream_does_not_retry_after_partial_output(self) -> None:
+        inner = FlakyModel(
+            [ModelError("服务错误", status_code=502)], partial="部分"
+        )
+        model = wrap(inner)
+
+        items = list(model.generate_stream([]))
+
+        assert items[0].content == "部分"
+        assert items[-1].finish_reason == "error"
+        assert items[-1].error.status_code == 502
+        assert inner.calls == 1
+
+
+class TestResilientModelProbeRelease:
+    """探测请求没有结论时释放名额"""
+
+    @staticmethod
+    def _half_open_model(inner: Model) -> ResilientModel:
+        clock = FakeClock()
+        breaker = CircuitBreaker(
+            failure_threshold=1, recovery_timeout=10, clock=clock
+        )
+        breaker.record_failure()
+        clock.now = 10
+        return wrap(inner, circuit_breaker=breaker)
+
+    def test_closed_stream_releases_probe(self) -> None:
+        model = self._half_open_model(FlakyModel([]))
+
+        stream = model.generate_stream([])
+        assert next(stream).content == "好的"
+        stream.close()
+
+        breaker = model.circuit_breaker
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        items = list(model.generate_stream([]))
+        assert items[-1].finish_reason == "stop"
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_interrupted_generate_releases_probe(self) -> None:
+        model = self._half_open_model(FlakyModel([KeyboardInterrupt()]))
+
+        with pytest.raises(KeyboardInterrupt):
+            model.generate([])
+
+        assert model.generate([]).content == "好的"
+        assert model.circuit_breaker.state == CircuitBreaker.CLOSED
+
+
+class TestClientRetries:
+    """被包装的 OpenAI 客户端不再自行重试"""
+
+    def test_sdk_retries_disabled(self) -> None:
+        from zipagent import OpenAIModel
+
+        inner = OpenAIModel(model_name="gpt-test", api_key="test")
+        assert inner.client.max_retries > 0
+
+        ResilientModel(inner, circuit_breaker=CircuitBreaker())
+
+        assert inner.client.max_retries == 0
+
+
+class TestRunnerModelErrors:
+    """Runner 对模型错误的处理"""
+
+    def test_error_response_not_written_to_context(self) -> None:
+        inner = FlakyModel([ModelError("参数错误", status_code=400)])
+        agent = Agent(
+            name="TestAgent",
+            instructions="测试",
+            model=wrap(inner),
+            use_system_prompt=False,
+        )
+        context = Context()
+
+        result = Runner.run(
+            agent, "你好", context=context, stream_callback=lambda e: None
+        )
+
+        assert result.success is False
+        assert "模型流式调用出错" in result.error
+        assert [m["role"] for m in context.messages] == ["system", "user"]
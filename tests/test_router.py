@@ -0,0 +1,313 @@
+"""Router 模块测试"""
+
+import threading
+import time
+
+import pytest
+
+from zipagent import (
+    ConfigurationError,
+    Model,
+    ModelError,
+    ModelResponse,
+    RouterModel,
+    StreamDelta,
+)
+from zipagent.model import Usage, _stream_error_response, _stream_opened
+
+
+class EndpointModel(Model):
+    """记录调用次数的端点模型，可以配置为失败"""
+
+    def __init__(self, name: str, error: ModelError | None = None):
+        self.model_name = "gpt-test"
+        self.base_url = f"http://{name}"
+        self.error = error
+        self.calls = 0
+
+    def generate(self, messages, tools=None):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return ModelResponse(
+            content=self.base_url,
+            tool_calls=None,
+            usage=Usage(),
+            finish_reason="stop",
+        )
+
+    def generate_stream(self, messages, tools=None):
+        self.calls += 1
+        if self.error:
+            yield from _stream_error_response(self.error)
+            return
+        yield StreamDelta(content=self.base_url)
+        yield ModelResponse(
+            content=self.base_url,
+            tool_calls=None,
+            usage=Usage(),
+            finish_reason="stop",
+        )
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestRouterModel:
+    """RouterModel 测试"""
+
+    def test_requires_endpoints_and_known_strategy(self) -> None:
+        with pytest.raises(ConfigurationError):
+            RouterModel([])
+        with pytest.raises(ConfigurationError):
+            RouterModel([EndpointModel("a")], strategy="random")
+
+    def test_spreads_load_by_outstanding_requests(self) -> None:
+        """测试进行中的请求较多的端点不会被选中"""
+        release = threading.Event()
+        blocked: list[EndpointModel] = []
+        lock = threading.Lock()
+
+        class BlockingModel(EndpointModel):
+            def generate(self, messages, tools=None):
+                # 第一个请求阻塞在选中的端点上
+                with lock:
+                    block = not blocked
+                    if block:
+                        blocked.append(self)
+                if block:
+                    release.wait(5)
+                return super().generate(messages, tools)
+
+        models = [BlockingModel("a"), BlockingModel("b")]
+        router = RouterModel(models)
+
+        thread = threading.Thread(target=router.generate, args=([],))
+        thread.start()
+        while not blocked:
+            thread.join(0.01)
+        try:
+            for _ in range(3):
+                response = router.generate([])
+                assert response.content != blocked[0].base_url
+        finally:
+            release.set()
+            thread.join()
+
+        assert blocked[0].calls == 1
+        assert sum(m.calls for m in models) == 4
+
+    def test_latency_strategy_prefers_fast_endpoint(self) -> None:
+        clock = FakeClock()
+
+        class TimedModel(EndpointModel):
+            def __init__(self, name, latency):
+                super().__init__(name)
+                self.latency = latency
+
+            def generate(self, messages, tools=None):
+                clock.now += self.latency
+                return super().generate(messages, tools)
+
+        slow = TimedModel("slow", 2.0)
+        fast = TimedModel("fast", 0.1)
+        router = RouterModel([slow, fast], strategy="latency", clock=clock)
+
+        # 前两次请求用于测量两个端点的延迟
+        router.generate([])
+        router.generate([])
+        for _ in range(5):
+            router.generate([])
+
+        assert slow.calls == 1
+        assert fast.calls == 6
+
+    def test_failover_on_retryable_error(self) -> None:
+        broken = EndpointModel("broken", ModelError("错误", status_code=503))
+        healthy = EndpointModel("healthy")
+        router = RouterModel([broken, healthy], failure_threshold=1)
+
+        # 端点选择有随机性，直到故障端点被选中一次
+        while broken.calls == 0:
+            assert router.generate([]).content == "http://healthy"
+        for _ in range(5):
+            assert router.generate([]).content == "http://healthy"
+
+        # 熔断后不再请求故障端点
+        assert broken.calls == 1
+        states = {s["endpoint"]: s["state"] for s in router.stats()}
+        assert states["http://broken#gpt-test"] == "open"
+
+    def test_no_failover_on_client_error(self) -> None:
+        bad_request = ModelError("参数错误", status_code=400)
+        first = EndpointModel("a", bad_request)
+        second = EndpointModel("b", bad_request)
+        router = RouterModel([first, second])
+
+        with pytest.raises(ModelError) as exc_info:
+            router.generate([])
+
+        assert exc_info.value.status_code == 400
+        assert first.calls + second.calls == 1
+
+    def test_all_endpoints_failing(self) -> None:
+        error = ModelError("错误", status_code=500)
+        router = RouterModel(
+            [EndpointModel("a", error), EndpointModel("b", error)]
+        )
+
+        with pytest.raises(ModelError):
+            router.generate([])
+
+    def test_stream_failover(self) -> None:
+        broken = EndpointModel("broken", ModelError("限流", status_code=429))
+        healthy = EndpointModel("healthy")
+        router = RouterModel([broken, healthy])
+
+        for _ in range(2):
+            items = list(router.generate_stream([]))
+            assert items[0].content == "http://healthy"
+            assert items[-1].finish_reason == "stop"
+
+        stats = router.stats()
+        assert all(s["outstanding"] == 0 for s in stats)
+
+
+class TestHedgedRequests:
+    """对冲请求测试"""
+
+    @staticmethod
+    def slow_first_models(delay: float):
+        """第一个被调用的端点在输出前等待 delay 秒，其余立即输出"""
+        lock = threading.Lock()
+        state = {"first": True, "closed": threading.Event()}
+
+        class SlowFirstModel(EndpointModel):
+            def generate_stream(self, messages, tools=None):
+                with lock:
+                    slow = state["first"]
+                    state["first"] = False
+                self.calls += 1
+                try:
+                    if slow:
+                        time.sleep(delay)
+                    yield StreamDelta(content=self.base_url)
+                    yield ModelResponse(
+                        content=self.base_url,
+                        tool_calls=None,
+                        usage=Usage(),
+                        finish_reason="stop",
+                    )
+                finally:
+                    if slow:
+                        state["closed"].set()
+
+        return [SlowFirstModel("a"), SlowFirstModel("b")], state
+
+    def test_hedge_wins_over_slow_primary(self) -> None:
+        models, state = self.slow_first_models(0.5)
+        router = RouterModel(models, hedge_delay=0.05)
+
+        items = list(router.generate_stream([]))
+
+        assert items[-1].finish_reason == "stop"
+        assert len(items) == 2
+        assert router.hedge_stats() == {
+            "requests": 1,
+            "hedged": 1,
+            "hedge_wins": 1,
+        }
+        # 慢的一方输出后发现已被取消，流被关闭
+        assert state["closed"].wait(2)
+        for _ in range(100):
+            if all(s["outstanding"] == 0 for s in router.stats()):
+                break
+            time.sleep(0.01)
+        assert all(s["outstanding"] == 0 for s in router.stats())
+
+    def test_loser_connection_closed_when_winner_commits(self) -> None:
+        """阻塞在读取中的一方被主动关闭连接，而不是等到它输出"""
+
+        class Connection:
+            def __init__(self) -> None:
+                self.closed = threading.Event()
+
+            def close(self) -> None:
+                self.closed.set()
+
+        connection = Connection()
+
+        class BlockedModel(EndpointModel):
+            def generate_stream(self, messages, tools=None):
+                _stream_opened(connection)
+                # 模拟阻塞的读取，连接被关闭后才返回
+                connection.closed.wait(5)
+                yield from _stream_error_response(ModelError("连接已关闭"))
+
+        router = RouterModel(
+            [BlockedModel("slow"), EndpointModel("fast")], hedge_delay=0.05
+        )
+        # 让阻塞的端点先被选中
+        router._endpoints[1].outstanding = 1
+
+        start = time.monotonic()
+        items = list(router.generate_stream([]))
+        router._endpoints[1].outstanding -= 1
+
+        assert items[0].content == "http://fast"
+        assert connection.closed.wait(1)
+        assert time.monotonic() - start < 1
+        assert router.hedge_stats()["hedge_wins"] == 1
+
+    def test_failover_win_is_not_hedge_win(self) -> None:
+        broken = EndpointModel("broken", ModelError("错误", status_code=503))
+        router = RouterModel([broken, EndpointModel("b")], hedge_delay=1.0)
+        router._endpoints[1].outstanding = 1
+
+        items = list(router.generate_stream([]))
+        router._endpoints[1].outstanding -= 1
+
+        assert items[0].content == "http://b"
+        assert router.hedge_stats() == {
+            "requests": 1,
+            "hedged": 0,
+            "hedge_wins": 0,
+        }
+
+    def test_no_hedge_when_primary_is_fast(self) -> None:
+        router = RouterModel(
+            [EndpointModel("a"), EndpointModel("b")], hedge_delay=1.0
+        )
+
+        items = list(router.generate_stream([]))
+
+        assert items[-1].finish_reason == "stop"
+        assert router.hedge_stats()["hedged"] == 0
+
+    def test_hedge_after_primary_error(self) -> None:
+        broken = EndpointModel("broken", ModelError("错误", status_code=503))
+        healthy = EndpointModel("healthy")
+        router = RouterModel([broken, healthy], hedge_delay=1.0)
+
+        for _ in range(3):
+            items = list(router.generate_stream([]))
+            assert items[0].content == "http://healthy"
+
+    def test_learned_percentile_delay(self) -> None:
+        router = RouterModel(
+            [EndpointModel("a"), EndpointModel("b")],
+            hedge_delay=2.0,
+            hedge_percentile=90,
+            hedge_min_samples=10,
+        )
+        assert router.current_hedge_delay() == 2.0
+
+        for i in range(10):
+            router._record_ttft(i / 10)
+
+        assert router.current_hedge_delay() == 0.9
@@ -1,7 +1,12 @@
 """测试 Runner 执行引擎"""
 
+import json
+import threading
+import time
 from unittest.mock import MagicMock, patch
 
+import pytest
+
 from zipagent import (
     Agent,
     Context,
@@ -11,7 +16,7 @@ from zipagent import (
     StreamEventType,
     function_tool,
 )
-from zipagent.model import Usage, StreamDelta
+from zipagent.model import AsyncModel, Model, StreamDelta, Usage
 
 
 def mock_generate_stream(content, tool_calls=None, usage=None):
@@ -460,3 +465,505 @@ class TestRunner:
 
         # 应该使用空参数继续执行
         assert result.success is True
+
+
+class ScriptedAsyncModel(AsyncModel):
+    """按顺序返回预设响应的异步模型"""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+
+    async def generate(self, messages, tools=None):
+        return self.responses.pop(0)
+
+
+def tool_call_response(name, arguments):
+    """辅助函数：构造带工具调用的响应"""
+    return ModelResponse(
+        content="需要计算",
+        tool_calls=[{"function": {"name": name, "arguments": arguments}}],
+        usage=Usage(10, 20, 30),
+        finish_reason="tool_calls",
+    )
+
+
+def answer_response(content):
+    """辅助函数：构造最终回答响应"""
+    return ModelResponse(
+        content=content,
+        tool_calls=None,
+        usage=Usage(10, 20, 30),
+        finish_reason="stop",
+    )
+
+
+class TestRunnerAsync:
+    """测试 Runner 的异步执行路径"""
+
+    @pytest.mark.asyncio
+    async def test_run_async_with_tool(self):
+        """测试异步运行带工具调用"""
+        agent = Agent(
+            name="Calculator",
+            instructions="计算器",
+            model=ScriptedAsyncModel(
+                [
+                    tool_call_response("add", '{"a": 5, "b": 7}'),
+                    answer_response("5 + 7 = 12"),
+                ]
+            ),
+            tools=[add],
+        )
+
+        events = []
+        result = await Runner.run_async(
+            agent, "计算 5 + 7", stream_callback=events.append
+        )
+
+        assert result.success is True
+        assert result.content == "5 + 7 = 12"
+        assert result.context.usage.total_tokens == 60
+        assert any(m.get("role") == "tool" for m in result.context.messages)
+        assert events[0].type == StreamEventType.QUESTION
+        assert events[-1].type == StreamEventType.ANSWER
+
+    @pytest.mark.asyncio
+    async def test_run_stream_async_matches_sync(self):
+        """测试异步流式事件序列与同步路径一致"""
+        responses = [
+            tool_call_response("add", '{"a": 2, "b": 3}'),
+            answer_response("结果是5"),
+        ]
+
+        sync_model = MagicMock()
+        sync_model.generate_stream.side_effect = [
+            mock_generate_stream(r.content, r.tool_calls, r.usage)
+            for r in responses
+        ]
+        sync_agent = Agent(
+            name="Sync", instructions="测试", model=sync_model, tools=[add]
+        )
+        sync_events = list(Runner.run_stream(sync_agent, "计算 2 + 3"))
+
+        async_agent = Agent(
+            name="Async",
+            instructions="测试",
+            model=ScriptedAsyncModel(responses),
+            tools=[add],
+        )
+        async_events = [
+            e async for e in Runner.run_stream_async(async_agent, "计算 2 + 3")
+        ]
+
+        assert async_events == sync_events
+
+    @pytest.mark.asyncio
+    async def test_run_async_with_sync_model(self):
+        """测试异步路径兼容同步模型"""
+        mock_model = MagicMock()
+        mock_model.generate_stream.return_value = mock_generate_stream(
+            "同步模型回答", usage=Usage(1, 2, 3)
+        )
+        agent = Agent(name="TestAgent", instructions="测试", model=mock_model)
+
+        result = await Runner.run_async(
+            agent, "你好", stream_callback=lambda e: None
+        )
+
+        assert result.success is True
+        assert result.content == "同步模型回答"
+
+    def test_run_sync_with_async_model(self):
+        """测试同步路径使用异步模型时给出明确错误"""
+        agent = Agent(
+            name="TestAgent",
+            instructions="测试",
+            model=ScriptedAsyncModel([answer_response("不会执行")]),
+        )
+
+        result = Runner.run(agent, "你好", stream_callback=lambda e: None)
+
+        assert result.success is False
+        assert "run_async" in result.error
+
+
+@function_tool
+def slow_echo(message: str) -> str:
+    """延迟回显消息"""
+    time.sleep(0.2)
+    return message
+
+
+def multi_tool_call_response(messages):
+    """辅助函数：构造一轮中包含多个工具调用的响应"""
+    return ModelResponse(
+        content="并发调用",
+        tool_calls=[
+            {
+                "function": {
+                    "name": "slow_echo",
+                    "arguments": json.dumps({"message": message}),
+                }
+            }
+            for message in messages
+        ],
+        usage=Usage(10, 20, 30),
+        finish_reason="tool_calls",
+    )
+
+
+class TestParallelToolCalls:
+    """测试同一轮多个工具调用的并发执行"""
+
+    def _make_agent(self, messages):
+        mock_model = MagicMock()
+        mock_model.generate_stream.side_effect = [
+            mock_generate_stream(
+                "并发调用", multi_tool_call_response(messages).tool_calls
+            ),
+            mock_generate_stream("完成"),
+        ]
+        return Agent(
+            name="ParallelAgent",
+            instructions="测试",
+            model=mock_model,
+            tools=[slow_echo],
+        )
+
+    def test_parallel_tools_keep_order(self):
+        """测试并发执行且结果按原始顺序写入上下文"""
+        messages = ["a", "b", "c", "d"]
+        agent = self._make_agent(messages)
+
+        start = time.perf_counter()
+        events = list(Runner.run_stream(agent, "并发", max_parallel_tools=4))
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.6  # 串行需要 0.8 秒
+        results = [
+            e.tool_result
+            for e in events
+            if e.type == StreamEventType.TOOL_RESULT
+        ]
+        assert results == messages
+
+        context_results = [
+            m["content"]
+            for m in agent.model.generate_stream.call_args[0][0]
+            if m["role"] == "tool"
+        ]
+        assert context_results == messages
+
+    def test_sequential_by_default(self):
+        """测试默认串行执行，工具调用与结果事件交替出现"""
+        agent = self._make_agent(["a", "b"])
+
+        events = list(Runner.run_stream(agent, "串行"))
+        tool_events = [
+            e.type
+            for e in events
+            if e.type
+            in (StreamEventType.TOOL_CALL, StreamEventType.TOOL_RESULT)
+        ]
+
+        assert tool_events == [
+            StreamEventType.TOOL_CALL,
+            StreamEventType.TOOL_RESULT,
+            StreamEventType.TOOL_CALL,
+            StreamEventType.TOOL_RESULT,
+        ]
+
+    @pytest.mark.asyncio
+    async def test_parallel_tools_async(self):
+        """测试异步路径并发执行工具"""
+        messages = ["x", "y", "z"]
+        agent = Agent(
+            name="ParallelAgent",
+            instructions="测试",
+            model=ScriptedAsyncModel(
+                [
+                    multi_tool_call_response(messages),
+                    answer_response("完成"),
+                ]
+            ),
+            tools=[slow_echo],
+        )
+
+        start = time.perf_counter()
+        result = await Runner.run_async(
+            agent,
+            "并发",
+            stream_callback=lambda e: None,
+            max_parallel_tools=3,
+        )
+        elapsed = time.perf_counter() - start
+
+        assert result.success is True
+        assert elapsed < 0.5  # 串行需要 0.6 秒
+        tool_messages = [
+            m["content"]
+            for m in result.context.messages
+            if m["role"] == "tool"
+        ]
+        assert tool_messages == messages
+
+
+class EchoModel(Model):
+    """回显最后一条用户消息的同步模型，可选延迟"""
+
+    def __init__(self, delays=None):
+        self.delays = delays or {}
+
+    def generate(self, messages, tools=None):
+        question = messages[-1]["content"]
+        time.sleep(self.delays.get(question, 0))
+        return answer_response(f"回答:{question}")
+
+
+class TestRunMany:
+    """测试批量运行"""
+
+    def _agent(self, delays=None):
+        return Agent(
+            name="BatchAgent",
+            instructions="测试",
+            model=EchoModel(delays),
+            use_system_prompt=False,
+        )
+
+    def _collect(self, generator):
+        items = []
+        try:
+            while True:
+                items.append(next(generator))
+        except StopIteration as e:
+            return items, e.value
+
+    def test_results_and_stats(self):
+        agent = self._agent()
+        jobs = ((agent, f"问题{i}") for i in range(20))
+
+        items, stats = self._collect(Runner.run_many(jobs, max_concurrency=4))
+
+        assert sorted(index for index, _ in items) == list(range(20))
+        for index, result in items:
+            assert result.content == f"回答:问题{index}"
+        assert stats.total == 20
+        assert stats.succeeded == 20
+        assert stats.usage.total_tokens == 20 * 30
+        assert stats.throughput > 0
+
+    def test_completion_order_and_input_order(self):
+        agent = self._agent({"慢": 0.3})
+        jobs = [(agent, "慢"), (agent, "快1"), (agent, "快2")]
+
+        completed, _ = self._collect(Runner.run_many(jobs, max_concurrency=3))
+        ordered, _ = self._collect(
+            Runner.run_many(jobs, max_concurrency=3, ordered=True)
+        )
+
+        assert completed[-1][0] == 0
+        assert [index for index, _ in ordered] == [0, 1, 2]
+
+    def test_bounded_concurrency(self):
+        agent = self._agent({f"问题{i}": 0.1 for i in range(6)})
+        jobs = [(agent, f"问题{i}") for i in range(6)]
+
+        start = time.perf_counter()
+        self._collect(Runner.run_many(jobs, max_concurrency=2))
+        elapsed = time.perf_counter() - start
+
+        assert elapsed >= 0.3
+
+    def test_timeout(self):
+        agent = self._agent({"慢": 0.3})
+        context = Context()
+        jobs = [(agent, "慢", context), (agent, "快")]
+
+        items, stats = self._collect(
+            Runner.run_many(jobs, max_concurrency=2, timeout=0.1)
+        )
+
+        results = dict(items)
+        assert results[0].success is False
+        assert "超时" in results[0].error
+        assert results[0].context is context
+        assert results[1].success is True
+        assert stats.timed_out == 1
+        assert stats.failed == 1
+
+    def _blocking_agent(self, release):
+        """模型调用阻塞到 release 被设置"""
+
+        class BlockingModel(Model):
+            def generate(self, messages, tools=None):
+                release.wait(5)
+                return answer_response("太迟了")
+
+        return Agent(
+            name="BlockingAgent",
+            instructions="测试",
+            model=BlockingModel(),
+            use_system_prompt=False,
+        )
+
+    def test_timeout_while_model_blocks(self):
+        """模型调用阻塞时，任务在截止时间到达后立即返回"""
+        release = threading.Event()
+        agent = self._blocking_agent(release)
+
+        start = time.perf_counter()
+        try:
+            items, stats = self._collect(
+                Runner.run_many([(agent, "阻塞")], timeout=0.1)
+            )
+            elapsed = time.perf_counter() - start
+        finally:
+            release.set()
+
+        assert elapsed < 1
+        assert items[0][1].success is False
+        assert "超时" in items[0][1].error
+        assert stats.timed_out == 1
+
+    def test_timed_out_jobs_free_concurrency(self):
+        """超时任务的线程仍在阻塞时，后续任务照常运行"""
+        release = threading.Event()
+        blocking = self._blocking_agent(release)
+        fast = self._agent()
+        jobs = [(blocking, "阻塞"), (blocking, "阻塞")] + [
+            (fast, f"问题{i}") for i in range(10)
+        ]
+
+        start = time.perf_counter()
+        try:
+            items, stats = self._collect(
+                Runner.run_many(jobs, max_concurrency=2, timeout=0.2)
+            )
+            elapsed = time.perf_counter() - start
+        finally:
+            release.set()
+
+        # 阻塞的模型调用 5 秒后才返回，快任务不应等待它们
+        assert elapsed < 2
+        assert len(items) == 12
+        assert stats.timed_out == 2
+        assert stats.succeeded == 10
+
+
+class TestToolTimeouts:
+    """测试工具调用超时"""
+
+    def _responses(self):
+        return [multi_tool_call_response(["a"]), answer_response("已恢复")]
+
+    def test_timeout_surfaces_error_event(self):
+        mock_model = MagicMock()
+        mock_model.generate_stream.side_effect = [
+            mock_generate_stream(r.content, r.tool_calls, r.usage)
+            for r in self._responses()
+        ]
+        agent = Agent(
+            name="TimeoutAgent",
+            instructions="测试",
+            model=mock_model,
+            tools=[slow_echo],
+        )
+
+        start = time.perf_counter()
+        events = list(Runner.run_stream(agent, "超时", tool_timeout=0.05))
+
+        assert time.perf_counter() - start < 0.2
+        errors = [e for e in events if e.type == StreamEventType.ERROR]
+        assert len(errors) == 1
+        assert errors[0].tool_name == "slow_echo"
+        assert errors[0].metadata["error_type"] == "ToolTimeoutError"
+        assert errors[0].metadata["timeout"] == 0.05
+        # 模型在下一轮收到超时信息后继续回答
+        assert events[-1].type == StreamEventType.ANSWER
+        assert any(
+            "执行超时" in m["content"]
+            for m in mock_model.generate_stream.call_args[0][0]
+            if m["role"] == "system"
+        )
+
+    @pytest.mark.asyncio
+    async def test_timeout_async(self):
+        agent = Agent(
+            name="TimeoutAgent",
+            instructions="测试",
+            model=ScriptedAsyncModel(self._responses()),
+            tools=[slow_echo],
+        )
+
+        events = []
+        result = await Runner.run_async(
+            agent, "超时", stream_callback=events.append, tool_timeout=0.05
+        )
+
+        assert result.success is True
+        assert result.content == "已恢复"
+        assert any(
+            e.type == StreamEventType.ERROR
+            and e.metadata["error_type"] == "ToolTimeoutError"
+            for e in events
+        )
+
+
+@function_tool
+async def async_add(a: int, b: int) -> int:
+    """异步加法"""
+    return a + b
+
+
+class TestAsyncTools:
+    """测试异步工具在同步和异步路径上的执行"""
+
+    def _responses(self):
+        return [
+            tool_call_response("async_add", '{"a": 1, "b": 2}'),
+            answer_response("结果是3"),
+        ]
+
+    def test_sync_run_with_async_tool(self):
+        mock_model = MagicMock()
+        mock_model.generate_stream.side_effect = [
+            mock_generate_stream(r.content, r.tool_calls, r.usage)
+            for r in self._responses()
+        ]
+        agent = Agent(
+            name="AsyncTools",
+            instructions="测试",
+            model=mock_model,
+            tools=[async_add],
+        )
+
+        events = list(Runner.run_stream(agent, "计算"))
+
+        results = [
+            e.tool_result
+            for e in events
+            if e.type == StreamEventType.TOOL_RESULT
+        ]
+        assert results == [3]
+
+    @pytest.mark.asyncio
+    async def test_async_run_with_async_tool(self):
+        agent = Agent(
+            name="AsyncTools",
+            instructions="测试",
+            model=ScriptedAsyncModel(self._responses()),
+            tools=[async_add],
+        )
+
+        result = await Runner.run_async(
+            agent, "计算", stream_callback=lambda e: None
+        )
+
+        assert result.success is True
+        tool_messages = [
+            m["content"]
+            for m in result.context.messages
+            if m["role"] == "tool"
+        ]
+        assert tool_messages == ["3"]
@@ -0,0 +1,302 @@
+"""Storage 模块测试"""
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from zipagent import (
+    Agent,
+    Context,
+    ContextManager,
+    ContextWindow,
+    JSONLContextStore,
+    ModelResponse,
+    Runner,
+    SQLiteContextStore,
+)
+from zipagent.exceptions import ContextError
+from zipagent.model import Usage
+from zipagent.storage import ContextStore
+
+
+@pytest.fixture(params=["sqlite", "jsonl"])
+def store(request, tmp_path) -> ContextStore:
+    """两种存储后端"""
+    if request.param == "sqlite":
+        backend = SQLiteContextStore(str(tmp_path / "contexts.db"))
+    else:
+        backend = JSONLContextStore(str(tmp_path / "contexts"))
+    yield backend
+    backend.close()
+
+
+class RecordingStore(SQLiteContextStore):
+    """记录每次写入的存储"""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+        self.drops = []
+
+    def write_messages(self, context_id, rows):
+        self.writes.append([seq for seq, _ in rows])
+        super().write_messages(context_id, rows)
+
+    def drop_messages(self, context_id, seqs):
+        self.drops.append(list(seqs))
+        super().drop_messages(context_id, seqs)
+
+
+class TestContextStore:
+    """存储后端测试"""
+
+    def test_round_trip(self, store: ContextStore) -> None:
+        context = Context(store=store)
+        context.add_message("user", "你好")
+        context.add_tool_call("echo", {"x": 1}, "结果")
+        context.usage.add(Usage(1, 2, 3))
+        context.set_data("user_id", 42)
+
+        loaded = store.load(context.context_id)
+
+        assert loaded is not None
+        assert loaded.messages == context.messages
+        assert loaded.usage == context.usage
+        assert loaded.data == {"user_id": 42}
+        assert loaded.created_at == context.created_at
+        assert loaded.store is store
+
+    def test_load_missing(self, store: ContextStore) -> None:
+        assert store.load("missing") is None
+
+    def test_replaced_and_removed_messages(self, store: ContextStore) -> None:
+        context = Context(store=store)
+        context.add_message("user", "问题")
+        context.add_message("assistant", "思考")
+        # 思考内容会被合并进工具调用消息
+        context.add_tool_call("echo", {}, "结果")
+
+        assert store.load(context.context_id).messages == context.messages
+
+        context.clear_messages()
+        loaded = store.load(context.context_id)
+        assert loaded.messages == []
+        assert loaded.turn_count == 0
+
+    def test_trim_after_reload(self, store: ContextStore) -> None:
+        context = Context(store=store)
+        for i in range(6):
+            context.add_message("user", f"问题{i}")
+
+        loaded = store.load(context.context_id)
+        del loaded.messages[:4]
+        loaded.add_message("user", "新问题")
+
+        reloaded = store.load(context.context_id)
+        assert [m["content"] for m in reloaded.messages] == [
+            "问题4",
+            "问题5",
+            "新问题",
+        ]
+
+    def test_delete_and_list(self, store: ContextStore) -> None:
+        first = Context(store=store)
+        first.add_message("user", "a")
+        second = Context(store=store)
+        second.add_message("user", "b")
+
+        assert set(store.list_context_ids()) == {
+            first.context_id,
+            second.context_id,
+        }
+
+        store.delete(first.context_id)
+        assert store.load(first.context_id) is None
+        assert store.list_context_ids() == [second.context_id]
+
+
+class TestIncrementalWrites:
+    """增量写入测试"""
+
+    def test_append_writes_only_new_messages(self) -> None:
+        store = RecordingStore()
+        context = Context(store=store)
+        for i in range(5):
+            context.add_message("user", f"消息{i}")
+
+        assert store.writes == [[i] for i in range(5)]
+
+    def test_trimming_does_not_rewrite_history(self) -> None:
+        store = RecordingStore()
+        context = Context(store=store)
+        context.add_message("system", "系统")
+        for _ in range(3):
+            context.add_message("user", "问题" * 30)
+            context.add_message("assistant", "回答" * 30)
+        store.writes.clear()
+
+        ContextWindow(max_tokens=150).fit(context)
+        context.persist()
+
+        assert store.writes == []
+        assert store.drops == [[1, 2, 3, 4]]
+        assert store.load(context.context_id).messages == context.messages
+
+        # 被裁剪的消息仍保留在存储中，新消息继续使用递增的序号
+        context.add_message("user", "新问题")
+        assert store.writes == [[7]]
+        (total,) = store._conn.execute(
+            "SELECT COUNT(*) FROM messages WHERE context_id = ?",
+            (context.context_id,),
+        ).fetchone()
+        assert total == 8
+
+    def test_long_conversation_writes_each_message_once(self) -> None:
+        store = RecordingStore()
+        context = Context(store=store)
+        context.add_message("system", "系统")
+        window = ContextWindow(max_tokens=400)
+        for i in range(200):
+            context.add_message("user", f"问题{i}" * 10)
+            window.fit(context)
+            context.add_message("assistant", f"回答{i}" * 10)
+
+        written = [seq for seqs in store.writes for seq in seqs]
+        assert written == list(range(401))
+        assert len(context.messages) < 401
+
+        loaded = store.load(context.context_id)
+        assert loaded.messages == context.messages
+
+    def test_replacing_message_writes_one_row(self) -> None:
+        store = RecordingStore()
+        context = Context(store=store)
+        for i in range(5):
+            context.add_message("tool", f"输出{i}")
+        store.writes.clear()
+
+        context.messages[2] = {"role": "tool", "content": "截断"}
+        context.persist()
+
+        assert store.writes == [[2]]
+        assert store.load(context.context_id).messages == context.messages
+
+    def test_reassigned_messages_resync(self, store: ContextStore) -> None:
+        context = Context(store=store)
+        context.add_message("user", "旧消息")
+
+        context.messages = [{"role": "user", "content": "新消息"}]
+        context.persist()
+
+        loaded = store.load(context.context_id)
+        assert loaded.messages == [{"role": "user", "content": "新消息"}]
+
+    def test_clone_does_not_inherit_store(self) -> None:
+        context = Context(store=SQLiteContextStore())
+        assert context.clone().store is None
+
+
+class TestJSONLContextStore:
+    """JSONL 存储测试"""
+
+    def test_compact(self, tmp_path) -> None:
+        store = JSONLContextStore(str(tmp_path))
+        context = Context(store=store)
+        for i in range(10):
+            context.add_message("user", f"消息{i}")
+        context.clear_messages()
+        context.add_message("user", "最后一条")
+
+        path = tmp_path / f"{context.context_id}.jsonl"
+        lines_before = len(path.read_text().splitlines())
+        store.compact(context.context_id)
+
+        assert len(path.read_text().splitlines()) < lines_before
+        assert store.load(context.context_id).messages == context.messages
+
+    def test_ignores_truncated_last_line(self, tmp_path) -> None:
+        store = JSONLContextStore(str(tmp_path))
+        context = Context(store=store)
+        context.add_message("user", "完整消息")
+        path = tmp_path / f"{context.context_id}.jsonl"
+        with open(path, "a", encoding="utf-8") as f:
+            f.write('{"op": "messages", "sta')
+
+        assert store.load(context.context_id).messages == context.messages
+
+    def test_keeps_records_after_truncated_line(self, tmp_path) -> None:
+        """崩溃留下的半行之后继续写入，之后的记录不会丢失"""
+        store = JSONLContextStore(str(tmp_path))
+        context = Context(store=store)
+        context.add_message("user", "崩溃前")
+        path = tmp_path / f"{context.context_id}.jsonl"
+        with open(path, "ab") as f:
+            # 截断在多字节字符中间
+            f.write('{"op": "messages", "rows": [[9, "中'.encode()[:-1])
+
+        context.add_message("user", "崩溃后")
+        context.set_data("step", 2)
+
+        loaded = store.load(context.context_id)
+        assert loaded.messages == context.messages
+        assert loaded.get_data("step") == 2
+
+    def test_rejects_unsafe_context_id(self, tmp_path) -> None:
+        store = JSONLContextStore(str(tmp_path))
+        with pytest.raises(ContextError):
+            store.load("../escape")
+
+
+class TestContextManager:
+    """ContextManager 测试"""
+
+    def test_lazy_load_after_eviction(self, store: ContextStore) -> None:
+        manager = ContextManager(store, max_idle_seconds=0)
+        context = manager.create("session-1")
+        context.add_message("user", "你好")
+
+        assert manager.evict_idle() == 1
+        assert "session-1" not in manager
+
+        reloaded = manager.get("session-1")
+        assert reloaded is not None
+        assert reloaded is not context
+        assert reloaded.messages == [{"role": "user", "content": "你好"}]
+        assert len(manager) == 1
+
+    def test_get_or_create(self, store: ContextStore) -> None:
+        manager = ContextManager(store)
+
+        context = manager.get_or_create("session-2")
+
+        assert manager.get("session-2") is context
+        assert manager.get("missing") is None
+
+    def test_runner_persists_conversation(self, store: ContextStore) -> None:
+        mock_model = MagicMock()
+        mock_model.generate_stream.return_value = iter(
+            [
+                ModelResponse(
+                    content="你好！",
+                    tool_calls=None,
+                    usage=Usage(1, 2, 3),
+                    finish_reason="stop",
+                )
+            ]
+        )
+        agent = Agent(name="TestAgent", instructions="测试", model=mock_model)
+        manager = ContextManager(store)
+        context = manager.create("session-3")
+
+        Runner.run(agent, "你好", context=context, stream_callback=print)
+        manager.evict("session-3")
+
+        loaded = manager.get("session-3")
+        assert [m["role"] for m in loaded.messages] == [
+            "system",
+            "user",
+            "assistant",
+        ]
+        assert loaded.turn_count == 1
+        assert loaded.last_agent == "TestAgent"
+        assert loaded.usage.total_tokens == 3
@@ -1,6 +1,20 @@
 """Tool 模块测试"""
 
-from zipagent import Tool, function_tool
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from zipagent import (
+    ConfigurationError,
+    LRUCache,
+    Tool,
+    ToolExecutionError,
+    ToolTimeoutError,
+    function_tool,
+)
 from zipagent.tool import ToolResult
 
 
@@ -158,3 +172,281 @@ class TestFunctionTool:
 
         assert result.success is True
         assert result.result == 12
+
+
+@function_tool(executor="process")
+def worker_pid() -> int:
+    """返回执行进程的 pid"""
+    return os.getpid()
+
+
+@function_tool(executor="process", max_result_bytes=1024)
+def large_result(size: int) -> bytes:
+    """返回指定大小的结果"""
+    return b"x" * size
+
+
+@function_tool(executor="process")
+def failing_tool(x: int) -> int:
+    """总是失败的工具"""
+    raise ValueError(f"无效参数: {x}")
+
+
+class TestProcessExecutor:
+    """进程池执行模式测试"""
+
+    def test_runs_in_worker_process(self) -> None:
+        result = worker_pid.execute({})
+
+        assert result.success is True
+        assert result.result != os.getpid()
+
+    def test_result_size_limit(self) -> None:
+        assert large_result.execute({"size": 10}).result == b"x" * 10
+
+        result = large_result.execute({"size": 4096})
+
+        assert result.success is False
+        assert "超过限制" in result.error
+
+    def test_worker_exception_becomes_error(self) -> None:
+        result = failing_tool.execute({"x": 1})
+
+        assert result.success is False
+        assert result.error == "无效参数: 1"
+
+    def test_rejects_local_function(self) -> None:
+        def local(x: int) -> int:
+            return x
+
+        with pytest.raises(ConfigurationError):
+            function_tool(local, executor="process")
+        with pytest.raises(ConfigurationError):
+            Tool("local", "本地函数", local, executor="fiber")
+
+
+class TestToolTimeout:
+    """工具超时测试"""
+
+    def test_timeout_abandons_slow_tool(self) -> None:
+        release = threading.Event()
+
+        @function_tool(timeout=0.05)
+        def hang() -> str:
+            release.wait(5)
+            return "完成"
+
+        start = time.perf_counter()
+        result = hang.execute({})
+        release.set()
+
+        assert time.perf_counter() - start < 1
+        assert result.success is False
+        assert result.timed_out is True
+        assert isinstance(result.exception, ToolTimeoutError)
+        assert result.exception.details["timeout"] == 0.05
+
+    def test_call_timeout_takes_smaller_value(self) -> None:
+        @function_tool(timeout=10)
+        def sleepy() -> str:
+            time.sleep(0.5)
+            return "完成"
+
+        result = sleepy.execute({}, timeout=0.05)
+
+        assert result.timed_out is True
+        assert "0.05" in result.error
+
+    def test_fast_tool_within_timeout(self) -> None:
+        @function_tool(timeout=1)
+        def fast(x: int) -> int:
+            return x + 1
+
+        result = fast.execute({"x": 1})
+
+        assert result.success is True
+        assert result.result == 2
+
+    def test_error_is_not_reported_as_timeout(self) -> None:
+        @function_tool(timeout=1)
+        def broken() -> str:
+            raise TimeoutError("下游超时")
+
+        result = broken.execute({})
+
+        assert result.success is False
+        assert result.timed_out is False
+        assert isinstance(result.exception, ToolExecutionError)
+        assert result.error == "下游超时"
+
+    @pytest.mark.asyncio
+    async def test_aexecute_timeout(self) -> None:
+        release = threading.Event()
+
+        @function_tool
+        def hang() -> str:
+            release.wait(5)
+            return "完成"
+
+        result = await hang.aexecute({}, timeout=0.05)
+        release.set()
+
+        assert result.timed_out is True
+        assert (await hang.aexecute({})).result == "完成"
+
+
+class TestToolCache:
+    """工具结果缓存测试"""
+
+    @staticmethod
+    def counting_tool(cache: LRUCache, name: str = "lookup") -> Tool:
+        calls = []
+
+        def lookup(city: str, days: int = 1) -> str:
+            calls.append(city)
+            if city == "错误":
+                raise ValueError("未知城市")
+            return f"{city}:{days}:{len(calls)}"
+
+        tool = function_tool(lookup, name=name, cache=cache)
+        tool.calls = calls
+        return tool
+
+    def test_repeated_call_skips_function(self) -> None:
+        cache = LRUCache(maxsize=16)
+        tool = self.counting_tool(cache)
+
+        first = tool.execute({"city": "北京", "days": 2})
+        second = tool.execute({"days": 2, "city": "北京"})
+
+        assert tool.calls == ["北京"]
+        assert second.result == first.result
+        assert second.cached is True and first.cached is False
+        assert cache.stats()["hits"] == 1
+
+    def test_failures_are_not_cached(self) -> None:
+        tool = self.counting_tool(LRUCache())
+
+        tool.execute({"city": "错误"})
+        result = tool.execute({"city": "错误"})
+
+        assert result.success is False
+        assert tool.calls == ["错误", "错误"]
+
+    def test_shared_cache_keys_include_tool_name(self) -> None:
+        cache = LRUCache()
+        first = self.counting_tool(cache, "first")
+        second = self.counting_tool(cache, "second")
+
+        first.execute({"city": "上海"})
+        second.execute({"city": "上海"})
+        second.execute({"city": "上海"})
+
+        assert first.calls == ["上海"]
+        assert second.calls == ["上海"]
+        assert len(cache) == 2
+
+    def test_invalidate(self) -> None:
+        cache = LRUCache()
+        tool = self.counting_tool(cache)
+        other = self.counting_tool(cache, "other")
+        for city in ("北京", "上海"):
+            tool.execute({"city": city})
+        other.execute({"city": "北京"})
+
+        assert tool.invalidate({"city": "北京"}) == 1
+        tool.execute({"city": "北京"})
+        assert tool.calls == ["北京", "上海", "北京"]
+
+        assert tool.invalidate() == 2
+        assert len(cache) == 1
+
+    @pytest.mark.asyncio
+    async def test_aexecute_uses_cache(self) -> None:
+        tool = self.counting_tool(LRUCache())
+
+        await tool.aexecute({"city": "广州"})
+        result = await tool.aexecute({"city": "广州"})
+
+        assert result.cached is True
+        assert tool.calls == ["广州"]
+
+
+@function_tool
+async def async_double(x: int) -> int:
+    """异步工具"""
+    await asyncio.sleep(0.01)
+    return x * 2
+
+
+class TestAsyncTool:
+    """异步工具测试"""
+
+    def test_detects_coroutine_function(self) -> None:
+        assert async_double.is_async is True
+        assert async_double.schema["function"]["parameters"]["required"] == [
+            "x"
+        ]
+
+    def test_execute_runs_on_background_loop(self) -> None:
+        result = async_double.execute({"x": 21})
+
+        assert result.success is True
+        assert result.result == 42
+
+    @pytest.mark.asyncio
+    async def test_aexecute_awaits_in_current_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        seen = []
+
+        @function_tool
+        async def current_loop() -> bool:
+            seen.append(asyncio.get_running_loop())
+            return True
+
+        results = await asyncio.gather(
+            *(async_double.aexecute({"x": i}) for i in range(10)),
+            current_loop.aexecute({}),
+        )
+
+        assert [r.result for r in results[:10]] == [i * 2 for i in range(10)]
+        assert seen == [loop]
+
+    @pytest.mark.asyncio
+    async def test_timeout_cancels_task(self) -> None:
+        cancelled = asyncio.Event()
+
+        @function_tool(timeout=0.05)
+        async def hang() -> str:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return "完成"
+
+        result = await hang.aexecute({})
+
+        assert result.timed_out is True
+        await asyncio.wait_for(cancelled.wait(), 1)
+
+    def test_sync_timeout_cancels_task(self) -> None:
+        cancelled = threading.Event()
+
+        @function_tool
+        async def hang() -> str:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return "完成"
+
+        result = hang.execute({}, timeout=0.05)
+
+        assert result.timed_out is True
+        assert cancelled.wait(1)
+
+    def test_rejects_process_executor(self) -> None:
+        with pytest.raises(ConfigurationError):
+            Tool("async", "异步", async_double.function, executor="process")